@@ -9,7 +9,9 @@
 
 Usage:
   kibot [-b BOARD] [-e SCHEMA] [-c CONFIG] [-d OUT_DIR] [-s PRE]
-         [-q | -v...] [-i] [-g DEF]... [TARGET...]
+         [-q | -v...] [-i] [-f] [-g DEF]... [-j JOBS] [-w]
+         [--cache-sch] [--profile FILE] [TARGET...]
+  kibot [-q | -v...] [-f] [-j JOBS] [--cache-sch] [--profile FILE] --batch MANIFEST
   kibot [-v...] [-c PLOT_CONFIG] --list
   kibot [-v...] [-b BOARD] [-d OUT_DIR] [-p | -P] --example
   kibot [-v...] --help-filters
@@ -17,6 +19,7 @@ Usage:
   kibot [-v...] --help-output=HELP_OUTPUT
   kibot [-v...] --help-outputs
   kibot [-v...] --help-preflights
+  kibot [-v...] --serve SOCKET
   kibot -h | --help
   kibot --version
 
@@ -26,9 +29,14 @@ Arguments:
 Options:
   -h, --help                       Show this help message and exit
   -b BOARD, --board-file BOARD     The PCB .kicad-pcb board file
+  --batch MANIFEST                 Process all the projects listed in the YAML
+                                   MANIFEST using only one process
   -c CONFIG, --plot-config CONFIG  The plotting config file to use
+  --cache-sch                      Store the loaded schematic in ~/.cache/kibot/sch/
+                                   and use it when the files didn't change
   -d OUT_DIR, --out-dir OUT_DIR    The output directory [default: .]
   -e SCHEMA, --schematic SCHEMA    The schematic file (.sch)
+  -f, --force                      Generate the outputs even when they are up to date
   -g DEF, --global-redef DEF       Overwrite a global value (VAR=VAL)
   --help-filters                   List supported filters and details
   --help-list-outputs              List supported outputs
@@ -36,13 +44,21 @@ Options:
   --help-outputs                   List supported outputs and details
   --help-preflights                List supported preflights and details
   -i, --invert-sel                 Generate the outputs not listed as targets
+  -j JOBS, --jobs JOBS             Number of outputs to generate in parallel [default: 1]
+                                   Only the external tools run at the same time
   -l, --list                       List available outputs (in the config file)
   -p, --copy-options               Copy plot options from the PCB file
   -P, --copy-and-expand            As -p but expand the list of layers
+  --profile FILE                   Measure the time and memory used by each phase.
+                                   Saved to FILE as a Chrome trace (JSON)
   -q, --quiet                      Remove information logs
   -s PRE, --skip-pre PRE           Skip preflights, comma separated or `all`
+  --serve SOCKET                   Run as a server listening at this Unix socket.
+                                   Use `kibot-client SOCKET ARGS...` to submit jobs
   -v, --verbose                    Show debugging information
   -V, --version                    Show program's version number and exit
+  -w, --watch                      Keep running, generate the outputs again when
+                                   their inputs change
   -x, --example                    Create an example configuration file.
 
 """
@@ -68,12 +84,17 @@ from . import log
 log.set_domain('kibot')
 logger = log.init()
 from .gs import (GS)
-from .kiplot import (generate_outputs, load_actions, config_output)
+from .kiplot import (generate_outputs, load_actions, config_output, reset_loaded, FileCache)
+from . import kiplot
+from . import profiler
 from .pre_base import (BasePreFlight)
 from .config_reader import (CfgYamlReader, print_outputs_help, print_output_help, print_preflights_help, create_example,
                             print_filters_help)
 from .misc import (NO_PCB_FILE, NO_SCH_FILE, EXIT_BAD_ARGS, W_VARSCH, W_VARCFG, W_VARPCB)
 from .docopt import docopt
+from .server import serve
+from .watch import watch
+from .batch import read_manifest, run_batch
 
 
 def list_pre_and_outs(logger, outputs):
@@ -194,11 +215,66 @@ def set_locale():
         pass
 
 
-def main():
-    set_locale()
+def read_config(plot_config):
+    cr = CfgYamlReader()
+    outputs = None
+    with profiler.phase('read config'):
+        try:
+            # The Python way ...
+            with gzip.open(plot_config) as cf_file:
+                outputs = cr.read(cf_file)
+        except OSError:
+            pass
+        if outputs is None:
+            with open(plot_config) as cf_file:
+                outputs = cr.read(cf_file)
+    return outputs
+
+
+def skip_unrelated_preflights(skip_pre, sch_changed, pcb_changed):
+    """ Adds the preflights not affected by the changes to the list of preflights to skip """
+    if skip_pre == 'all':
+        return skip_pre
+    skip = skip_pre.split(',') if skip_pre else []
+    for pre in BasePreFlight.get_in_use_objs():
+        if (pre.is_sch() and not sch_changed) or (pre.is_pcb() and not pcb_changed):
+            skip.append(pre._name)
+    return ','.join(skip) if skip else None
+
+
+def watch_job(args, plot_config, jobs):
+    """ Generates the outputs, then waits for changes and generates the affected outputs """
+    # Keep the PCB and schematic in memory
+    kiplot.board_cache = FileCache(1)
+    kiplot.sch_cache = FileCache(1)
+
+    def run(names, sch_changed, pcb_changed):
+        reset_loaded()
+        log.MyLogger.reset_warn_counters()
+        try:
+            outputs = read_config(plot_config)
+            if names is None:
+                used = generate_outputs(outputs, args.target, args.invert_sel, args.skip_pre, jobs, args.force)
+            else:
+                skip_pre = skip_unrelated_preflights(args.skip_pre, sch_changed, pcb_changed)
+                used = generate_outputs(outputs, names, False, skip_pre, jobs, args.force)
+            logger.log_totals()
+            return used
+        except SystemExit as e:
+            logger.error('Failed to generate the outputs (exit code {})'.format(e.code))
+            return []
+
+    watch(os.path.abspath(plot_config), run(None, True, True), run)
+
+
+def parse_args(argv=None):
     ver = 'KiBot '+__version__+' - '+__copyright__+' - License: '+__license__
-    args = docopt(__doc__, version=ver, options_first=True)
+    return docopt(__doc__, argv=argv, version=ver, options_first=True)
 
+
+def run_job(args):
+    """ Does the job described by the command line arguments.
+        Can be called more than once (server mode). """
     # Set the specified verbosity
     log.set_verbosity(logger, args.verbose, args.quiet)
     GS.debug_enabled = logger.getEffectiveLevel() <= DEBUG
@@ -212,6 +288,16 @@ def main():
         var = redef.split('=')[0]
         GS.global_from_cli[var] = redef[len(var)+1:]
 
+    # Number of outputs to generate in parallel
+    jobs = 0
+    if args.jobs.isdigit():
+        jobs = int(args.jobs)
+    if jobs < 1:
+        logger.error('The number of jobs must be a positive integer ({})'.format(args.jobs))
+        sys.exit(EXIT_BAD_ARGS)
+
+    GS.kibot_version = __version__
+    GS.cache_sch = args.cache_sch
     # Output dir: relative to CWD (absolute path overrides)
     GS.out_dir = os.path.join(os.getcwd(), args.out_dir)
 
@@ -241,17 +327,7 @@ def main():
     # Determine the YAML file
     plot_config = solve_config(args.plot_config)
     # Read the config file
-    cr = CfgYamlReader()
-    outputs = None
-    try:
-        # The Python way ...
-        with gzip.open(plot_config) as cf_file:
-            outputs = cr.read(cf_file)
-    except OSError:
-        pass
-    if outputs is None:
-        with open(plot_config) as cf_file:
-            outputs = cr.read(cf_file)
+    outputs = read_config(plot_config)
 
     # Is just list the available targets?
     if args.list:
@@ -262,11 +338,53 @@ def main():
     GS.set_sch(solve_schematic(args.schematic, args.board_file))
     # Determine the PCB file
     GS.set_pcb(solve_board_file(GS.sch_file, args.board_file))
+    if args.watch:
+        watch_job(args, plot_config, jobs)
+        return
     # Do all the job (pre-flight + outputs)
-    generate_outputs(outputs, args.target, args.invert_sel, args.skip_pre)
+    generate_outputs(outputs, args.target, args.invert_sel, args.skip_pre, jobs, args.force)
     # Print total warnings
     logger.log_totals()
 
 
+def main():
+    set_locale()
+    args = parse_args()
+    if not args.profile:
+        run_main(args)
+        return
+    profiler.start()
+    try:
+        run_main(args)
+    finally:
+        profiler.stop(args.profile)
+
+
+def run_main(args):
+    if args.serve:
+        # Set the specified verbosity
+        log.set_verbosity(logger, args.verbose, False)
+        GS.debug_enabled = logger.getEffectiveLevel() <= DEBUG
+        GS.debug_level = args.verbose
+        GS.kibot_version = __version__
+        # The plug-ins are loaded once
+        load_actions()
+        serve(args.serve, lambda argv: run_job(parse_args(argv)))
+        sys.exit(0)
+    if args.batch:
+        log.set_verbosity(logger, args.verbose, args.quiet)
+        projects = read_manifest(args.batch)
+        # Options applied to all the projects
+        extra = ['-v']*args.verbose+['-j', args.jobs]
+        if args.quiet:
+            extra.append('-q')
+        if args.force:
+            extra.append('-f')
+        if args.cache_sch:
+            extra.append('--cache-sch')
+        sys.exit(run_batch(projects, extra, lambda argv: run_job(parse_args(argv))))
+    run_job(args)
+
+
 if __name__ == "__main__":
     main()  # pragma: no cover
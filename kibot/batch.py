@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Batch mode.
+
+Processes a list of projects using the same process.
+The manifest is a YAML file containing a list of projects, i.e.:
+
+- name: 'main board'
+  board: 'main/main.kicad_pcb'
+  schematic: 'main/main.sch'
+  config: 'main/fab.kibot.yaml'
+  out_dir: 'outputs/main'
+  targets: ['gerbers', 'drill']
+
+Only `config` and one of `board`/`schematic` are mandatory.
+Relative paths are relative to the manifest.
+The default `out_dir` is the directory containing the board (or schematic).
+"""
+import os
+import traceback
+import yaml
+from .misc import INTERNAL_ERROR, error_level_to_name
+from .error import config_error
+from . import kiplot
+from . import log
+from . import profiler
+
+logger = log.get_logger(__name__)
+VALID_KEYS = {'name', 'board', 'schematic', 'config', 'out_dir', 'targets'}
+
+
+def read_manifest(fname):
+    """ Returns a list of dicts, one for each project """
+    try:
+        with open(fname) as f:
+            data = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        config_error("Error loading the batch manifest "+str(e))
+    if not isinstance(data, list):
+        config_error("The batch manifest must be a list of projects")
+    base = os.path.dirname(os.path.abspath(fname))
+    projects = []
+    for n, prj in enumerate(data):
+        if not isinstance(prj, dict):
+            config_error("Project {} in batch manifest must be a dict".format(n+1))
+        for k in prj.keys():
+            if k not in VALID_KEYS:
+                config_error("Unknown key `{}` in project {} of the batch manifest".format(k, n+1))
+        if 'config' not in prj or ('board' not in prj and 'schematic' not in prj):
+            config_error("Project {} in batch manifest needs `config` and `board` or `schematic`".format(n+1))
+        res = {}
+        for k in ['board', 'schematic', 'config', 'out_dir']:
+            v = prj.get(k)
+            if v is not None:
+                res[k] = os.path.join(base, str(v))
+        targets = prj.get('targets', [])
+        if isinstance(targets, str):
+            targets = [targets]
+        if not isinstance(targets, list):
+            config_error("`targets` must be a list (project {} of the batch manifest)".format(n+1))
+        res['targets'] = [str(t) for t in targets]
+        res['name'] = str(prj.get('name', os.path.basename(res.get('board', res.get('schematic')))))
+        projects.append(res)
+    return projects
+
+
+def _project_args(prj, extra):
+    args = list(extra)
+    if 'board' in prj:
+        args.extend(['-b', prj['board']])
+    if 'schematic' in prj:
+        args.extend(['-e', prj['schematic']])
+    out_dir = prj.get('out_dir', os.path.dirname(prj.get('board', prj.get('schematic'))))
+    args.extend(['-c', prj['config'], '-d', out_dir])
+    return args+prj['targets']
+
+
+def run_batch(projects, extra, run_job):
+    """ Runs `run_job` for each project. `extra` are command line options for all the projects.
+        Returns the exit code of the first project that failed (0 if all went ok). """
+    results = []
+    for prj in projects:
+        logger.info('* Project `{}`'.format(prj['name']))
+        kiplot.reset_state()
+        try:
+            with profiler.phase('project '+prj['name'], 'batch'):
+                run_job(_project_args(prj, extra))
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else INTERNAL_ERROR)
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            logger.error('Unexpected error processing `{}`:\n{}'.format(prj['name'], traceback.format_exc()))
+            code = INTERNAL_ERROR
+        results.append((prj['name'], code))
+    # Summary
+    kiplot.reset_state()
+    logger.info('Batch summary:')
+    w = max(len(name) for name, _ in results) if results else 0
+    for name, code in results:
+        status = 'OK' if code == 0 else '{} ({})'.format(error_level_to_name[code] if code < len(error_level_to_name)
+                                                         else 'UNKNOWN', code)
+        logger.info('- {}  {}'.format(name.ljust(w), status))
+    failed = [code for _, code in results if code]
+    logger.info('{} projects, {} failed'.format(len(results), len(failed)))
+    return failed[0] if failed else 0
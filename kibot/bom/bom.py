@@ -14,6 +14,7 @@ from copy import deepcopy
 from .units import compare_values, comp_match
 from .bom_writer import write_bom
 from .columnlist import ColumnList
+from .table import BoMTable
 from ..misc import DNF, W_FIELDCONF
 from .. import log
 
@@ -22,6 +23,11 @@ logger = log.get_logger(__name__)
 # RN == Resistor 'N'(Pack)
 # RT == Thermistor
 RLC_PREFIX = {'R', 'L', 'C', 'RV', 'RN', 'RT'}
+# Options used to create the groups (group_components and ComponentGroup)
+GROUPS_OPTIONS = ('group_fields', 'component_aliases', 'merge_blank_fields', 'group_connectors', 'fit_field', 'ref_separator',
+                  'use_alt', 'normalize_values', 'normalize_locale', 'ignore_dnf', 'number', 'join')
+# Groups already computed during this run, see get_groups()
+groups_cache = {}
 
 
 def compare_value(c1, c2, cfg):
@@ -250,56 +256,181 @@ class ComponentGroup(object):
         if not self.fields[ColumnList.COL_DESCRIPTION_L]:
             self.fields[ColumnList.COL_DESCRIPTION_L] = comp.desc
 
-    def get_row(self, columns):
-        """ Return a dict of the KiCad data based on the supplied columns """
-        row = []
-        for key in columns:
-            val = self.get_field(key)
-            # Join fields (appending to current value)
-            for join_l in self.cfg.join:
-                # Each list is "target, source..." so we need at least 2 elements
-                elements = len(join_l)
-                target = join_l[0]
-                if elements > 1 and target == key:
-                    # Append data from the other fields
-                    for source in join_l[1:]:
-                        v = self.get_field(source)
-                        if v:
-                            val = val + ' ' + v
-            row.append(val)
-        return row
-
 
 def get_value_sort(comp):
     """ Try to better sort R, L and C components """
     res = comp.value_sort
     if res:
-        value, (mult, mult_s), unit = res
-        if comp.ref_prefix in "CL":
-            # fempto Farads
-            value = "{0:15d}".format(int(value * 1e15 * mult + 0.1))
-        else:
-            # milli Ohms
-            value = "{0:15d}".format(int(value * 1000 * mult + 0.1))
-        return value
+        return res.sort
     return comp.value
 
 
 def normalize_value(c, decimal_point):
     if c.value_sort is None:
         return c.value
-    value, (mult, mult_s), unit = c.value_sort
-    ivalue = int(value)
-    if value == ivalue:
-        value = ivalue
-    elif decimal_point:
-        value = str(value).replace('.', decimal_point)
-    return '{} {}{}'.format(value, mult_s, unit)
+    value = c.value_sort.display
+    if decimal_point:
+        value = value.replace('.', decimal_point)
+    return value
 
 
-def group_components(cfg, components):
+def value_keys(c, group_connectors):
+    """ Keys used to compare the values (see compare_value).
+        Two values match if they share a key, the last one is the canonical key. """
+    value = c.value.strip().lower()
+    # '~' is the same as empty for KiCad
+    if value == '~':
+        value = ''
+    keys = [('s', value)]
+    if c.value_sort:
+        # Same as compare_values
+        keys.append(('n', c.value_sort.key, c.value_sort.unit))
+    if group_connectors and 'connector' in (c.lib or '').lower():
+        keys.append(('c',))
+    return keys
+
+
+def part_keys(c, aliases):
+    """ Keys used to compare the part names (see compare_part_name).
+        Two names match if they share a key, the last one is the canonical key. """
+    name = c.name.lower()
+    return [('n', name)]+[('a', n) for n in aliases.get(name, ())]
+
+
+class WildIndex(object):
+    """ Groups that can be blank in some fields (merge_blank_fields).
+        Each group is indexed using the non-blank fields of its first component.
+        The index for a set of fields is created the first time a component needs it. """
+    def __init__(self, n):
+        super().__init__()
+        # Blank fields mask -> (list of (values, group number), {fields to compare: {values: first group number}})
+        self.by_mask = {}
+        # Fields to compare for a mask of blank fields
+        self.positions = [tuple(i for i in range(n) if not (mask >> i) & 1) for mask in range(1 << n)]
+
+    def find(self, vals, blanks):
+        """ Number of the first group matching these values, None if no match """
+        best = None
+        for mask, (groups, indexes) in self.by_mask.items():
+            pos = self.positions[mask | blanks]
+            index = indexes.get(pos)
+            if index is None:
+                index = {}
+                for g_vals, g in groups:
+                    index.setdefault(tuple(g_vals[i] for i in pos), g)
+                indexes[pos] = index
+            g = index.get(tuple(vals[i] for i in pos))
+            if g is not None and (best is None or g < best):
+                best = g
+        return best
+
+    def add(self, vals, blanks, g):
+        groups, indexes = self.by_mask.setdefault(blanks, ([], {}))
+        groups.append((vals, g))
+        for pos, index in indexes.items():
+            index.setdefault(tuple(vals[i] for i in pos), g)
+
+
+def _group_key_fields(cfg):
+    """ Classify the grouping fields according to how we compare them.
+        - exact: must be equal (lowercase)
+        - keyed: (field, keys function) the values match if they share a key
+        - wild: like exact, but blank matches anything (merge_blank_fields) """
+    exact = []
+    keyed = []
+    wild = []
+    aliases = {}
+    for n, alias in enumerate(cfg.component_aliases):
+        for name in alias:
+            aliases.setdefault(name, []).append(n)
+    for f in cfg.group_fields:
+        if f == ColumnList.COL_VALUE_L:
+            keyed.append(lambda c: value_keys(c, cfg.group_connectors))
+        elif f == ColumnList.COL_PART_L:
+            if all(len(v) == 1 for v in aliases.values()):
+                # Each name belongs to one set of aliases, we can use the set as an exact key
+                exact.append(lambda c: part_keys(c, aliases)[-1])
+            else:
+                keyed.append(lambda c: part_keys(c, aliases))
+        elif cfg.merge_blank_fields:
+            wild.append(f)
+        else:
+            exact.append(lambda c, f=f: c.get_field_value(f).lower())
+    return exact, keyed, wild
+
+
+def _group_components(cfg, components):
+    """ Creates the groups, the result is the same we get comparing each component against the first component of each
+        group (in creation order). But here we compute keys for each component and look for the groups in dicts.
+        Components with different `exact` keys can't be grouped, so they go to different buckets.
+        Inside a bucket the `keyed` fields are converted to one canonical key, unless a key maps to more than one
+        canonical key (i.e. a value that is equal as string for an R and a C). In this case we compare each component
+        of the bucket against the groups of the bucket. """
     groups = []
-    # Iterate through each component, and test whether a group for these already exists
+    if not cfg.group_fields:
+        # Do not group components, only the units of the same component
+        exact = [lambda c: c.ref]
+        keyed = wild = []
+    else:
+        exact, keyed, wild = _group_key_fields(cfg)
+    # Compute the keys
+    data = []
+    canonical = {}
+    for c in components:
+        bucket = (c.fitted, c.fixed)+tuple(f(c) for f in exact)
+        keys = [f(c) for f in keyed]
+        data.append((c, bucket, tuple(k[-1] for k in keys)))
+        # Check if the keys are consistent inside the bucket
+        solved = canonical.setdefault(bucket, {})
+        for n, k in enumerate(keys):
+            can = k[-1]
+            for key in k:
+                if solved.setdefault((n, key), can) != can:
+                    solved[None] = True
+    # Create the groups
+    slow = {}
+    fast = {}
+    for c, bucket, key in data:
+        if None in canonical[bucket]:
+            # Compare against the groups in this bucket
+            b_groups = slow.setdefault(bucket, [])
+            for g in b_groups:
+                if g.match_component(c):
+                    g.add_component(c)
+                    break
+            else:
+                g = ComponentGroup(cfg)
+                g.add_component(c)
+                groups.append(g)
+                b_groups.append(g)
+            continue
+        key = (bucket, key)
+        if wild:
+            vals = tuple(c.get_field_value(f).lower() for f in wild)
+            blanks = sum(1 << n for n, v in enumerate(vals) if not v)
+            index = fast.get(key)
+            if index is None:
+                index = fast[key] = WildIndex(len(wild))
+            n = index.find(vals, blanks)
+            if n is None:
+                index.add(vals, blanks, len(groups))
+        else:
+            n = fast.get(key)
+            if n is None:
+                fast[key] = len(groups)
+        if n is None:
+            g = ComponentGroup(cfg)
+            g.add_component(c)
+            groups.append(g)
+        elif not groups[n].contains_component(c):
+            g = groups[n]
+            g.components.append(c)
+            g.refs[c.ref] = c
+    return groups
+
+
+def group_components(cfg, components):
+    comps = []
     for c in components:
         if not c.included:  # Skip components marked as excluded from BoM
             continue
@@ -308,18 +439,8 @@ def group_components(cfg, components):
             c.value_sort = comp_match(c.value, c.ref_prefix)
         else:
             c.value_sort = None
-        # Try to add the component to an existing group
-        found = False
-        for g in groups:
-            if g.match_component(c):
-                g.add_component(c)
-                found = True
-                break
-        if not found:
-            # Create a new group
-            g = ComponentGroup(cfg)
-            g.add_component(c)
-            groups.append(g)
+        comps.append(c)
+    groups = _group_components(cfg, comps)
     # Now unify the data from the components of each group
     decimal_point = None
     if cfg.normalize_locale:
@@ -361,9 +482,40 @@ def group_components(cfg, components):
     return groups
 
 
+def _hashable(v):
+    """ Lists converted to tuples, so they can be used as keys """
+    if isinstance(v, list):
+        return tuple(_hashable(e) for e in v)
+    return v
+
+
+def get_groups(cfg, components):
+    """ Groups the components using group_components.
+        The result is shared by all the BoMs using the same grouping options and the same components state (the result
+        of the filters and variants). So the groups must be considered read-only.
+        Returns the groups and a dict to store the BoMTable for each list of columns. """
+    key = (tuple(_hashable(getattr(cfg, o)) for o in GROUPS_OPTIONS),
+           tuple((c.ref, c.included, c.fitted, c.fixed) for c in components))
+    res = groups_cache.get(key)
+    if res is None:
+        groups = group_components(cfg, components)
+        res = groups_cache[key] = (groups, (cfg.n_groups, cfg.n_total, cfg.n_fitted, cfg.n_build), {})
+    else:
+        logger.debug('Using the groups from a previous BoM')
+    groups, stats, tables = res
+    # The stats are computed by group_components
+    cfg.n_groups, cfg.n_total, cfg.n_fitted, cfg.n_build = stats
+    return groups, tables
+
+
 def do_bom(file_name, ext, comps, cfg):
     # Group components according to group_fields
-    groups = group_components(cfg, comps)
+    groups, tables = get_groups(cfg, comps)
+    # Compute the cells, shared by all the BoMs using these columns
+    headings = tuple(h.lower() for h in cfg.columns)
+    table = tables.get(headings)
+    if table is None:
+        table = tables[headings] = BoMTable(groups, headings, cfg)
     # Create the BoM
     logger.debug("Saving BOM File: "+file_name)
-    write_bom(file_name, ext, groups, cfg.columns, cfg)
+    write_bom(file_name, ext, table, cfg.columns, cfg)
@@ -23,11 +23,11 @@ from .. import log
 logger = log.get_logger(__name__)
 
 
-def write_bom(filename, ext, groups, headings, cfg):
+def write_bom(filename, ext, table, headings, cfg):
     """
     Write BoM to file
     filename = output file path (absolute)
-    groups = [list of ComponentGroup groups]
+    table = BoMTable with the cells for the groups
     headings = [list of fields to use as columns]
     cfg = configuration data
     """
@@ -37,13 +37,13 @@ def write_bom(filename, ext, groups, headings, cfg):
     result = False
     # CSV file writing
     if ext in ["csv", "tsv", "txt"]:
-        result = write_csv(filename, ext, groups, headings, head_names, cfg)
+        result = write_csv(filename, ext, table, headings, head_names, cfg)
     elif ext in ["htm", "html"]:
-        result = write_html(filename, groups, headings, head_names, cfg)
+        result = write_html(filename, table, headings, head_names, cfg)
     elif ext in ["xml"]:
-        result = write_xml(filename, groups, headings, head_names, cfg)
+        result = write_xml(filename, table, headings, head_names, cfg)
     elif ext in ["xlsx"]:
-        result = write_xlsx(filename, groups, headings, head_names, cfg)
+        result = write_xlsx(filename, table, headings, head_names, cfg)
 
     if result:
         logger.debug("{} Output -> {}".format(ext.upper(), filename))
@@ -11,11 +11,11 @@ CSV Writer: Generates a CSV, TSV or TXT BoM file.
 import csv
 
 
-def write_csv(filename, ext, groups, headings, head_names, cfg):
+def write_csv(filename, ext, table, headings, head_names, cfg):
     """
     Write BoM out to a CSV file
     filename = path to output file (must be a .csv, .txt or .tsv file)
-    groups = [list of ComponentGroup groups]
+    table = BoMTable with the cells for the groups
     headings = [list of headings to search for data in the BoM file]
     head_names = [list of headings to display in the BoM file]
     cfg = BoMOptions object with all the configuration
@@ -39,11 +39,7 @@ def write_csv(filename, ext, groups, headings, head_names, cfg):
         # Headers
         writer.writerow(head_names)
         # Body
-        for group in groups:
-            if cfg.ignore_dnf and not group.is_fitted():
-                continue
-            row = group.get_row(headings)
-            writer.writerow(row)
+        writer.writerows(row for _, row, _ in table.get_rows())
         # PCB info
         if not (cfg.csv.hide_pcb_info and cfg.csv.hide_stats_info):
             # Add some blank rows
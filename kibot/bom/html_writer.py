@@ -96,7 +96,7 @@ def link(text):
     return text
 
 
-def content_table(html, groups, headings, head_names, cfg, link_datasheet, link_digikey, col_colors, dnf=False):
+def content_table(html, table, headings, head_names, cfg, link_datasheet, link_digikey, col_colors, dnf=False):
     cl = ''
     # Table start
     html.write('<table class="content-table">\n')
@@ -114,12 +114,10 @@ def content_table(html, groups, headings, head_names, cfg, link_datasheet, link_
     html.write(" <tbody>\n")
     rc = 0
     hl_empty = cfg.html.highlight_empty
-    for i, group in enumerate(groups):
-        if (cfg.ignore_dnf and not group.is_fitted()) != dnf:
-            continue
-        row = group.get_row(headings)
-        if link_datasheet != -1:
-            datasheet = group.get_field(ColumnList.COL_DATASHEET_L)
+    # Column classes
+    classes = [cell_class(h) for h in headings]
+    is_ref = [h == ColumnList.COL_REFERENCE_L for h in headings]
+    for i, row, datasheet in table.get_rows(dnf):
         html.write('  <tr id="{}">\n'.format(i))
         for n, r in enumerate(row):
             # A link to Digi-Key?
@@ -133,9 +131,9 @@ def content_table(html, groups, headings, head_names, cfg, link_datasheet, link_
                 if hl_empty and (len(r) == 0 or r.strip() == "~"):
                     cl = 'empty'
                 else:
-                    cl = cell_class(headings[n])
+                    cl = classes[n]
                 cl = ' class="td-{}{}"'.format(cl, rc % 2)
-            if headings[n] == ColumnList.COL_REFERENCE_L:
+            if is_ref[n]:
                 for ref in r.split(cfg.ref_separator):
                     r = '<div id="{}"></div>'.format(ref)+r
             html.write('   <td{}>{}</td>\n'.format(cl, link(r)))
@@ -155,11 +153,11 @@ def embed_image(file):
     return int(w), int(h), 'data:image/png;base64,'+b64encode(s).decode('ascii')
 
 
-def write_html(filename, groups, headings, head_names, cfg):
+def write_html(filename, table, headings, head_names, cfg):
     """
     Write BoM out to a HTML file
     filename = path to output file (must be a .csv, .txt or .tsv file)
-    groups = [list of ComponentGroup groups]
+    table = BoMTable with the cells for the groups
     headings = [list of headings to search for data in the BoM file]
     head_names = [list of headings to display in the BoM file]
     cfg = BoMOptions object with all the configuration
@@ -246,12 +244,12 @@ def write_html(filename, groups, headings, head_names, cfg):
 
         # Fitted groups
         html.write("<h2>Component Groups</h2>\n")
-        content_table(html, groups, headings, head_names, cfg, link_datasheet, link_digikey, col_colors)
+        content_table(html, table, headings, head_names, cfg, link_datasheet, link_digikey, col_colors)
 
         # DNF component groups
         if cfg.html.generate_dnf and cfg.n_total != cfg.n_fitted:
             html.write("<h2>Optional components (DNF=Do Not Fit)</h2>\n")
-            content_table(html, groups, headings, head_names, cfg, link_datasheet, link_digikey, col_colors, True)
+            content_table(html, table, headings, head_names, cfg, link_datasheet, link_digikey, col_colors, True)
 
         # Color reference
         if col_colors:
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+BoM table: the text of each cell, computed once and used by all the writers.
+"""
+from .columnlist import ColumnList
+
+
+class BoMTable(object):
+    """ The cells for the groups and columns of a BoM.
+        - headings: the fields used for the columns (lowercase)
+        - rows: the cells of each group (same order used for the groups)
+        - dnf: True for the rows that go to the DNF section (only when `ignore_dnf` is enabled)
+        - datasheets: the datasheet of each group (used to create links) """
+    def __init__(self, groups, headings, cfg):
+        super().__init__()
+        self.headings = headings
+        # Fields joined to each column
+        joins = []
+        for h in headings:
+            sources = []
+            for join_l in cfg.join:
+                # Each list is "target, source..."
+                if len(join_l) > 1 and join_l[0] == h:
+                    sources.extend(join_l[1:])
+            joins.append(sources)
+        columns = list(zip(headings, joins))
+        self.rows = rows = []
+        for g in groups:
+            fields = g.fields
+            row = []
+            for h, sources in columns:
+                val = fields.get(h) or ''
+                for source in sources:
+                    v = fields.get(source)
+                    if v:
+                        val = val + ' ' + v
+                row.append(val)
+            rows.append(row)
+        self.dnf = [cfg.ignore_dnf and not g.is_fitted() for g in groups]
+        self.datasheets = [g.fields.get(ColumnList.COL_DATASHEET_L) or '' for g in groups]
+        self._max_lens = {}
+
+    def get_rows(self, dnf=False):
+        """ (index, cells, datasheet) for the rows in the main (or DNF) section """
+        return ((n, row, self.datasheets[n]) for n, row in enumerate(self.rows) if self.dnf[n] == dnf)
+
+    def max_lens(self, dnf=False):
+        """ Length of the longest cell of each column in the main (or DNF) section """
+        res = self._max_lens.get(dnf)
+        if res is None:
+            res = [0]*len(self.headings)
+            for _, row, _ in self.get_rows(dnf):
+                for i, cell in enumerate(row):
+                    if len(cell) > res[i]:
+                        res[i] = len(cell)
+            self._max_lens[dnf] = res
+        return res
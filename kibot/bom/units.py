@@ -43,6 +43,8 @@ UNIT_ALL = UNIT_R + UNIT_C + UNIT_L
 match = None
 # Current locale decimal point value
 decimal_point = None
+# Already parsed values: (value, ref_prefix) -> (RLCValue or None, warning)
+parsed = {}
 
 
 def get_unit(unit, ref_prefix):
@@ -98,12 +100,32 @@ def match_string():
     return r"(\d*\.?\d*)\s*(" + group_string(PREFIX_ALL) + ")*(" + group_string(UNIT_ALL) + r")*(\d*)$"
 
 
-def comp_match(component, ref_prefix):
-    """
-    Return a normalized value and units for a given component value string
-    e.g. comp_match('10R2') returns (10, R)
-    e.g. comp_match('3.3mOhm') returns (0.0033, R)
-    """
+class RLCValue(object):
+    """ A parsed value.
+        key: the value in femto units, an exact integer used to compare values.
+        sort: string used to sort the values.
+        display: the normalized value (i.e. 4.7 kΩ). """
+    __slots__ = ('value', 'mult', 'mult_s', 'unit', 'key', 'sort', 'display')
+
+    def __init__(self, value, prefix, unit, ref_prefix):
+        super().__init__()
+        self.value = value
+        self.mult, self.mult_s = prefix
+        self.unit = unit
+        # Values with the same 15 decimals are equal
+        self.key = int("{0:.15f}".format(value * 1.0 * self.mult).replace('.', ''))
+        if ref_prefix in "CL":
+            # fempto Farads
+            self.sort = "{0:15d}".format(int(value * 1e15 * self.mult + 0.1))
+        else:
+            # milli Ohms
+            self.sort = "{0:15d}".format(int(value * 1000 * self.mult + 0.1))
+        ivalue = int(value)
+        self.display = '{} {}{}'.format(ivalue if value == ivalue else value, self.mult_s, unit)
+
+
+def _comp_match(component, ref_prefix):
+    """ Parses a value, returns the RLCValue (or None) and the warning (or None) """
     original = component
     # Remove useless spaces
     component = component.strip()
@@ -132,13 +154,11 @@ def comp_match(component, ref_prefix):
 
     result = match.match(component)
     if not result:
-        logger.warning(W_BADVAL1 + "Malformed value: `{}` (no match)".format(original))
-        return None
+        return None, W_BADVAL1 + "Malformed value: `{}` (no match)".format(original)
 
     value, prefix, units, post = result.groups()
     if value == '.':
-        logger.warning(W_BADVAL2 + "Malformed value: `{}` (reduced to decimal point)".format(original))
-        return None
+        return None, W_BADVAL2 + "Malformed value: `{}` (reduced to decimal point)".format(original)
     if value == '':
         value = '0'
 
@@ -148,43 +168,38 @@ def comp_match(component, ref_prefix):
     # We will also have a trailing number
     if post:
         if "." in value:
-            logger.warning(W_BADVAL3 + "Malformed value: `{}` (unit split, but contains decimal point)".format(original))
-            return None
+            return None, W_BADVAL3 + "Malformed value: `{}` (unit split, but contains decimal point)".format(original)
         value = float(value)
         postValue = float(post) / (10 ** len(post))
         val = value * 1.0 + postValue
     else:
         val = float(value)
 
-    # Return all the data, let the caller join it
-    return (val, get_prefix(prefix), get_unit(units, ref_prefix))
+    return RLCValue(val, get_prefix(prefix), get_unit(units, ref_prefix), ref_prefix), None
+
+
+def comp_match(component, ref_prefix):
+    """
+    Return a normalized value and units for a given component value string
+    e.g. comp_match('10R2') returns (10, R)
+    e.g. comp_match('3.3mOhm') returns (0.0033, R)
+    The result is an RLCValue, the values are parsed only once.
+    """
+    key = (component, ref_prefix)
+    res = parsed.get(key)
+    if res is None:
+        res = parsed[key] = _comp_match(component, ref_prefix)
+    value, warning = res
+    if warning:
+        logger.warning(warning)
+    return value
 
 
 def compare_values(c1, c2):
     """ Compare two values """
-
     # These are the results from comp_match()
     r1 = c1.value_sort
     r2 = c2.value_sort
-
     if not r1 or not r2:
         return False
-
-    # Join the data to compare
-    (v1, (p1, ps1), u1) = r1
-    (v2, (p2, ps2), u2) = r2
-
-    v1 = "{0:.15f}".format(v1 * 1.0 * p1)
-    v2 = "{0:.15f}".format(v2 * 1.0 * p2)
-
-    if v1 == v2:
-        # Values match
-        if u1 == u2:
-            return True  # Units match
-        # No longer posible because now we use the prefix to determine absent units
-        # if not u1:
-        #     return True  # No units for component 1
-        # if not u2:
-        #     return True  # No units for component 2
-
-    return False
+    return r1.key == r2.key and r1.unit == r2.unit
@@ -202,11 +202,11 @@ def adjust_heights(worksheet, rows, max_width, head_size):
             worksheet.set_row(head_size+rn, 15.0*max_h)
 
 
-def write_xlsx(filename, groups, col_fields, head_names, cfg):
+def write_xlsx(filename, table, col_fields, head_names, cfg):
     """
     Write BoM out to a XLSX file
     filename = path to output file (must be a .csv, .txt or .tsv file)
-    groups = [list of ComponentGroup groups]
+    table = BoMTable with the cells for the groups
     col_fields = [list of headings to search for data in the BoM file]
     head_names = [list of headings to display in the BoM file]
     cfg = BoMOptions object with all the configuration
@@ -265,7 +265,6 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
         # Headings
         # Create the head titles
         column_widths = [0]*len(col_fields)
-        rows = [row_headings]
         for i in range(len(row_headings)):
             # Title for this column
             column_widths[i] = len(row_headings[i]) + 10
@@ -273,14 +272,7 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
 
         # Body
         row_count += 1
-        for i, group in enumerate(groups):
-            if (cfg.ignore_dnf and not group.is_fitted()) != dnf:
-                continue
-            # Get the data row
-            row = group.get_row(col_fields)
-            rows.append(row)
-            if link_datasheet != -1:
-                datasheet = group.get_field(ColumnList.COL_DATASHEET_L)
+        for _, row, datasheet in table.get_rows(dnf):
             # Fill the row
             for i in range(len(row)):
                 cell = row[i]
@@ -297,9 +289,12 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
                     worksheet.write_url(row_count, i, url, fmt, cell)
                 else:
                     worksheet.write_string(row_count, i, cell, fmt)
-                if len(cell) > column_widths[i] - 5:
-                    column_widths[i] = len(cell) + 5
             row_count += 1
+        # Make room for the longest cell
+        max_lens = table.max_lens(dnf)
+        for i, max_len in enumerate(max_lens):
+            if max_len > column_widths[i] - 5:
+                column_widths[i] = max_len + 5
 
         # Page head
         # Logo
@@ -328,7 +323,10 @@ def write_xlsx(filename, groups, col_fields, head_names, cfg):
 
         # Adjust cols and rows
         adjust_widths(worksheet, column_widths, max_width)
-        adjust_heights(worksheet, rows, max_width, head_size)
+        # Only cells longer than max_width are wrapped
+        if max(max_lens+[len(h) for h in row_headings]) > max_width:
+            rows = [row_headings]+[row for _, row, _ in table.get_rows(dnf)]
+            adjust_heights(worksheet, rows, max_width, head_size)
 
         worksheet.freeze_panes(head_size+1, 0)
         worksheet.repeat_rows(head_size+1)
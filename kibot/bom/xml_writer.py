@@ -9,18 +9,43 @@
 """
 XML Writer: Generates an XML BoM file.
 """
-from xml.etree import ElementTree
-from xml.dom import minidom
+import re
+import sys
 
+# Python 3.7 and older sorted the attributes
+SORT_ATTRS = sys.version_info < (3, 8)
+# Control characters aren't allowed in XML 1.0, not even escaped, so we remove them (except tabs and line breaks)
+INVALID_CHARS = [chr(c) for c in range(32) if c not in (9, 10, 13)]+['\ufffe', '\uffff']
+# Characters that can't be used in an attribute value.
+# Note: we also escape the tabs and line breaks, otherwise they are converted to spaces when reading the file.
+ATTR_ESCAPE = str.maketrans(dict({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', '\t': '&#9;', '\n': '&#10;',
+                                  '\r': '&#13;'}, **dict.fromkeys(INVALID_CHARS)))
+# Characters that can't be used in an attribute name
+INVALID_NAME_CHARS = re.compile(r'[^\w.\-]')
 
-def write_xml(filename, groups, headings, head_names, cfg):
+
+def tag(name, names, values, end):
+    """ Creates an XML tag, the values are escaped and the invalid characters removed.
+        Repeated names are solved like a dict: first position, last value. """
+    attrs = dict(zip(names, values)).items()
+    if SORT_ATTRS:
+        attrs = sorted(attrs)
+    return '<'+name+''.join([' {}="{}"'.format(n, v.translate(ATTR_ESCAPE)) for n, v in attrs])+end
+
+
+def write_xml(filename, table, headings, head_names, cfg):
     """
     Write BoM out to an XML file
     filename = path to output file (must be a .csv, .txt or .tsv file)
-    groups = [list of ComponentGroup groups]
+    table = BoMTable with the cells for the groups
     headings = [list of headings to search for data in the BoM file]
     head_names = [list of headings to display in the BoM file]
     cfg = BoMOptions object with all the configuration
+    The file is written while we generate it, the format is the same we get using minidom.toprettyxml.
+    But tabs and line breaks in the values are written as character references, minidom wrote them raw and they
+    became spaces when reading the file.
+    Note: this avoids the ElementTree and minidom copies of the BoM, but the rows come from the table, which is in
+    memory (shared with the other formats).
     """
     attrib = {}
     attrib['Schematic_Source'] = cfg.source
@@ -33,26 +58,31 @@ def write_xml(filename, groups, headings, head_names, cfg):
     attrib['Fitted_Components'] = str(cfg.n_fitted)
     attrib['Number_of_PCBs'] = str(cfg.number)
     attrib['Total_Components'] = str(cfg.n_build)
+    attrib['encoding'] = 'utf-8'
 
-    xml = ElementTree.Element('KiCad_BOM', attrib=attrib, encoding='utf-8')
-    for group in groups:
-        if cfg.ignore_dnf and not group.is_fitted():
-            continue
-        row = group.get_row(headings)
-        attrib = {}
-        for i, h in enumerate(head_names):
-            # Adapt the column name to a valid XML attribute name
-            h = h.replace(' ', '_')
-            h = h.replace('"', '')
-            h = h.replace("'", '')
-            h = h.replace('#', '_num')
-            attrib[h] = str(row[i])
-        ElementTree.SubElement(xml, "group", attrib=attrib)
-
+    # Adapt the column names to valid XML attribute names
+    names = []
+    for h in head_names:
+        h = h.replace(' ', '_')
+        h = h.replace('"', '')
+        h = h.replace("'", '')
+        h = h.replace('#', '_num')
+        h = INVALID_NAME_CHARS.sub('_', h)
+        if not h or not (h[0].isalpha() or h[0] == '_'):
+            h = '_'+h
+        names.append(h)
     # Most of the UTF-8 enforcement here is for Windows
-    # Selecting it in the tostring  call is enough for Linux
     with open(filename, "wt", encoding="utf-8") as output:
-        out = ElementTree.tostring(xml, encoding="utf-8")
-        output.write(minidom.parseString(out).toprettyxml(indent="\t", encoding="utf-8").decode("utf-8"))
+        output.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        rows = table.get_rows()
+        row = next(rows, None)
+        if row is None:
+            output.write(tag('KiCad_BOM', attrib.keys(), attrib.values(), '/>\n'))
+        else:
+            output.write(tag('KiCad_BOM', attrib.keys(), attrib.values(), '>\n'))
+            while row is not None:
+                output.write('\t'+tag('group', names, row[1], '/>\n'))
+                row = next(rows, None)
+            output.write('</KiCad_BOM>\n')
 
     return True
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Persistent cache used to skip the outputs that are up to date.
+
+For each output we store a fingerprint of its inputs and the files it generated.
+The fingerprint includes:
+- The hash of the files used (PCB, schematic sheets, libraries, etc.)
+- The resolved options
+- The global options (preflights, KiBot and KiCad versions)
+The versions of the tools used are stored separated, they are checked only when the rest matches.
+"""
+import os
+import re
+import json
+from hashlib import sha1
+from .gs import GS
+from .pre_base import BasePreFlight
+from . import log
+
+logger = log.get_logger(__name__)
+CACHE_NAME = '.kibot_cache.json'
+CACHE_VERSION = 1
+PATTERN_TYPE = type(re.compile(''))
+
+
+def _serialize(v, visited=None):
+    """ Converts a value (usually an Optionable) into something we can dump to JSON """
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if isinstance(v, (list, tuple, set)):
+        res = [_serialize(e, visited) for e in v]
+        return sorted(res, key=str) if isinstance(v, set) else res
+    if isinstance(v, dict):
+        return {str(k): _serialize(e, visited) for k, e in v.items()}
+    if isinstance(v, type):
+        return v.__name__
+    if isinstance(v, PATTERN_TYPE):
+        return v.pattern
+    if visited is None:
+        visited = set()
+    if id(v) in visited:
+        # Avoid loops
+        return '<'+type(v).__name__+'>'
+    visited.add(id(v))
+    if hasattr(v, 'get_attrs_gen'):
+        # An Optionable, use the public attributes
+        attrs = v.get_attrs_gen()
+    elif hasattr(v, '__dict__'):
+        attrs = ((k, e) for k, e in vars(v).items() if k[0] != '_')
+    else:
+        return str(v)
+    res = {k: _serialize(e, visited) for k, e in attrs if not callable(e) or isinstance(e, type)}
+    res['__class__'] = type(v).__name__
+    visited.discard(id(v))
+    return res
+
+
+def hash_file(name):
+    """ SHA1 of the file, None if it doesn't exist """
+    if not os.path.isfile(name):
+        return None
+    hash = sha1()
+    with open(name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+
+class BuildCache(object):
+    """ Keeps track of the fingerprint and generated files for each output """
+    def __init__(self, out_dir, force=False):
+        super().__init__()
+        self.file = os.path.join(out_dir, CACHE_NAME)
+        self.force = force
+        self.data = {}
+        self._hashes = {}
+        self._tool_versions = {}
+        self._snapshots = {}
+        self._fingerprints = {}
+        if os.path.isfile(self.file):
+            try:
+                with open(self.file, 'rt') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self.data = data.get('outputs', {})
+            except (OSError, ValueError) as e:
+                logger.debug('Ignoring corrupted cache `{}` ({})'.format(self.file, e))
+
+    def _hash_file(self, name):
+        """ SHA1 of the file, None if it doesn't exist. Computed only once. """
+        h = self._hashes.get(name, False)
+        if h is False:
+            h = self._hashes[name] = hash_file(name)
+        return h
+
+    def _tool_version(self, command):
+        if command not in self._tool_versions:
+            from .kiplot import get_tool_version
+            self._tool_versions[command] = get_tool_version(command)[0]
+        return self._tool_versions[command]
+
+    def _fingerprint(self, out):
+        files = {f: self._hash_file(f) for f in out.get_dependencies()}
+        options = _serialize(out)
+        data = {'output': options,
+                'files': files,
+                'preflight': _serialize(BasePreFlight._options),
+                'kibot': GS.kibot_version,
+                'kicad': GS.kicad_version_n}
+        dump = json.dumps(data, sort_keys=True)
+        if '%D' in dump or '%T' in dump:
+            # The name of the files depends on the date/time
+            dump += GS.today+GS.time
+        return sha1(dump.encode()).hexdigest()
+
+    @staticmethod
+    def _dir_state(out_dir):
+        """ Files in the output directory and their size/modification time """
+        res = {}
+        if os.path.isdir(out_dir):
+            for entry in os.scandir(out_dir):
+                if entry.name != CACHE_NAME and entry.is_file():
+                    st = entry.stat()
+                    res[entry.path] = [st.st_size, st.st_mtime_ns]
+        return res
+
+    def is_up_to_date(self, out, out_dir):
+        """ True if the output was already generated using the same inputs """
+        fingerprint = self._fingerprint(out)
+        self._fingerprints[out.name] = fingerprint
+        if self.force:
+            return False
+        entry = self.data.get(out.name)
+        if entry is None or entry.get('fingerprint') != fingerprint:
+            return False
+        # All the generated files must be there, untouched
+        for name, state in entry.get('files', {}).items():
+            name = os.path.join(out_dir, name)
+            try:
+                st = os.stat(name)
+            except OSError:
+                logger.debug('`{}` is missing'.format(name))
+                return False
+            if [st.st_size, st.st_mtime_ns] != state:
+                logger.debug('`{}` was modified'.format(name))
+                return False
+        # The tools used must have the same version
+        for command, version in entry.get('tools', {}).items():
+            if self._tool_version(command) != version:
+                logger.debug('`{}` version changed'.format(command))
+                return False
+        return True
+
+    def start(self, out, out_dir):
+        """ Called before generating the output """
+        self._snapshots[out.name] = self._dir_state(out_dir)
+
+    def done(self, out, out_dir, tools):
+        """ Called after generating the output, `tools` is a dict with the versions of the tools used """
+        before = self._snapshots.pop(out.name)
+        files = {os.path.relpath(k, out_dir): v for k, v in self._dir_state(out_dir).items() if before.get(k) != v}
+        if not files:
+            # We don't know what this output generated, don't skip it
+            self.data.pop(out.name, None)
+        else:
+            self.data[out.name] = {'fingerprint': self._fingerprints[out.name], 'files': files, 'tools': tools}
+        self.save()
+
+    def save(self):
+        try:
+            with open(self.file, 'wt') as f:
+                json.dump({'version': CACHE_VERSION, 'outputs': self.data}, f, sort_keys=True, indent=1)
+        except OSError as e:
+            logger.debug('Unable to save the cache `{}` ({})'.format(self.file, e))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""KiBot client: submits a job to a KiBot server (kibot --serve SOCKET)
+
+Usage:
+  kibot-client SOCKET [KIBOT_ARGS...]
+
+The KIBOT_ARGS are the same used for kibot, relative paths are solved using
+the current directory. The exit code is the one from the job.
+"""
+import os
+import sys
+import json
+import socket
+from .misc import EXIT_BAD_ARGS, SERVER_ERROR
+
+
+def main():
+    # Keep it simple: we don't want to import anything heavy here
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print(__doc__.strip())
+        sys.exit(0 if len(sys.argv) > 1 else EXIT_BAD_ARGS)
+    name = sys.argv[1]
+    request = {'args': sys.argv[2:], 'cwd': os.getcwd()}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(name)
+            conn.sendall((json.dumps(request)+'\n').encode())
+            with conn.makefile('rb') as f:
+                for line in f:
+                    msg = json.loads(line.decode())
+                    if 'out' in msg:
+                        sys.stdout.write(msg['out'])
+                        sys.stdout.flush()
+                    elif 'err' in msg:
+                        sys.stderr.write(msg['err'])
+                        sys.stderr.flush()
+                    elif 'exit' in msg:
+                        sys.exit(msg['exit'])
+    except (OSError, ValueError) as e:
+        sys.stderr.write('Error talking to the KiBot server at `{}`: {}\n'.format(name, e))
+        sys.exit(SERVER_ERROR)
+    sys.stderr.write('The KiBot server at `{}` closed the connection\n'.format(name))
+    sys.exit(SERVER_ERROR)
@@ -3,9 +3,9 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-from pcbnew import (PCB_PLOT_PARAMS)
 from .error import KiPlotConfigurationError
 from .out_any_layer import AnyLayerOptions
+from .kiplot import load_pcbnew
 from .macros import macros, document  # noqa: F401
 from . import log
 
@@ -15,17 +15,12 @@ logger = log.get_logger(__name__)
 class DrillMarks(AnyLayerOptions):
     """ This class provides the drill_marks attribute.
         Used by DXF, HPGL, PDF, PS and SVG formats. """
-    # Mappings to KiCad values
+    # Mappings to KiCad values (PCB_PLOT_PARAMS members, solved when plotting)
     _drill_marks_map = {
-                        'none': PCB_PLOT_PARAMS.NO_DRILL_SHAPE,
-                        'small': PCB_PLOT_PARAMS.SMALL_DRILL_SHAPE,
-                        'full': PCB_PLOT_PARAMS.FULL_DRILL_SHAPE,
+                        'none': 'NO_DRILL_SHAPE',
+                        'small': 'SMALL_DRILL_SHAPE',
+                        'full': 'FULL_DRILL_SHAPE',
                        }
-    _drill_marks_rev_map = {
-                            PCB_PLOT_PARAMS.NO_DRILL_SHAPE: 'none',
-                            PCB_PLOT_PARAMS.SMALL_DRILL_SHAPE: 'small',
-                            PCB_PLOT_PARAMS.FULL_DRILL_SHAPE: 'full',
-                           }
 
     def __init__(self):
         super().__init__()
@@ -43,15 +38,16 @@ class DrillMarks(AnyLayerOptions):
             raise KiPlotConfigurationError("Unknown drill mark type: {}".format(val))
         self._drill_marks = val
 
-    def config(self):
-        super().config()
-        self._drill_marks = DrillMarks._drill_marks_map[self._drill_marks]
-
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
         super()._configure_plot_ctrl(po, output_dir)
         # How we draw drill marks
-        po.SetDrillMarksType(self._drill_marks)
+        po.SetDrillMarksType(getattr(pcbnew.PCB_PLOT_PARAMS, DrillMarks._drill_marks_map[self._drill_marks]))
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
-        self._drill_marks = DrillMarks._drill_marks_rev_map[po.GetDrillMarksType()]
+        marks = po.GetDrillMarksType()
+        for k, v in DrillMarks._drill_marks_map.items():
+            if getattr(pcbnew.PCB_PLOT_PARAMS, v) == marks:
+                self._drill_marks = k
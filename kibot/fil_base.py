@@ -67,7 +67,7 @@ class NotFilter(Registrable):
 
 def reset_filters(comps):
     for c in comps:
-        c.included = True
+        c.included = c.in_bom
         c.fitted = True
         c.fixed = False
 
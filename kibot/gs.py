@@ -34,11 +34,14 @@ class GS(object):
     board = None
     sch = None
     debug_enabled = False
+    # Use the persistent cache for the schematic (--cache-sch)
+    cache_sch = False
     debug_level = 0
     n = datetime.now()
     today = n.strftime('%Y-%m-%d')
     time = n.strftime('%H-%M-%S')
     kicad_version = ''
+    kibot_version = ''
     # KiCad version: major*1e6+minor*1e3+patch
     kicad_version_n = 0
     kicad_version_major = 0
@@ -66,6 +69,32 @@ class GS(object):
     global_variant = None
     global_opts_class = None
 
+    @staticmethod
+    def reset():
+        """ Discard the project related values.
+            Used when we process more than one project using the same process. """
+        GS.pcb_file = GS.pcb_no_ext = GS.pcb_dir = GS.pcb_basename = None
+        GS.sch_file = GS.sch_no_ext = GS.sch_dir = GS.sch_basename = None
+        GS.out_dir = None
+        GS.global_from_cli = {}
+        GS.global_output = None
+        GS.global_variant = None
+        GS.reset_loaded()
+
+    @staticmethod
+    def reset_loaded():
+        """ Discard the values loaded from the PCB, schematic and configuration.
+            The names of the files are kept. """
+        GS.filter_file = None
+        GS.board = None
+        GS.sch = None
+        GS.n = datetime.now()
+        GS.today = GS.n.strftime('%Y-%m-%d')
+        GS.time = GS.n.strftime('%H-%M-%S')
+        GS.board_comps_joined = False
+        GS.sch_title = GS.sch_date = GS.sch_rev = GS.sch_comp = None
+        GS.pcb_title = GS.pcb_date = GS.pcb_rev = GS.pcb_comp = None
+
     @staticmethod
     def set_sch(name):
         if name:
@@ -92,16 +121,25 @@ class GS(object):
         GS.sch_date = ''
         GS.sch_rev = ''
         GS.sch_comp = ''
-        re_val = re.compile(r"(\w+)\s+\"([^\"]+)\"")
+        if GS.sch_file.endswith('.kicad_sch'):
+            # KiCad 6: (title_block (title "T") (date "D") (rev "R") (company "C")), before the (lib_symbols
+            re_val = re.compile(r"\s*\((title|date|rev|company)\s+\"((?:[^\"\\]|\\.)+)\"\)")
+            names = {'title': 'Title', 'date': 'Date', 'rev': 'Rev', 'company': 'Comp'}
+            end = "  (lib_symbols"
+        else:
+            re_val = re.compile(r"(\w+)\s+\"([^\"]+)\"")
+            names = {}
+            end = "$EndDescr"
         with open(GS.sch_file) as f:
             for line in f:
                 m = re_val.match(line)
                 if not m:
-                    if line.startswith("$EndDescr"):
+                    if line.startswith(end):
                         break
                     # This line is executed, but coverage fails to detect it
                     continue  # pragma: no cover
                 name, val = m.groups()
+                name = names.get(name, name)
                 if name == "Title":
                     GS.sch_title = val
                 elif name == "Date":
@@ -120,6 +120,25 @@ class KiConf(object):
         KiConf.load_all_lib_aliases()
         KiConf.loaded = True
 
+    def reset():
+        """ Forget the loaded configuration, used to process another project """
+        KiConf.loaded = False
+        KiConf.config_dir = None
+        KiConf.dirname = None
+        KiConf.sym_lib_dir = None
+        KiConf.kicad_env = {}
+        KiConf.lib_aliases = {}
+
+    def get_config_files():
+        """ The KiCad configuration files that affects the libraries (even the missing ones) """
+        files = []
+        if KiConf.config_dir:
+            files.append(os.path.join(KiConf.config_dir, KICAD_COMMON))
+            files.append(os.path.join(KiConf.config_dir, SYM_LIB_TABLE))
+        if KiConf.dirname is not None:
+            files.append(os.path.join(KiConf.dirname, SYM_LIB_TABLE))
+        return files
+
     def find_kicad_common():
         """ Looks for kicad_common config file.
             Returns its name or None. """
@@ -11,15 +11,30 @@ Currently oriented to collect the components for the BoM.
 # Encapsulate file/line
 import re
 import os
+import io
+import gc
+import marshal
+import locale
+import threading
+from sys import intern
+from copy import copy
+from operator import attrgetter
+from hashlib import sha1
 from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from .config import KiConf, un_quote
 from ..gs import GS
+from ..plugins import get_cache_dir
 from ..misc import (W_BADPOLI, W_POLICOORDS, W_BADSQUARE, W_BADCIRCLE, W_BADARC, W_BADTEXT, W_BADPIN, W_BADCOMP, W_BADDRAW,
                     W_UNKDCM, W_UNKAR, W_ARNOPATH, W_ARNOREF, W_MISCFLD, W_EXTRASPC, W_NOLIB, W_INCPOS, W_NOANNO, W_MISSLIB,
                     W_MISSDCM, W_MISSCMP)
 from .. import log
 
 logger = log.get_logger(__name__)
+LIB_INDEX_VERSION = 1
+# Threads used to read the libraries
+LIB_READ_THREADS = 8
 
 
 class SchError(Exception):
@@ -41,64 +56,121 @@ class SchLibError(SchFileError):
 
 
 class LineReader(object):
+    """ Reads the whole file at once and then serves it line by line.
+        Much faster than a readline() for each line, specially for big files.
+        `line` is the number of the last line returned, used for the error messages. """
     def __init__(self, f, file):
         super().__init__()
         self.line = 0
         self.file = file
-        self.f = f
+        # The text mode already translated the line endings, so we just need to split at \n
+        lines = f.read().split('\n')
+        if not lines[-1]:
+            # The file ends with a new line, or is empty
+            lines.pop()
+        self.lines = [ln.rstrip() for ln in lines]
+        self.n_lines = len(self.lines)
+        # Index of the next line to return
+        self.pos = 0
 
 
 class SCHLineReader(LineReader):
     def __init__(self, f, file):
         super().__init__(f, file)
+        # Raw content of the file, only used to get blocks of it (see `get_raw_block`)
+        self.raw = None
+        # Last computed line offset (index, offset)
+        self.raw_pos = (0, 0)
 
     def get_line(self):
-        res = self.f.readline()
-        if not res:
+        pos = self.pos
+        if pos >= self.n_lines:
             raise SchFileError('Unexpected end of file', '', self)
-        self.line += 1
-        return res.rstrip()
+        self.pos = self.line = pos+1
+        return self.lines[pos]
+
+    def _line_offset(self, line):
+        """ Offset, in the raw content, of the line with index `line` (from the last computed) """
+        raw = self.raw
+        n, offset = self.raw_pos
+        if line < n:
+            n = offset = 0
+        while n < line:
+            offset = raw.find(b'\n', offset)+1
+            if not offset:
+                return None
+            n += 1
+        self.raw_pos = (n, offset)
+        return offset
+
+    def get_raw_block(self, start, end):
+        """ The lines from `start` to `end` (excluded, indexes), as they are in the file (without the last \\n).
+            Returns the offset and a memoryview of the raw content, or None if the lines doesn't match. """
+        if self.raw is None:
+            with open(self.file, 'rb') as f:
+                self.raw = f.read()
+        offset = self._line_offset(start)
+        end_offset = self._line_offset(end)
+        if offset is None or end_offset is None or end_offset <= offset:
+            return None
+        raw = self.raw
+        # Check we are really looking at the same lines, i.e. no \r used as line separator
+        if not raw.startswith(self.lines[start].encode(), offset) or not raw.startswith(self.lines[end].encode(), end_offset):
+            return None
+        return offset, memoryview(raw)[offset:end_offset-1]
 
 
 class LibLineReader(LineReader):
+    end_mark = '#End Library'
+
     def __init__(self, f, file):
         super().__init__(f, file)
 
     def get_line(self):
-        res = self.f.readline()
-        while res and res[0] == '#':
-            if res.startswith('#End Library'):
-                return res.rstrip()
+        """ Next line, skipping the comments """
+        lines = self.lines
+        n_lines = self.n_lines
+        pos = self.pos
+        while pos < n_lines:
+            res = lines[pos]
+            pos += 1
+            if res[:1] != '#':
+                self.pos = pos
+                self.line += 1
+                return res
+            if res.startswith(self.end_mark):
+                self.pos = pos
+                return res
             self.line += 1
-            res = self.f.readline()
-        if not res:
-            raise SchLibError('Unexpected end of file', '', self)
-        self.line += 1
-        return res.rstrip()
+        self.pos = pos
+        raise SchLibError('Unexpected end of file', '', self)
 
 
-class DCMLineReader(LineReader):
+class DCMLineReader(LibLineReader):
+    end_mark = '#End Doc Library'
+
     def __init__(self, f, file):
         super().__init__(f, file)
 
-    def get_line(self):
-        res = self.f.readline()
-        while res and res[0] == '#':
-            if res.startswith('#End Doc Library'):
-                return res.rstrip()
-            self.line += 1
-            res = self.f.readline()
-        if not res:
-            raise SchLibError('Unexpected end of file', '', self)
-        self.line += 1
-        return res.rstrip()
-
 
 def _split_space(s):
     res = s.lstrip().split(' ')
     return [a for a in res if a]
 
 
+@contextmanager
+def no_gc():
+    """ Disables the garbage collector while we create lots of objects.
+        The loaded objects don't have reference cycles, so the collector just wastes time looking at them. """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 class LibComponentField(object):
     """ A field for a component in the library.
         Almost the same as a field in the schematic, but incompatible!!! """
@@ -114,6 +186,9 @@ class LibComponentField(object):
                           r'([LRCBT][IN][BN])\s*'  # 8 VJustify+Italic+Bold
                           r'("[^"]*")?')   # 9 Name for user fields
 
+    __slots__ = ('number', 'value', 'x', 'y', 'size', 'horizontal', 'visible', 'hjustify', 'vjustify', 'italic', 'bold',
+                 'name')
+
     def __init__(self):
         super().__init__()
 
@@ -165,6 +240,8 @@ class DrawPoligon(object):
                         r'((?:-?\d+\s+)+)'  # 4 The points
                         r'([NFf])')         # 5 Normal, Filled
 
+    __slots__ = ('points', 'sub_part', 'convert', 'thickness', 'fill', 'coords')
+
     def __init__(self):
         super().__init__()
 
@@ -220,6 +297,8 @@ class DrawRectangle(object):
                         r'(\d+)\s+'     # 6 Thickness
                         r'([NFf])')     # 7 Normal, Filled
 
+    __slots__ = ('start_x', 'start_y', 'end_x', 'end_y', 'sub_part', 'convert', 'thickness', 'fill')
+
     def __init__(self):
         super().__init__()
 
@@ -263,6 +342,8 @@ class DrawCircle(object):
                         r'(\d+)\s+'     # 5 Thickness
                         r'([NFf])')     # 6 Normal, Filled
 
+    __slots__ = ('pos_x', 'pos_y', 'radius', 'sub_part', 'convert', 'thickness', 'fill')
+
     def __init__(self):
         super().__init__()
 
@@ -311,6 +392,9 @@ class DrawArc(object):
                         r'(-?\d+)\s+'   # 11 End Pos X
                         r'(-?\d+)')     # 12 End Pos Y
 
+    __slots__ = ('pos_x', 'pos_y', 'radius', 'start', 'end', 'sub_part', 'convert', 'thickness', 'fill', 'start_x', 'start_y',
+                 'end_x', 'end_y')
+
     def __init__(self):
         super().__init__()
 
@@ -366,6 +450,9 @@ class DrawText(object):
                         r'([CLR])\s+'                # 10 HJustify
                         r'([CBT])')                  # 11 VJustify
 
+    __slots__ = ('orientation', 'pos_x', 'pos_y', 'size', 'type', 'sub_part', 'convert', 'text', 'italic', 'bold', 'hjustify',
+                 'vjustify')
+
     def __init__(self):
         super().__init__()
 
@@ -415,6 +502,9 @@ class Pin(object):
                         r'([IOBTPUWwCEN])'  # 10 Electrical type
                         r'((?:\s+)\S+)?')   # 11 Graphic type
 
+    __slots__ = ('name', 'number', 'pos_x', 'pos_y', 'len', 'dir', 'size_name', 'size_num', 'sub_part', 'convert', 'type',
+                 'gtype')
+
     def __init__(self):
         super().__init__()
 
@@ -460,6 +550,122 @@ class Pin(object):
         return 0, 0, 0, 0, False
 
 
+def _comments_re(end_mark):
+    """ Any number of comment lines, but not the end mark """
+    return re.compile(rb'(?:#(?!'+re.escape(end_mark[1:].encode())+rb')[^\n]*\n)*')
+
+
+class LibIndexer(object):
+    """ Finds the entries (i.e. DEF ... ENDDEF) of a library without parsing them.
+        Used to parse only the entries we need.
+        The index is cached using the size and modification time of the file. """
+    def __init__(self, signature, end_mark, begin, end, extra=None):
+        super().__init__()
+        comments = _comments_re(end_mark)
+        self.header_re = re.compile(comments.pattern+re.escape(signature.encode())+rb'[^\n]*\n'+comments.pattern)
+        self.comments_re = comments
+        self.tail_re = re.compile(comments.pattern+re.escape(end_mark.encode()))
+        tags = [begin, end]
+        if extra:
+            tags.append(extra)
+        self.tags_re = re.compile(rb'^('+rb'|'.join(re.escape(t.encode()) for t in tags)+rb')[^\n]*', re.M)
+        self.begin = begin.encode()
+        self.end = end.encode()
+
+    def scan(self, data):
+        """ Returns a list of [start, end, line, [lines]] for each entry.
+            `start` and `end` are byte offsets, `line` is the number of the first line and `lines` are the tagged lines.
+            Returns None if the file has something unusual, the caller must parse the whole file to report it. """
+        m = self.header_re.match(data)
+        if not m:
+            return None
+        pos = m.end()
+        line = data.count(b'\n', 0, pos)+1
+        entries = []
+        entry = None
+        # The encoding used by open(file, 'rt')
+        encoding = locale.getpreferredencoding(False)
+        for m in self.tags_re.finditer(data, pos):
+            tag = m.group(1)
+            start = m.start()
+            if entry is None:
+                # Between entries we can only have comments
+                if tag != self.begin or self.comments_re.match(data, pos).end() != start:
+                    return None
+                line += data.count(b'\n', pos, start)
+                entry = [start, 0, line, []]
+            elif tag == self.begin:
+                return None
+            try:
+                entry[3].append(m.group(0).decode(encoding).rstrip())
+            except (UnicodeDecodeError, LookupError):
+                return None
+            if tag == self.end:
+                pos = m.end()+1
+                entry[1] = pos
+                line += data.count(b'\n', start, pos)
+                entries.append(entry)
+                entry = None
+        if entry is not None or pos > len(data) or not self.tail_re.match(data, pos):
+            return None
+        return entries
+
+    @staticmethod
+    def _cache_file(fname):
+        cache = get_cache_dir()
+        if cache is None:
+            return None
+        name = os.path.basename(fname)+'-'+sha1(fname.encode()).hexdigest()[:16]+'.bin'
+        return os.path.join(cache, 'libs', name)
+
+    def get_index(self, file, scan):
+        """ The index for this file, from the cache or using `scan` (receives the `scan` result) """
+        fname = os.path.abspath(file)
+        st = os.stat(fname)
+        stamp = [fname, st.st_mtime_ns, st.st_size]
+        cache = self._cache_file(fname)
+        if cache:
+            try:
+                with open(cache, 'rb') as f:
+                    version, c_stamp, index = marshal.load(f)
+                if version == LIB_INDEX_VERSION and c_stamp == stamp:
+                    return index
+            except (OSError, ValueError, EOFError, TypeError):
+                pass
+        with open(fname, 'rb') as f:
+            entries = self.scan(f.read())
+        index = scan(entries) if entries is not None else None
+        if cache:
+            # The libs are read from more than one thread
+            tmp = cache+'.'+str(os.getpid())+'.'+str(threading.get_ident())
+            try:
+                os.makedirs(os.path.dirname(cache), exist_ok=True)
+                with open(tmp, 'wb') as f:
+                    marshal.dump((LIB_INDEX_VERSION, stamp, index), f)
+                os.replace(tmp, cache)
+            except OSError as e:
+                logger.debug('Unable to cache the index for `{}` ({})'.format(fname, e))
+        return index
+
+    @staticmethod
+    def read_entries(file, entries):
+        """ Reads the raw content of the entries, a list of (start, end) """
+        res = []
+        with open(file, 'rb') as fh:
+            for start, end in entries:
+                fh.seek(start)
+                res.append(fh.read(end-start))
+        return res
+
+    @staticmethod
+    def entry_reader(data, file, line, reader):
+        """ A reader for the entry, the line numbers are the ones from the file """
+        # Same decoding and new line translation we get from open(file, 'rt')
+        f = reader(io.TextIOWrapper(io.BytesIO(data)), file)
+        f.line = line-1
+        return f
+
+
 class LibComponent(object):
     def_re = re.compile(r'DEF\s+'
                         r'(\S+)\s+'     # 0 Name
@@ -621,10 +827,78 @@ class SymLib(object):
                 return True
         return False
 
-    def load(self, file, lib_alias, needed):
-        """ Populates the class, file must exist """
+    @staticmethod
+    def _is_needed(id, lib, needed):
+        return lib+':'+id in needed or 'None:'+id in needed
+
+    def _add(self, o, lib_alias, needed):
+        if o.name:
+            # Only add components we need
+            if self._check_add(o, o.name, lib_alias, needed):
+                self.comps[o.name] = o
+            if o.alias:
+                for a in o.alias:
+                    if self._check_add(o, a, lib_alias, needed):
+                        self.alias[a] = o
+
+    @staticmethod
+    def _scan(entries):
+        """ Index entries: [name, aliases, start, end, line] """
+        index = []
+        for start, end, line, lines in entries:
+            m = LibComponent.def_re.match(lines[0])
+            name = m.group(1) if m else None
+            if name and name[0] == '~':
+                name = name[1:]
+            aliases = []
+            for ln in lines:
+                if ln.startswith('ALIAS'):
+                    aliases.extend(_split_space(ln[6:]))
+            index.append([name, aliases, start, end, line])
+        return index
+
+    @staticmethod
+    def read(file, lib_alias, needed):
+        """ Reads the entries for the `needed` components, without parsing them (can be used from other threads).
+            Returns a list of (line, raw data), or None if we must parse the whole file. """
+        index = SYM_LIB_INDEXER.get_index(file, SymLib._scan)
+        if index is None:
+            return None
+        wanted = [e for e in index if e[0] and SymLib._is_needed(e[0], lib_alias, needed) or
+                  any(SymLib._is_needed(a, lib_alias, needed) for a in e[1])]
+        return [(e[4], data) for e, data in zip(wanted, LibIndexer.read_entries(file, [e[2:4] for e in wanted]))]
+
+    def _load_needed(self, file, entries, lib_alias, needed):
+        """ Parses the components we need. Returns False if we must parse the whole file. """
+        comps = []
+        with no_gc():
+            for line, data in entries:
+                f = LibIndexer.entry_reader(data, file, line, LibLineReader)
+                try:
+                    o = LibComponent(f.get_line(), f, file)
+                except SchLibError:
+                    return False
+                if f.pos != f.n_lines:
+                    return False
+                comps.append(o)
+        for o in comps:
+            self._add(o, lib_alias, needed)
+        return True
+
+    def load(self, file, lib_alias, needed, entries=False):
+        """ Populates the class, file must exist.
+            Only the `needed` components are parsed.
+            `entries` is the result of `read`, if not provided we call it. """
         logger.debug('Loading library `{}`'.format(file))
-        with open(file, 'rt') as fh:
+        if entries is False:
+            entries = self.read(file, lib_alias, needed)
+        if entries is None or not self._load_needed(file, entries, lib_alias, needed):
+            if entries is not None:
+                logger.debug('Parsing the whole library `{}`'.format(file))
+            self._load_all(file, lib_alias, needed)
+
+    def _load_all(self, file, lib_alias, needed):
+        with open(file, 'rt') as fh, no_gc():
             f = LibLineReader(fh, file)
             line = f.get_line()
             if not line.startswith('EESchema-LIBRARY'):
@@ -632,15 +906,7 @@ class SymLib(object):
             line = f.get_line()
             while not line.startswith('#End Library'):
                 if line.startswith('DEF'):
-                    o = LibComponent(line, f, file)
-                    if o.name:
-                        # Only add components we need
-                        if self._check_add(o, o.name, lib_alias, needed):
-                            self.comps[o.name] = o
-                        if o.alias:
-                            for a in o.alias:
-                                if self._check_add(o, a, lib_alias, needed):
-                                    self.alias[a] = o
+                    self._add(LibComponent(line, f, file), lib_alias, needed)
                 else:
                     raise SchLibError('Unknown library entry', line, f)
                 line = f.get_line()
@@ -679,10 +945,59 @@ class DocLib(object):
         super().__init__()
         self.comps = OrderedDict()
 
-    def load(self, file):
-        """ Populates the class, file must exist """
+    def _add(self, o):
+        self.comps[o.name] = o
+        if GS.debug_level > 1:
+            logger.debug('- '+repr(o))
+
+    @staticmethod
+    def _scan(entries):
+        """ Index entries: [name, start, end, line] """
+        return [[lines[0][5:].lstrip(), start, end, line] for start, end, line, lines in entries]
+
+    @staticmethod
+    def read(file, needed):
+        """ Reads the `needed` entries, without parsing them (can be used from other threads).
+            Returns a list of (name, line, raw data), or None if we must parse the whole file. """
+        index = DOC_LIB_INDEXER.get_index(file, DocLib._scan)
+        if index is None:
+            return None
+        wanted = [e for e in index if e[0] in needed]
+        return [(e[0], e[3], data) for e, data in zip(wanted, LibIndexer.read_entries(file, [e[1:3] for e in wanted]))]
+
+    def _load_needed(self, file, entries):
+        """ Parses the entries we need. Returns False if we must parse the whole file. """
+        comps = []
+        with no_gc():
+            for name, line, data in entries:
+                f = LibIndexer.entry_reader(data, file, line, DCMLineReader)
+                f.get_line()
+                try:
+                    o = DocLibEntry(name, f)
+                except SchLibError:
+                    return False
+                if f.pos != f.n_lines:
+                    return False
+                comps.append(o)
+        for o in comps:
+            self._add(o)
+        return True
+
+    def load(self, file, needed=None, entries=False):
+        """ Populates the class, file must exist.
+            If `needed` is provided only these entries are parsed.
+            `entries` is the result of `read`, if not provided we call it. """
         logger.debug('Loading doc-lib `{}`'.format(file))
-        with open(file, 'rt') as fh:
+        if entries is False:
+            entries = self.read(file, needed) if needed is not None else None
+        if entries is not None:
+            if self._load_needed(file, entries):
+                return
+            logger.debug('Parsing the whole doc-lib `{}`'.format(file))
+        self._load_all(file)
+
+    def _load_all(self, file):
+        with open(file, 'rt') as fh, no_gc():
             f = DCMLineReader(fh, file)
             line = f.get_line()
             if not line.startswith('EESchema-DOCLIB'):
@@ -690,19 +1005,40 @@ class DocLib(object):
             line = f.get_line()
             while not line.startswith('#End Doc Library'):
                 if line.startswith('$CMP'):
-                    o = DocLibEntry(line[5:].lstrip(), f)
-                    self.comps[o.name] = o
-                    if GS.debug_level > 1:
-                        logger.debug('- '+repr(o))
+                    self._add(DocLibEntry(line[5:].lstrip(), f))
                 else:
                     raise SchLibError('Unknown DCM entry', line, f)
                 line = f.get_line()
 
 
+def _read_lib(file, read, *args):
+    """ Reads the needed entries of a library or doc-lib, used from the pool of threads.
+        Returns if the file exists and the `read` result. """
+    if not os.path.isfile(file):
+        return False, None
+    return True, read(file, *args)
+
+
+def _file_stamp(file):
+    """ Used to detect changes in the files (see `Schematic.reload_changed`) """
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+SYM_LIB_INDEXER = LibIndexer('EESchema-LIBRARY', '#End Library', 'DEF', 'ENDDEF', 'ALIAS')
+DOC_LIB_INDEXER = LibIndexer('EESchema-DOCLIB', '#End Doc Library', '$CMP', '$ENDCMP')
+
+
 class SchematicField(object):
     # F n "text" orientation posx posy dimension flags hjustify vjustify/italic/bold "name"
     field_re = re.compile(r'F\s*(\d+)\s+"([^"]*)"\s+([HV])\s+(-?\d+)\s+(-?\d+)\s+(\d+)\s+(\d+)'
                           r'\s+([LRCBT])\s+([LRCBT][IN][BN])\s*("[^"]*")?')
+    DEFAULT_NAMES = ['Reference', 'Value', 'Footprint', 'Datasheet']
+
+    __slots__ = ('number', 'value', 'horizontal', 'x', 'y', 'size', 'flags', 'hjustify', 'vjustify', 'italic', 'bold', 'name')
 
     def __init__(self):
         super().__init__()
@@ -712,25 +1048,33 @@ class SchematicField(object):
         m = SchematicField.field_re.match(line)
         if not m:
             raise SchFileError('Malformed component field', line, f)
+        field = SchematicField.from_groups(m.groups())
+        if field is None:
+            raise SchFileError('Missing component field name', line, f)
+        return field
+
+    @staticmethod
+    def from_groups(gs):
+        """ Creates the field from the groups matched by `field_re`. None if the name is missing. """
         field = SchematicField()
-        gs = m.groups()
-        field.number = int(gs[0])
-        field.value = gs[1]
-        field.horizontal = gs[2] == 'H'  # H -> True, V -> False
-        field.x = int(gs[3])
-        field.y = int(gs[4])
-        field.size = int(gs[5])
-        field.flags = gs[6]
-        field.hjustify = gs[7]
-        field.vjustify = gs[8][0]
-        field.italic = gs[8][1] == 'I'
-        field.bold = gs[8][2] == 'B'
-        if gs[9]:
-            field.name = gs[9][1:-1]
+        number, value, orientation, x, y, size, flags, field.hjustify, style, name = gs
+        field.number = number = int(number)
+        # The reference is unique, but the rest of the values are usually repeated (footprints, datasheets, etc.)
+        field.value = intern(value) if number else value
+        field.flags = intern(flags)
+        field.horizontal = orientation == 'H'  # H -> True, V -> False
+        field.x = int(x)
+        field.y = int(y)
+        field.size = int(size)
+        field.vjustify = style[0]
+        field.italic = style[1] == 'I'
+        field.bold = style[2] == 'B'
+        if name:
+            field.name = intern(name[1:-1])
         else:
-            if field.number > 3:
-                raise SchFileError('Missing component field name', line, f)
-            field.name = ['Reference', 'Value', 'Footprint', 'Datasheet'][field.number]
+            if number > 3:
+                return None
+            field.name = SchematicField.DEFAULT_NAMES[number]
         return field
 
     def write(self, f):
@@ -742,7 +1086,9 @@ class SchematicField(object):
         f.write('\n')
 
 
-class SchematicAltRef():
+class SchematicAltRef(object):
+    __slots__ = ('path', 'ref', 'part')
+
     def __init__(self):
         super().__init__()
         self.path = None
@@ -795,9 +1141,28 @@ class SchematicComponent(object):
                  Is just a flag and doesn't affect much.
         """
     ref_re = re.compile(r'([^\d]+)([\?\d]+)')
+    # Patterns for the usual component records (see `_load_fast`)
+    # L lib:name reference
+    label_re = re.compile(r'L (\S[^ ]*) +([^ ]+)$')
+    # U N mm time_stamp
+    unit_re = re.compile(r'U (\d+) (\d+) ([^ ]+)$')
+    # P x y
+    pos_re = re.compile(r'P (-?\d+) (-?\d+)$')
+    # Redundant unit and position
+    rpos_re = re.compile(r'\t(\d) +(-?\d+) +(-?\d+)$')
+    # Orientation matrix
+    matrix_re = re.compile(r'\t(-?\d+) +(-?\d+) +(-?\d+) +(-?\d+)$')
+    # Fake 'Part' fields, shared by all the components using the same symbol
+    part_fields = {}
+    __slots__ = ('name', 'lib', 'f_ref', 'unit', 'unit2', 'id', 'x', 'y', 'ar', 'fields', 'dfields', 'matrix',
+                 'field_ref', 'value', 'footprint', 'footprint_lib', 'datasheet', 'desc', 'spaced_fields',
+                 'ref', 'ref_prefix', 'ref_suffix', 'is_power', 'sheet_path', 'sheet_path_h',
+                 'fitted', 'included', 'in_bom', 'fixed', 'smd', 'virtual', 'tht', 'value_sort')
 
     def __init__(self):
         super().__init__()
+        # Fields with extra spaces (name, original value), they are reported for each instance
+        self.spaced_fields = ()
         self.field_ref = ''
         self.value = ''
         self.footprint = ''
@@ -807,6 +1172,8 @@ class SchematicComponent(object):
         self.fitted = True
         self.included = True
         self.fixed = False
+        # The user excluded it from the BoM (KiCad 6 `in_bom`), the filters start from it
+        self.in_bom = True
         # KiCad 5 PCB flags (mutually exclusive)
         self.smd = False
         self.virtual = False
@@ -827,7 +1194,7 @@ class SchematicComponent(object):
 
     def add_field(self, field):
         self.fields.append(field)
-        self.dfields[field.name.lower()] = field
+        self.dfields[intern(field.name.lower())] = field
 
     def _solve_ref(self, path):
         """ Look fo the correct reference for this path.
@@ -866,10 +1233,10 @@ class SchematicComponent(object):
                 res = f.value.split(':')
                 cres = len(res)
                 if cres == 1:
-                    self.footprint = res[0]
+                    self.footprint = intern(res[0])
                 elif cres == 2:
-                    self.footprint_lib = res[0]
-                    self.footprint = res[1]
+                    self.footprint_lib = intern(res[0])
+                    self.footprint = intern(res[1])
                 else:
                     raise SchFileError('Footprint with more than one colon', f.value, fr)
                 basic += 1
@@ -880,13 +1247,21 @@ class SchematicComponent(object):
             logger.warning(W_MISCFLD + 'Component `{}` without the basic fields'.format(self.f_ref))
 
     def _validate(self):
+        spaced = []
         for field in self.fields:
             cur_val = field.value
             stripped_val = cur_val.strip()
             if len(cur_val) != len(stripped_val):
-                logger.warning(W_EXTRASPC + "Field {} of component {} contains extra spaces: `{}` removing them.".
-                               format(field.name, self, field.value))
+                spaced.append((field.name, cur_val))
                 field.value = stripped_val
+        if spaced:
+            self.spaced_fields = spaced
+        self._report_spaces()
+
+    def _report_spaces(self):
+        for name, value in self.spaced_fields:
+            logger.warning(W_EXTRASPC + "Field {} of component {} contains extra spaces: `{}` removing them.".
+                           format(name, self, value))
 
     def __str__(self):
         if self.name == self.value:
@@ -894,7 +1269,103 @@ class SchematicComponent(object):
         return '{} ({} {})'.format(self.ref, self.name, self.value)
 
     @staticmethod
-    def load(f, sheet_path, sheet_path_h, libs, fields, fields_lc):
+    def _load_fast(f, libs, fields, fields_lc):
+        """ Loads a component written in the usual format, using precompiled patterns and the lines already in memory.
+            Returns None, without consuming any line, if the record has anything unusual. In this case `_load_lines`
+            must be used, it reports the errors and handles the corner cases. """
+        lines = f.lines
+        n_lines = f.n_lines
+        pos = f.pos
+        if pos+6 > n_lines:
+            return None
+        # Check all the lines before doing anything
+        m_label = SchematicComponent.label_re.match(lines[pos])
+        m_unit = SchematicComponent.unit_re.match(lines[pos+1])
+        m_pos = SchematicComponent.pos_re.match(lines[pos+2])
+        if m_label is None or m_unit is None or m_pos is None:
+            return None
+        pos += 3
+        ar_start = pos
+        while pos < n_lines and lines[pos][:2] == 'AR':
+            pos += 1
+        ar_end = pos
+        field_re = SchematicField.field_re
+        field_gs = []
+        while pos < n_lines and lines[pos][:1] == 'F':
+            m = field_re.match(lines[pos])
+            if m is None:
+                return None
+            gs = m.groups()
+            if not gs[9] and int(gs[0]) > 3:
+                return None
+            field_gs.append(gs)
+            pos += 1
+        if pos+2 > n_lines:
+            return None
+        m_rpos = SchematicComponent.rpos_re.match(lines[pos])
+        m_matrix = SchematicComponent.matrix_re.match(lines[pos+1])
+        unit = int(m_unit.group(1))
+        if m_rpos is None or m_matrix is None or m_rpos.group(1) != str(unit):
+            return None
+        pos += 2
+        while pos < n_lines and not lines[pos].startswith('$EndComp'):
+            pos += 1
+        if pos == n_lines:
+            return None
+        f.pos = f.line = pos+1
+        # Create the component
+        comp = SchematicComponent()
+        comp.name, comp.f_ref = m_label.groups()
+        res = comp.name.split(':')
+        comp.lib = None
+        if len(res) == 2:
+            comp.name = intern(res[1])
+            comp.lib = intern(res[0])
+            libs[comp.lib] = None
+        else:
+            logger.warning(W_NOLIB + "Component `{}` doesn't specify its library".format(comp.name))
+        comp.unit = unit
+        comp.unit2 = int(m_unit.group(2))
+        comp.id = m_unit.group(3)
+        comp.x = int(m_pos.group(1))
+        comp.y = int(m_pos.group(2))
+        comp.ar = [SchematicAltRef.parse(line) for line in lines[ar_start:ar_end]]
+        comp.fields = []
+        comp.dfields = {}
+        for gs in field_gs:
+            comp._add_loaded_field(SchematicField.from_groups(gs), fields, fields_lc)
+        comp._add_part_field()
+        xr = int(m_rpos.group(2))
+        yr = int(m_rpos.group(3))
+        if comp.x != xr or comp.y != yr:
+            logger.warning(W_INCPOS + 'Inconsistent position for component {} ({},{} vs {},{})'.
+                           format(comp.f_ref, comp.x, comp.y, xr, yr))
+        comp.matrix = [int(v) for v in m_matrix.groups()]
+        return comp
+
+    def _add_loaded_field(self, field, fields, fields_lc):
+        name_lc = field.name.lower()
+        # Add to the global collection
+        if name_lc not in fields_lc:
+            fields.append(field.name)
+            fields_lc.add(name_lc)
+        # Add to the component
+        self.add_field(field)
+
+    def _add_part_field(self):
+        """ Fake 'Part' field """
+        field = SchematicComponent.part_fields.get(self.name)
+        if field is None:
+            field = SchematicField()
+            field.name = 'part'
+            field.value = self.name
+            field.number = -1
+            SchematicComponent.part_fields[self.name] = field
+        self.add_field(field)
+
+    @staticmethod
+    def _load_lines(f, libs, fields, fields_lc):
+        """ Loads a component, line by line """
         # L lib:name reference
         line = f.get_line()
         if not line or line[0] != 'L':
@@ -907,8 +1378,8 @@ class SchematicComponent(object):
         res = comp.name.split(':')
         comp.lib = None
         if len(res) == 2:
-            comp.name = res[1]
-            comp.lib = res[0]
+            comp.name = intern(res[1])
+            comp.lib = intern(res[0])
             libs[comp.lib] = None
         else:
             logger.warning(W_NOLIB + "Component `{}` doesn't specify its library".format(comp.name))
@@ -941,21 +1412,9 @@ class SchematicComponent(object):
         comp.fields = []
         comp.dfields = {}
         while line[0] == 'F':
-            field = SchematicField.parse(line, f)
-            name_lc = field.name.lower()
-            # Add to the global collection
-            if name_lc not in fields_lc:
-                fields.append(field.name)
-                fields_lc.add(name_lc)
-            # Add to the component
-            comp.add_field(field)
+            comp._add_loaded_field(SchematicField.parse(line, f), fields, fields_lc)
             line = f.get_line()
-        # Fake 'Part' field
-        field = SchematicField()
-        field.name = 'part'
-        field.value = comp.name
-        field.number = -1
-        comp.add_field(field)
+        comp._add_part_field()
         # Redundant pos
         if not line.startswith('\t'+str(comp.unit)):
             raise SchFileError('Missing component redundant position', line, f)
@@ -978,26 +1437,50 @@ class SchematicComponent(object):
         line = f.get_line()
         while not line.startswith('$EndComp'):
             line = f.get_line()
-        comp._solve_fields(f)
-        comp.ref = comp._solve_ref(sheet_path)
+        return comp
+
+    def _solve_instance(self, sheet_path, sheet_path_h):
+        """ Computes the data that depends on the sheet instance.
+            Returns False if the reference is malformed. """
+        self.ref = self._solve_ref(sheet_path)
         # Power, ground or power flag
-        comp.is_power = comp.ref.startswith('#PWR') or comp.ref.startswith('#FLG')
-        if comp.ref[-1] == '?':
-            logger.warning(W_NOANNO + 'Component {} is not annotated'.format(comp))
+        self.is_power = self.ref.startswith('#PWR') or self.ref.startswith('#FLG')
+        if self.ref[-1] == '?':
+            logger.warning(W_NOANNO + 'Component {} is not annotated'.format(self))
         # Separate the reference in its components
-        m = SchematicComponent.ref_re.match(comp.ref)
+        m = SchematicComponent.ref_re.match(self.ref)
         if not m:
-            raise SchFileError('Malformed component reference', comp.ref, f)
-        comp.ref_prefix, comp.ref_suffix = m.groups()
+            return False
+        self.ref_prefix, self.ref_suffix = m.groups()
         # Location in the project
-        comp.sheet_path = sheet_path
-        comp.sheet_path_h = sheet_path_h
+        self.sheet_path = sheet_path
+        self.sheet_path_h = sheet_path_h
         if GS.debug_level > 1:
-            logger.debug("- Loaded component {}".format(comp))
+            logger.debug("- Loaded component {}".format(self))
+        return True
+
+    @staticmethod
+    def load(f, sheet_path, sheet_path_h, libs, fields, fields_lc):
+        comp = SchematicComponent._load_fast(f, libs, fields, fields_lc)
+        if comp is None:
+            comp = SchematicComponent._load_lines(f, libs, fields, fields_lc)
+        comp._solve_fields(f)
+        if not comp._solve_instance(sheet_path, sheet_path_h):
+            raise SchFileError('Malformed component reference', comp.ref, f)
         # Report abnormal situations
         comp._validate()
         return comp
 
+    def copy_instance(self, sheet_path, sheet_path_h):
+        """ Creates a component for another instance of the same sheet.
+            The data from the file (fields, AR, etc.) is shared, only the instance data is computed.
+            Returns None if the reference is malformed, the caller must parse the file to report it. """
+        comp = copy(self)
+        if not comp._solve_instance(sheet_path, sheet_path_h):
+            return None
+        comp._report_spaces()
+        return comp
+
     def write(self, f):
         # Fake lib to reflect fitted status
         lib = 'y' if self.fitted or not self.included else 'n'
@@ -1020,6 +1503,8 @@ class SchematicComponent(object):
 class SchematicConnection(object):
     conn_re = re.compile(r'\s*~\s+(-?\d+)\s+(-?\d+)')
 
+    __slots__ = ('connect', 'x', 'y')
+
     def __init__(self):
         super().__init__()
 
@@ -1096,12 +1581,31 @@ class SchematicWire(object):
     ENTRY_BUS = 4
     ENTRIES = {'Wire': ENTRY_WIRE, 'Bus': ENTRY_BUS}
     NAMES = ['Wire Wire Line', 'Wire Bus Line', 'Wire Notes Line', 'Entry Wire Line', 'Entry Bus Bus']
+    # The usual definitions, used to skip the generic parser
+    TYPES = {'Wire Wire Line': WIRE, 'Wire Bus Line': WIRE_BUS, 'Wire Notes Line': WIRE_DOT,
+             'Entry Wire Line': ENTRY_WIRE, 'Entry Wire Bus': ENTRY_WIRE, 'Entry Bus Line': ENTRY_BUS,
+             'Entry Bus Bus': ENTRY_BUS}
+    coords_re = re.compile(r'\t(-?\d+) +(-?\d+) +(-?\d+) +(-?\d+)$')
+
+    __slots__ = ('type', 'x', 'y', 'ex', 'ey')
 
     def __init__(self):
         super().__init__()
 
     @staticmethod
     def load(f, line):
+        kind = SchematicWire.TYPES.get(line)
+        if kind is not None and f.pos < f.n_lines:
+            m = SchematicWire.coords_re.match(f.lines[f.pos])
+            if m:
+                f.get_line()
+                wire = SchematicWire()
+                wire.type = kind
+                wire.x = int(m.group(1))
+                wire.y = int(m.group(2))
+                wire.ex = int(m.group(3))
+                wire.ey = int(m.group(4))
+                return wire
         res = _split_space(line)
         if len(res) != 3:
             raise SchFileError('Malformed wire', line, f)
@@ -1137,8 +1641,25 @@ class SchematicWire(object):
 
 
 class SchematicBitmap(object):
+    """ An image embedded in the schematic.
+        The PNG data (a hex dump in the file) is usually just copied to the saved schematics. So we just keep its
+        position in the file and the data is decoded only when needed (see `data`). """
     def __init__(self):
         super().__init__()
+        self._data = None
+        # File, offset and length of the hex dump
+        self._source = None
+
+    @staticmethod
+    def is_hex_dump(block):
+        """ True if `block` is a hex dump as written by KiCad (and `write`).
+            This is 32 bytes for each line, each one followed by a space. Uses slices to avoid a slow regex. """
+        block = bytes(block)
+        lines = block.count(b'\n')
+        if block[96::97] != b'\n'*lines or len(block)-97*lines not in range(3, 97, 3):
+            return False
+        block = block.replace(b'\n', b'')
+        return block[2::3] == b' '*(len(block)//3) and not (block[0::3]+block[1::3]).translate(None, b'0123456789ABCDEF')
 
     @staticmethod
     def load(f):
@@ -1164,30 +1685,81 @@ class SchematicBitmap(object):
         line = f.get_line()
         if line != 'Data':
             raise SchFileError('Missing bitmap data', line, f)
-        line = f.get_line()
-        bmp.data = b''
-        while line != 'EndData':
-            res = _split_space(line)
-            try:
-                bmp.data += bytes([int(b, 16) for b in res])
-            except ValueError:
-                raise SchFileError('Malformed bitmap data', line, f)
+        if not bmp._load_source(f):
             line = f.get_line()
+            data = []
+            while line != 'EndData':
+                res = _split_space(line)
+                try:
+                    data.append(bytes([int(b, 16) for b in res]))
+                except ValueError:
+                    raise SchFileError('Malformed bitmap data', line, f)
+                line = f.get_line()
+            bmp._data = b''.join(data)
         # End of bitmap
         line = f.get_line()
         if line != '$EndBitmap':
             raise SchFileError('Missing end of bitmap', line, f)
         return bmp
 
+    def _load_source(self, f):
+        """ Skips the hex dump, just remembering where it is. Only if it uses the usual format. """
+        start = f.pos
+        try:
+            end = f.lines.index('EndData', start)
+        except ValueError:
+            return False
+        res = f.get_raw_block(start, end)
+        if res is None:
+            return False
+        offset, block = res
+        if not SchematicBitmap.is_hex_dump(block):
+            return False
+        self._source = (os.path.abspath(f.file), offset, len(block))
+        f.pos = f.line = end+1
+        return True
+
+    def _read_source(self):
+        """ The hex dump, from the schematic file """
+        file, offset, length = self._source
+        # Include the `Data` and `EndData` lines, so we can check the file didn't change
+        with open(file, 'rb') as f:
+            f.seek(offset-5)
+            block = f.read(length+13)
+        block_data = block[5:-8]
+        if block[:5] != b'Data\n' or block[-8:] != b'\nEndData' or not SchematicBitmap.is_hex_dump(block_data):
+            raise SchError('The bitmap data from `{}` changed since the schematic was loaded'.format(file))
+        return block_data
+
+    @property
+    def data(self):
+        """ The image (PNG) """
+        if self._data is None:
+            self._data = bytes.fromhex(self._read_source().replace(b'\n', b' ').decode())
+        return self._data
+
+    def keep_data(self, fname):
+        """ Loads the data in memory if it comes from `fname`. Needed before overwriting it. """
+        if self._data is None:
+            try:
+                if os.path.samefile(self._source[0], fname):
+                    self.data
+            except OSError:
+                pass
+
     def write(self, f):
         f.write('$Bitmap\n')
         f.write('Pos {} {}\n'.format(self.x, self.y))
         f.write('Scale {}\n'.format(self.scale))
         f.write('Data')
-        for c, b in enumerate(self.data):
-            if (c % 32) == 0:
-                f.write('\n')
-            f.write('%02X ' % b)
+        if self._data is None:
+            # The hex dump is in the same format we use, no need to decode it
+            f.write('\n'+self._read_source().decode())
+        else:
+            for c, b in enumerate(self.data):
+                if (c % 32) == 0:
+                    f.write('\n')
+                f.write('%02X ' % b)
         f.write('\nEndData\n')
         f.write('$EndBitmap\n')
 
@@ -1226,15 +1798,20 @@ class SchematicSheet(object):
         self.sheet = None
         self.id = ''
 
-    def load_sheet(self, parent, sheet_path, sheet_path_h, libs, fields, fields_lc):
-        assert self.name
-        self.sheet = Schematic()
-        parent_dir = os.path.dirname(parent)
+    def instance_path(self, sheet_path, sheet_path_h):
+        """ Paths for the instance of the sheet, from the paths of the parent """
         sheet_path += '/'+self.id
         if len(sheet_path_h) > 1:
             sheet_path_h += '/'
         sheet_path_h += self.name if self.name else 'Unknown'
-        self.sheet.load(os.path.join(parent_dir, self.file), sheet_path, sheet_path_h, libs, fields, fields_lc)
+        return sheet_path, sheet_path_h
+
+    def load_sheet(self, parent, sheet_path, sheet_path_h, libs, fields, fields_lc, parsed):
+        assert self.name
+        self.sheet = Schematic()
+        parent_dir = os.path.dirname(parent)
+        sheet_path, sheet_path_h = self.instance_path(sheet_path, sheet_path_h)
+        self.sheet.load(os.path.join(parent_dir, self.file), sheet_path, sheet_path_h, libs, fields, fields_lc, parsed)
         return self.sheet
 
     @staticmethod
@@ -1297,11 +1874,36 @@ class SchematicSheet(object):
         f.write('$EndSheet\n')
 
 
+class ComponentIndex(object):
+    """ Flat view of the components of the whole hierarchy.
+        Built once, after loading the schematic, and shared by all the users. """
+    def __init__(self, sch):
+        super().__init__()
+        # Hierarchy order, as found in the sheets
+        self.walk = []
+        sch._collect_components(self.walk)
+        # Sorted by reference, the sort is stable so the units of a component keep the hierarchy order
+        self.all = sorted(self.walk, key=attrgetter('ref'))
+        self.no_power = [c for c in self.all if not c.is_power]
+        # For multi-unit components the last unit is used
+        self.by_ref = {c.ref: c for c in self.no_power}
+        self.by_name = {}
+        self.by_sheet = {}
+        for c in self.walk:
+            self.by_name.setdefault('{}:{}'.format(c.lib, c.name), []).append(c)
+            self.by_sheet.setdefault(c.sheet_path_h, []).append(c)
+
+
 class Schematic(object):
+    # Attributes that doesn't depend on the sheet instance, shared by all the instances
+    shared_attrs = ('version', 'eelayer_n', 'eelayer_m', 'page_type', 'page_width', 'page_height', 'sheet', 'nsheets',
+                    'title_block', 'conn', 'texts', 'wires', 'bitmaps')
+
     def __init__(self):
         super().__init__()
         self.dcms = {}
         self.lib_comps = {}
+        self._index = None
 
     def _get_title_block(self, f):
         line = f.get_line()
@@ -1333,16 +1935,51 @@ class Schematic(object):
                     raise SchFileError('Wrong entry in title block', line, f)
                 self.title_block[m.group(1)] = m.group(2)
 
-    def load(self, fname, sheet_path='', sheet_path_h='/', libs={}, fields=[], fields_lc=set()):
+    def _copy_parsed(self, src, sheet_path, sheet_path_h):
+        """ Fills this sheet using another instance of the same file.
+            Returns False if the file must be parsed again (to report an error). """
+        components = []
+        for c in src.components:
+            comp = c.copy_instance(sheet_path, sheet_path_h)
+            if comp is None:
+                return False
+            components.append(comp)
+        self.components = components
+        # The sub-sheets are loaded for each instance
+        self.sheets = [copy(s) for s in src.sheets]
+        new = {id(o): n for o, n in zip(src.components+src.sheets, self.components+self.sheets)}
+        self.all = [new.get(id(o), o) for o in src.all]
+        for attr in self.shared_attrs:
+            setattr(self, attr, getattr(src, attr))
+        return True
+
+    def load(self, fname, sheet_path='', sheet_path_h='/', libs=None, fields=None, fields_lc=None, parsed=None):
         """ Load a v5.x KiCad Schematic.
             The caller must be sure the file exists.
-            Only the schematics are loaded not the libs. """
+            Only the schematics are loaded not the libs.
+            `parsed` contains the already parsed sheets (by absolute path), each file is parsed only once. """
         logger.debug("Loading sheet from "+fname)
         self.fname = fname
-        self.libs = libs
-        self.fields = fields
-        self.fields_lc = fields_lc
-        with open(fname, 'rt') as fh:
+        self._index = None
+        self.libs = libs = {} if libs is None else libs
+        self.fields = fields = [] if fields is None else fields
+        self.fields_lc = fields_lc = set() if fields_lc is None else fields_lc
+        if parsed is None:
+            parsed = {}
+        key = os.path.abspath(fname)
+        src = parsed.get(key)
+        if src is not None and self._copy_parsed(src, sheet_path, sheet_path_h):
+            logger.debug("Using the already parsed "+key)
+        else:
+            self._parse(fname, sheet_path, sheet_path_h, libs, fields, fields_lc)
+            parsed.setdefault(key, self)
+        # Load sub-sheets
+        self.sub_sheets = []
+        for sch in self.sheets:
+            self.sub_sheets.append(sch.load_sheet(fname, sheet_path, sheet_path_h, libs, fields, fields_lc, parsed))
+
+    def _parse(self, fname, sheet_path, sheet_path_h, libs, fields, fields_lc):
+        with open(fname, 'rt') as fh, no_gc():
             f = SCHLineReader(fh, fname)
             line = f.get_line()
             m = re.match(r'EESchema Schematic File Version (\d+)', line)
@@ -1396,10 +2033,6 @@ class Schematic(object):
                     raise SchFileError('Unknown definition', line, f)
                 self.all.append(obj)
                 line = f.get_line()
-            # Load sub-sheets
-            self.sub_sheets = []
-            for sch in self.sheets:
-                self.sub_sheets.append(sch.load_sheet(fname, sheet_path, sheet_path_h, libs, fields, fields_lc))
 
     def get_files(self):
         """ A list of the names for all the sheets, including this one. """
@@ -1408,17 +2041,45 @@ class Schematic(object):
             files.extend(sch.sheet.get_files())
         return files
 
-    def get_components(self, exclude_power=True):
-        """ A list of all the components. """
-        if exclude_power:
-            components = [c for c in self.components if not c.is_power]
-        else:  # pragma: no cover
-            # Currently unused
-            components = [c for c in self.components]
+    def get_lib_files(self):
+        """ A list of the libraries and doc-libs used. Only valid after calling load_libs. """
+        files = []
+        for v in self.libs.values():
+            if v and os.path.isfile(v):
+                files.append(v)
+                dcm = os.path.splitext(v)[0]+'.dcm'
+                if os.path.isfile(dcm):
+                    files.append(dcm)
+        return files
+
+    def _collect_components(self, dest):
+        dest.extend(self.components)
         for sch in self.sheets:
-            components.extend(sch.sheet.get_components(exclude_power))
-        components.sort(key=lambda g: g.ref)
-        return components
+            sch.sheet._collect_components(dest)
+
+    def get_components_index(self):
+        """ The flattened components index, computed on the first use """
+        if self._index is None:
+            self._index = ComponentIndex(self)
+        return self._index
+
+    def get_components(self, exclude_power=True):
+        """ A list of all the components, sorted by reference. """
+        index = self.get_components_index()
+        return list(index.no_power if exclude_power else index.all)
+
+    def get_refs_hash(self):
+        """ A dict to find the components (excluding power) by reference.
+            Shared by all the users, don't modify it. """
+        return self.get_components_index().by_ref
+
+    def get_components_by_name(self, name):
+        """ The components using `lib:name` """
+        return self.get_components_index().by_name.get(name, [])
+
+    def get_components_in_sheet(self, sheet_path_h):
+        """ The components in the sheet instance (i.e. `/` or `/Sub Sheet`), in hierarchy order """
+        return self.get_components_index().by_sheet.get(sheet_path_h, [])
 
     def get_field_names(self, fields):
         """ Appends the collected field names to the provided names """
@@ -1431,10 +2092,8 @@ class Schematic(object):
         return fields
 
     def walk_components(self, function, obj):
-        for c in self.components:
+        for c in self.get_components_index().walk:
             function(obj, c)
-        for sch in self.sheets:
-            sch.sheet.walk_components(function, obj)
 
     @staticmethod
     def apply_dcm(obj, c):
@@ -1449,57 +2108,233 @@ class Schematic(object):
                     if GS.debug_level > 2:
                         logger.debug('Filling desc for {}:{} `{}`'.format(c.lib, c.name, c.desc))
 
+    def _solve_lib(self, k):
+        """ Looks for the file of a library alias """
+        alias = KiConf.lib_aliases.get(k)
+        if k and alias:
+            self.libs[k] = alias.uri
+            if GS.debug_level > 1:
+                logger.debug('Using `{}` for library alias `{}`'.format(alias.uri, k))
+        else:
+            logger.warning(W_MISSLIB + 'Missing library `{}`'.format(k))
+
+    def _load_libs(self, libs, needed):
+        """ Loads the `needed` components (and their doc-lib entries) from `libs` (alias: file).
+            The components are added to the already loaded libs. """
+        # Names used from each library, to load only the needed doc-lib entries
+        used = {}
+        for name in needed.keys():
+            lib, name = name.split(':', 1)
+            used.setdefault(lib, set()).add(name)
+        # Load the libraries and descriptions.
+        # The files are read using a pool of threads, most of the time is spent waiting for the storage (i.e. network
+        # mounted). They are parsed here, in order, so the results and the warnings doesn't depend on the timing.
+        needed_names = frozenset(needed.keys())
+        with ThreadPoolExecutor(max_workers=LIB_READ_THREADS) as pool:
+            reads = {}
+            for k, v in libs.items():
+                if v:
+                    dcm_needed = used.get(k, set()) | used.get('None', set())
+                    reads[k] = (pool.submit(_read_lib, v, SymLib.read, k, needed_names),
+                                pool.submit(_read_lib, os.path.splitext(v)[0]+'.dcm', DocLib.read, dcm_needed))
+            for k, v in libs.items():
+                if v:
+                    lib_read, dcm_read = reads[k]
+                    # Load library
+                    exists, entries = lib_read.result()
+                    if exists:
+                        o = self.lib_comps.get(k) or SymLib()
+                        o.load(v, k, needed, entries)
+                    else:
+                        logger.warning(W_MISSLIB + 'Missing library `{}` ({})'.format(v, k))
+                        o = None
+                    self.lib_comps[k] = o
+                    # Load doc-lib
+                    exists, entries = dcm_read.result()
+                    if exists:
+                        o = self.dcms.get(k) or DocLib()
+                        o.load(os.path.splitext(v)[0]+'.dcm', entries=entries)
+                    else:
+                        o = None
+                    self.dcms[k] = o
+                else:
+                    # Mark as None if we don't know the file
+                    self.lib_comps[k] = None
+                    self.dcms[k] = None
+        # Join the descriptions with the components
+        for k in libs.keys():
+            lib = self.lib_comps[k]
+            dcm = self.dcms[k]
+            if lib and dcm:
+                for name, comp in lib.comps.items():
+                    comp.dcm = dcm.comps.get(name)
+                    if not comp.dcm and k+':'+name in needed:
+                        logger.warning(W_MISSDCM + 'Missing doc-lib entry for {}:{}'.format(k, name))
+
+    def _get_stamps(self):
+        """ Stamps for the files used to load the schematic """
+        files = [os.path.abspath(f) for f in self.get_files()]
+        for v in self.libs.values():
+            if v:
+                files.append(os.path.abspath(v))
+                files.append(os.path.abspath(os.path.splitext(v)[0]+'.dcm'))
+        files.extend(KiConf.get_config_files())
+        return {f: _file_stamp(f) for f in files}
+
     def load_libs(self, fname):
         KiConf.init(fname)
         # Try to find the library paths
         for k in self.libs.keys():
-            alias = KiConf.lib_aliases.get(k)
-            if k and alias:
-                self.libs[k] = alias.uri
-                if GS.debug_level > 1:
-                    logger.debug('Using `{}` for library alias `{}`'.format(alias.uri, k))
-            else:
-                logger.warning(W_MISSLIB + 'Missing library `{}`'.format(k))
+            self._solve_lib(k)
         # Create a hash with all the used components
-        self.comps_data = {'{}:{}'.format(c.lib, c.name): None for c in self.get_components(exclude_power=False)}
+        self.comps_data = {'{}:{}'.format(c.lib, c.name): None for c in self.get_components_index().all}
         if GS.debug_level > 1:
             logger.debug("Components before loading: "+str(self.comps_data))
-        # Load the libraries and descriptions
-        for k, v in self.libs.items():
-            if v:
-                # Load library
-                if os.path.isfile(v):
-                    o = SymLib()
-                    o.load(v, k, self.comps_data)
-                else:
-                    logger.warning(W_MISSLIB + 'Missing library `{}` ({})'.format(v, k))
-                    o = None
-                self.lib_comps[k] = o
-                # Load doc-lib
-                file = os.path.splitext(v)[0]+'.dcm'
-                if os.path.isfile(file):
-                    o = DocLib()
-                    o.load(file)
-                else:
-                    o = None
-                self.dcms[k] = o
-            else:
-                # Mark as None if we don't know the file
-                self.lib_comps[k] = None
-                self.dcms[k] = None
+        self._load_libs(self.libs, self.comps_data)
         if GS.debug_level > 1:
             logger.debug("Components after loading: "+str(self.comps_data))
-        # Join the descriptions with the components
-        for k in self.libs.keys():
-            lib = self.lib_comps[k]
-            dcm = self.dcms[k]
-            if lib and dcm:
-                for name, comp in lib.comps.items():
-                    comp.dcm = dcm.comps.get(name)
-                    if not comp.dcm and k+':'+name in self.comps_data:
-                        logger.warning(W_MISSDCM + 'Missing doc-lib entry for {}:{}'.format(k, name))
         # Transfer the descriptions to the instances of the components
         self.walk_components(self.apply_dcm, self)
+        # Used to reload the changed files
+        self.stamps = self._get_stamps()
+
+    def _collect_parsed(self, parsed, changed):
+        """ Fills `parsed` with the sheets we can reuse """
+        key = os.path.abspath(self.fname)
+        if key not in changed:
+            parsed.setdefault(key, self)
+        for sch in self.sub_sheets:
+            sch._collect_parsed(parsed, changed)
+
+    def _reload_sheets(self, changed, parsed, sheet_path, sheet_path_h, reloaded):
+        """ Loads the changed sheets again, the rest is kept """
+        if os.path.abspath(self.fname) in changed:
+            logger.debug('Reloading '+self.fname)
+            # The names of the libs and fields are collected later
+            self.load(self.fname, sheet_path, sheet_path_h, {}, [], set(), parsed)
+            reloaded.append(self)
+            return
+        for sheet, sch in zip(self.sheets, self.sub_sheets):
+            path, path_h = sheet.instance_path(sheet_path, sheet_path_h)
+            sch._reload_sheets(changed, parsed, path, path_h, reloaded)
+
+    def _collect_names(self, libs, fields, fields_lc, seen):
+        """ Collects the names of the libs and fields, in the same order used by `load` """
+        key = os.path.abspath(self.fname)
+        if key not in seen:
+            seen.add(key)
+            for c in self.components:
+                if c.lib and c.lib not in libs:
+                    libs[c.lib] = None
+                for f in c.fields:
+                    # Skip the fake 'part' field
+                    if f.number >= 0:
+                        name_lc = f.name.lower()
+                        if name_lc not in fields_lc:
+                            fields.append(f.name)
+                            fields_lc.add(name_lc)
+        for sch in self.sub_sheets:
+            sch._collect_names(libs, fields, fields_lc, seen)
+
+    def _share_names(self, root):
+        """ All the sheets share the collections from the main sheet """
+        self.libs = root.libs
+        self.fields = root.fields
+        self.fields_lc = root.fields_lc
+        for sch in self.sub_sheets:
+            sch._share_names(root)
+
+    def reload_changed(self):
+        """ Loads again the sheets and libraries that changed after calling `load_libs`. Only for the main sheet.
+            The unchanged sub-sheets and libraries are kept, only the new components are looked up in the libs.
+            Returns True if something changed.
+            If an exception is raised the object is left in an unknown state and must be discarded. """
+        KiConf.init(self.fname)
+        changed = {f for f, stamp in self.stamps.items() if _file_stamp(f) != stamp}
+        if not changed:
+            return False
+        logger.debug('Changed files: '+str(sorted(changed)))
+        if changed.intersection(KiConf.get_config_files()):
+            # The libraries could be anywhere, start from scratch
+            logger.debug('KiCad configuration changed, reloading the whole schematic')
+            KiConf.reset()
+            self.dcms = {}
+            self.lib_comps = {}
+            self.load(self.fname)
+            self.load_libs(self.fname)
+            return True
+        # Sheets
+        parsed = {}
+        self._collect_parsed(parsed, changed)
+        reloaded = []
+        self._reload_sheets(changed, parsed, '', '/', reloaded)
+        self._share_names(self)
+        libs = {}
+        fields = []
+        fields_lc = set()
+        self._collect_names(libs, fields, fields_lc, set())
+        self.fields[:] = fields
+        self.fields_lc.clear()
+        self.fields_lc.update(fields_lc)
+        old_libs = dict(self.libs)
+        self.libs.clear()
+        for k in libs.keys():
+            if k in old_libs:
+                self.libs[k] = old_libs[k]
+            else:
+                self.libs[k] = None
+                self._solve_lib(k)
+        # Libraries
+        changed_libs = set()
+        for k, v in self.libs.items():
+            if v and (os.path.abspath(v) in changed or os.path.abspath(os.path.splitext(v)[0]+'.dcm') in changed):
+                changed_libs.add(k)
+                logger.debug('Reloading library `{}`'.format(k))
+                # Start with new objects
+                self.lib_comps.pop(k, None)
+                self.dcms.pop(k, None)
+        self._index = None
+        comps_data = {'{}:{}'.format(c.lib, c.name): None for c in self.get_components_index().all}
+        # Components without lib can come from any lib, they must be solved again if the libs changed
+        none_changed = bool(changed_libs) or list(old_libs.keys()) != list(self.libs.keys())
+        needed = {}
+        for name in comps_data.keys():
+            lib = name.split(':', 1)[0]
+            if name in self.comps_data and lib not in changed_libs and (lib != 'None' or not none_changed):
+                comps_data[name] = self.comps_data[name]
+            else:
+                needed[name] = None
+        # A lib is used for `None:NAME` only when `LIB:NAME` isn't used, so we solve all the `NAME` components together
+        names = {name.split(':', 1)[1] for name in needed.keys()}
+        for name in comps_data.keys():
+            id = name.split(':', 1)[1]
+            if id in names and 'None:'+id in comps_data:
+                needed[name] = None
+        if needed:
+            if GS.debug_level > 1:
+                logger.debug("New components: "+str(needed))
+            needed_libs = {name.split(':', 1)[0] for name in needed.keys()}
+            if 'None' in needed_libs:
+                libs = self.libs
+            else:
+                libs = {k: v for k, v in self.libs.items() if k in needed_libs}
+            self._load_libs(libs, needed)
+            comps_data.update(needed)
+        self.comps_data = comps_data
+        # Only the libs we use, in the same order
+        self.lib_comps = {k: self.lib_comps.get(k) for k in self.libs.keys()}
+        self.dcms = {k: self.dcms.get(k) for k in self.libs.keys()}
+        # Transfer the descriptions to the new components
+        comps = []
+        for sch in reloaded:
+            sch._collect_components(comps)
+        for name in needed.keys():
+            comps.extend(self.get_components_by_name(name))
+        for c in comps:
+            c.desc = ''
+            self.apply_dcm(self, c)
+        self.stamps = self._get_stamps()
+        return True
 
     def gen_lib(self, name, cross=False):
         """ Dumps all the used components to one library.
@@ -1514,8 +2349,18 @@ class Schematic(object):
                     logger.warning(W_MISSCMP + 'Missing component `{}`'.format(k))
             f.write('#\n#End Library\n')
 
+    def _keep_bitmaps(self, fname):
+        """ Makes sure the bitmaps that come from `fname` are in memory """
+        for bmp in self.bitmaps:
+            bmp.keep_data(fname)
+        for sch in self.sub_sheets:
+            sch._keep_bitmaps(fname)
+
     def save(self, fname, dest_dir):
         fname = os.path.join(dest_dir, fname)
+        if os.path.isfile(fname):
+            # We could be overwriting the file where the bitmaps are stored
+            self._keep_bitmaps(fname)
         with open(fname, 'wt') as f:
             f.write('EESchema Schematic File Version {}\n'.format(self.version))
             f.write('EELAYER {} {}\n'.format(self.eelayer_n, self.eelayer_m))
@@ -0,0 +1,629 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+KiCad v6 Schematic format.
+A basic implementation of the .kicad_sch file format (S-expressions).
+Currently oriented to collect the components for the BoM.
+The loaded data uses the same classes used for the v5 format, so the filters, variants and BoM work for both.
+"""
+import re
+import os
+from sys import intern
+from collections import OrderedDict
+from .v5_sch import (Schematic, SchematicComponent, SchematicField, SchematicAltRef, SchematicSheet, SchFileError,
+                     no_gc, _file_stamp)
+from ..gs import GS
+from ..error import PlotError
+from ..misc import W_NOLIB, W_MISSCMP
+from .. import log
+
+logger = log.get_logger(__name__)
+# Characters escaped by KiCad inside the strings
+UNESCAPE = {'n': '\n', 'r': '\r', 't': '\t'}
+unescape_re = re.compile(r'\\(.)', re.S)
+# KiCad 6 uses `Sheet name`, KiCad 7 `Sheetname`
+SHEET_NAMES = ('Sheet name', 'Sheetname')
+SHEET_FILES = ('Sheet file', 'Sheetfile')
+TITLE_BLOCK = {'title': 'Title', 'date': 'Date', 'rev': 'Rev', 'company': 'Comp'}
+# The lists we use, the rest are consumed by the tokenizer
+USED_LISTS = ('kicad_sch', 'version', 'uuid', 'paper', 'title_block', 'title', 'date', 'rev', 'company', 'comment',
+              'lib_symbols', 'symbol', 'power', 'property', 'id', 'lib_id', 'lib_name', 'unit', 'convert', 'in_bom',
+              'on_board', 'instances', 'project', 'path', 'reference', 'sheet', 'symbol_instances')
+# Nesting levels of the lists consumed by the tokenizer, deeper lists are skipped by the parser
+SKIP_LEVELS = 5
+
+
+def _unquote(tok):
+    if tok[0] != '"':
+        return tok
+    tok = tok[1:-1]
+    if '\\' in tok:
+        tok = unescape_re.sub(lambda m: UNESCAPE.get(m.group(1), m.group(1)), tok)
+    return tok
+
+
+def _token_re():
+    """ Regex for the tokens: `(`, `)`, atoms and strings (including the quotes).
+        An unused list (i.e. a wire) is matched as a whole, but isn't captured, so we get an empty token.
+        A lone quote is an unterminated string. """
+    string = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+    # Text inside a list, the look-ahead avoids backtracking when the list isn't complete
+    text = r'[^()"]+(?=[()"])'
+    nested = r'\((?:'+text+'|'+string+r')*\)'
+    for _ in range(SKIP_LEVELS-2):
+        nested = r'\((?:'+text+'|'+string+'|'+nested+r')*\)'
+    unused = r'\((?!(?:'+'|'.join(USED_LISTS)+r')[\s)])(?:'+text+'|'+string+'|'+nested+r')*\)'
+    return re.compile(unused+r'|([()]|'+string+r'|[^\s()"]+|")')
+
+
+def _skip(tokens, i):
+    """ Index of the token after the list that starts at `i` """
+    depth = 1
+    i += 1
+    while depth:
+        tok = tokens[i]
+        if tok == '(':
+            depth += 1
+        elif tok == ')':
+            depth -= 1
+        i += 1
+    return i
+
+
+def _args(tokens, i):
+    """ Values of the list that starts at `i`, the nested lists are skipped.
+        Returns the values and the index of the next token. """
+    res = []
+    i += 2
+    tok = tokens[i]
+    while tok != ')':
+        if tok == '(':
+            i = _skip(tokens, i)
+        else:
+            res.append(_unquote(tok))
+            i += 1
+        tok = tokens[i]
+    return res, i+1
+
+
+def _arg(tokens, i, f):
+    """ The only value of the list that starts at `i`.
+        Returns the value and the index of the next token. """
+    tok = tokens[i+2]
+    if tokens[i+3] == ')' and tok != '(' and tok != ')':
+        # The usual case: (NAME VALUE)
+        return _unquote(tok), i+4
+    res, i = _args(tokens, i)
+    if len(res) != 1:
+        raise f.error('Expected one value', ' '.join(res), i)
+    return res[0], i
+
+
+class SExpReader(object):
+    """ Streaming tokenizer for the S-expressions.
+        The file is split in chunks, at the end of a line, and each chunk is tokenized using only one call to the regex.
+        The lists we don't use are consumed by the regex, so we don't create objects for them.
+        We keep only the tokens of the current chunk, unless `get_list` needs the next chunk to complete a list.
+        `line` is the line of the last token, is computed only when needed (error messages). """
+    token_re = _token_re()
+    CHUNK = 65536
+
+    def __init__(self, f, file):
+        super().__init__()
+        self.file = file
+        self.data = f.read()
+        self.size = len(self.data)
+        # Ranges of `data` tokenized in `tokens`
+        self.chunks = []
+        self.end = 0
+        self.tokens = []
+        self.n_tokens = 0
+        # Index of the next token to return
+        self.pos = 0
+
+    def _tokenize(self):
+        """ Tokenizes the next chunk. Returns None at the end of the file. """
+        data = self.data
+        start = self.end
+        end = start
+        while end < self.size:
+            end = data.find('\n', end+self.CHUNK)
+            if end < 0:
+                end = self.size
+            tokens = self.token_re.findall(data, start, end)
+            # A lone quote is a string cut by the end of the chunk (or not terminated)
+            if '"' in tokens:
+                if end == self.size:
+                    self.chunks = [(start, end)]
+                    self.tokens = list(filter(None, tokens))
+                    self.n_tokens = len(self.tokens)
+                    self.pos = self.tokens.index('"')+1
+                    raise SchFileError('Unterminated string', '', self)
+                continue
+            self.end = end
+            tokens = list(filter(None, tokens))
+            if tokens:
+                return (start, end), tokens
+            start = end
+        return None
+
+    def _read_chunk(self):
+        """ Replaces the tokens using the next chunk. Returns False at the end of the file. """
+        res = self._tokenize()
+        if res is None:
+            return False
+        chunk, self.tokens = res
+        self.chunks = [chunk]
+        self.n_tokens = len(self.tokens)
+        self.pos = 0
+        return True
+
+    def _add_chunk(self):
+        """ Adds the tokens from the next chunk """
+        res = self._tokenize()
+        if res is None:
+            self.pos = self.n_tokens
+            raise SchFileError('Unexpected end of file', '', self)
+        chunk, tokens = res
+        self.chunks.append(chunk)
+        self.tokens = self.tokens+tokens
+        self.n_tokens = len(self.tokens)
+
+    def next(self):
+        """ The next token """
+        if self.pos == self.n_tokens and not self._read_chunk():
+            raise SchFileError('Unexpected end of file', '', self)
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def skip(self):
+        """ Skips the rest of the current list, no objects are created """
+        depth = 1
+        while True:
+            tokens = self.tokens
+            pos = self.pos
+            n_tokens = self.n_tokens
+            while pos < n_tokens:
+                tok = tokens[pos]
+                pos += 1
+                if tok == '(':
+                    depth += 1
+                elif tok == ')':
+                    depth -= 1
+                    if not depth:
+                        self.pos = pos
+                        return
+            self.pos = pos
+            if not self._read_chunk():
+                raise SchFileError('Unexpected end of file', '', self)
+
+    def get_list(self):
+        """ Makes sure the rest of the current list is tokenized, so we can parse it using indexes.
+            Returns the tokens, the index of the start of the list and the index of its closing parenthesis.
+            The start is computed as if the `(` and the name were in the tokens, don't use them. """
+        start = pos = self.pos
+        depth = 1
+        while True:
+            tokens = self.tokens
+            n_tokens = self.n_tokens
+            while pos < n_tokens:
+                tok = tokens[pos]
+                pos += 1
+                if tok == '(':
+                    depth += 1
+                elif tok == ')':
+                    depth -= 1
+                    if not depth:
+                        self.pos = pos
+                        return tokens, start-2, pos-1
+            self.pos = pos
+            self._add_chunk()
+
+    def args(self):
+        """ The rest of the current list as strings, the nested lists are skipped """
+        tokens, i, end = self.get_list()
+        return _args(tokens, i)[0]
+
+    def error(self, msg, code, pos):
+        """ Error for the token before `pos` """
+        self.pos = pos
+        return SchFileError(msg, code, self)
+
+    @property
+    def line(self):
+        offset = self.chunks[0][0] if self.chunks and not self.pos else self.end
+        n = 0
+        for start, end in self.chunks:
+            for m in self.token_re.finditer(self.data, start, end):
+                if m.group(1) is not None:
+                    n += 1
+                    if n == self.pos:
+                        offset = m.start()
+                        return self.data.count('\n', 0, offset)+1
+        return self.data.count('\n', 0, offset)+1
+
+
+class LibSymbol(object):
+    """ A symbol from the `lib_symbols` of the schematic (the embedded cache).
+        Only the information used for the BoM is loaded, the drawings are skipped. """
+    def __init__(self):
+        super().__init__()
+        self.ref_prefix = ''
+        self.desc = ''
+        self.keywords = ''
+        self.is_power = False
+        self.unit_count = 1
+        self.fields = OrderedDict()
+
+    @staticmethod
+    def load(f):
+        tokens, i, end = f.get_list()
+        sym = LibSymbol()
+        sym.lib_id = _unquote(tokens[i+2])
+        i += 3
+        while i < end:
+            if tokens[i] != '(':
+                i += 1
+                continue
+            name = tokens[i+1]
+            if name == 'property':
+                args, i = _args(tokens, i)
+                if len(args) < 2:
+                    raise f.error('Malformed symbol property', ' '.join(args), i)
+                sym.fields[args[0]] = args[1]
+                continue
+            if name == 'power':
+                sym.is_power = True
+            elif name == 'symbol':
+                # Units: NAME_UNIT_STYLE, we don't need the drawings
+                unit = _unquote(tokens[i+2]).rsplit('_', 2)
+                if len(unit) == 3 and unit[1].isdigit():
+                    sym.unit_count = max(sym.unit_count, int(unit[1]))
+            i = _skip(tokens, i)
+        sym.ref_prefix = sym.fields.get('Reference', '')
+        # KiCad 7 uses a regular field for the description
+        sym.desc = sym.fields.get('ki_description', sym.fields.get('Description', ''))
+        sym.keywords = sym.fields.get('ki_keywords', '')
+        return sym
+
+
+class SchematicComponentV6(SchematicComponent):
+    """ A component (symbol instance), the position isn't loaded """
+    __slots__ = ('lib_id', 'lib_name', 'on_board')
+
+    def __init__(self):
+        super().__init__()
+        self.lib_name = None
+        self.on_board = True
+        self.unit = self.unit2 = 1
+        self.ar = []
+        self.fields = []
+        self.dfields = {}
+
+    def _load_property(self, f, tokens, i, fields, fields_lc):
+        """ (property "NAME" "VALUE" (id N) ...) """
+        name = tokens[i+2]
+        value = tokens[i+3]
+        if name in '()' or value in '()':
+            raise f.error('Malformed component property', name, i+3)
+        field = SchematicField()
+        field.name = name = intern(_unquote(name))
+        number = None
+        i += 4
+        tok = tokens[i]
+        while tok != ')':
+            if tok != '(':
+                i += 1
+            elif tokens[i+1] == 'id':
+                number, i = _arg(tokens, i, f)
+                number = int(number)
+            else:
+                i = _skip(tokens, i)
+            tok = tokens[i]
+        if number is None:
+            # KiCad 8 doesn't use ids
+            try:
+                number = SchematicField.DEFAULT_NAMES.index(name)
+            except ValueError:
+                number = max(len(self.fields), 4)
+        field.number = number
+        value = _unquote(value)
+        field.value = intern(value) if number else value
+        self._add_loaded_field(field, fields, fields_lc)
+        return i+1
+
+    def _load_instances(self, f, tokens, i):
+        """ KiCad 7 instances: (instances (project NAME (path "/ROOT/SHEET" (reference R) (unit N)))).
+            The paths are completed when we know the UUID. """
+        end = _skip(tokens, i)-1
+        i += 2
+        while i < end:
+            tok = tokens[i]
+            if tok != '(':
+                # Project name or end of a project
+                i += 1
+                continue
+            name = tokens[i+1]
+            if name == 'project':
+                i += 2
+                continue
+            if name != 'path':
+                i = _skip(tokens, i)
+                continue
+            ar = SchematicAltRef()
+            # The path starts with the UUID of the main sheet, v5 paths doesn't include it
+            path = _unquote(tokens[i+2]).split('/', 2)
+            ar.path = '/'+path[2] if len(path) > 2 and path[2] else ''
+            i += 3
+            tok = tokens[i]
+            while tok != ')':
+                if tok != '(':
+                    i += 1
+                elif tokens[i+1] == 'reference':
+                    ar.ref, i = _arg(tokens, i, f)
+                elif tokens[i+1] == 'unit':
+                    ar.part, i = _arg(tokens, i, f)
+                else:
+                    i = _skip(tokens, i)
+                tok = tokens[i]
+            self.ar.append(ar)
+            i += 1
+        return end+1
+
+    @staticmethod
+    def load(f, fields, fields_lc):
+        tokens, i, end = f.get_list()
+        comp = SchematicComponentV6()
+        comp.id = ''
+        lib_id = None
+        i += 2
+        while i < end:
+            if tokens[i] != '(':
+                i += 1
+                continue
+            name = tokens[i+1]
+            if name == 'property':
+                i = comp._load_property(f, tokens, i, fields, fields_lc)
+            elif name == 'lib_id':
+                lib_id, i = _arg(tokens, i, f)
+            elif name == 'unit':
+                unit, i = _arg(tokens, i, f)
+                comp.unit = int(unit)
+            elif name == 'convert':
+                unit, i = _arg(tokens, i, f)
+                comp.unit2 = int(unit)
+            elif name == 'uuid':
+                id, i = _arg(tokens, i, f)
+                comp.id = intern(id)
+            elif name == 'in_bom':
+                flag, i = _arg(tokens, i, f)
+                comp.in_bom = flag == 'yes'
+            elif name == 'on_board':
+                flag, i = _arg(tokens, i, f)
+                comp.on_board = flag == 'yes'
+            elif name == 'lib_name':
+                comp.lib_name, i = _arg(tokens, i, f)
+            elif name == 'instances':
+                i = comp._load_instances(f, tokens, i)
+            else:
+                i = _skip(tokens, i)
+        if lib_id is None:
+            raise f.error('Component without lib_id', comp.id, end+1)
+        comp.lib_id = lib_id
+        res = lib_id.split(':')
+        comp.lib = None
+        if len(res) == 2:
+            comp.name = intern(res[1])
+            comp.lib = intern(res[0])
+        else:
+            comp.name = intern(lib_id)
+            logger.warning(W_NOLIB + "Component `{}` doesn't specify its library".format(comp.name))
+        if 'reference' not in comp.dfields:
+            raise f.error('Component without reference', lib_id, end+1)
+        comp.f_ref = comp.dfields['reference'].value
+        for ar in comp.ar:
+            ar.path += '/'+comp.id
+        comp._add_part_field()
+        return comp
+
+
+class SchematicSheetV6(SchematicSheet):
+    """ A sub-sheet, the position and size aren't loaded """
+    def __init__(self):
+        super().__init__()
+        self.labels = []
+
+    def load_sheet(self, parent, sheet_path, sheet_path_h, libs, fields, fields_lc, parsed):
+        assert self.name
+        self.sheet = SchematicV6()
+        # All the sheets use the instances from the main sheet
+        self.sheet.instances = self.instances
+        parent_dir = os.path.dirname(parent)
+        sheet_path, sheet_path_h = self.instance_path(sheet_path, sheet_path_h)
+        self.sheet.load(os.path.join(parent_dir, self.file), sheet_path, sheet_path_h, libs, fields, fields_lc, parsed)
+        return self.sheet
+
+    @staticmethod
+    def load(f):
+        tokens, i, end = f.get_list()
+        sch = SchematicSheetV6()
+        sch.name = None
+        sch.file = None
+        i += 2
+        while i < end:
+            if tokens[i] != '(':
+                i += 1
+                continue
+            name = tokens[i+1]
+            if name == 'property':
+                args, i = _args(tokens, i)
+                if len(args) < 2:
+                    raise f.error('Malformed sheet property', ' '.join(args), i)
+                if args[0] in SHEET_NAMES:
+                    sch.name = args[1]
+                elif args[0] in SHEET_FILES:
+                    sch.file = args[1]
+            elif name == 'uuid':
+                sch.id, i = _arg(tokens, i, f)
+            else:
+                i = _skip(tokens, i)
+        if not sch.name:
+            raise f.error('Missing sub-sheet name', sch.id, end+1)
+        if not sch.file:
+            raise f.error('Missing sub-sheet file name', sch.name, end+1)
+        return sch
+
+
+class SchematicV6(Schematic):
+    """ A KiCad v6 schematic. The symbols are embedded (`lib_symbols`), no libraries are used. """
+    shared_attrs = ('version', 'uuid', 'page_type', 'title_block', 'lib_symbols')
+
+    def __init__(self):
+        super().__init__()
+        # Alternative references for each component UUID (from `symbol_instances`)
+        self.instances = {}
+
+    def load(self, fname, sheet_path='', sheet_path_h='/', libs=None, fields=None, fields_lc=None, parsed=None):
+        if parsed is None:
+            # The main sheet, the sub-sheets use its instances
+            self.instances = {}
+        super().load(fname, sheet_path, sheet_path_h, libs, fields, fields_lc, parsed)
+
+    def _get_title_block(self, f):
+        tokens, i, end = f.get_list()
+        self.title_block = OrderedDict()
+        i += 2
+        while i < end:
+            if tokens[i] != '(':
+                i += 1
+                continue
+            name = tokens[i+1]
+            args, i = _args(tokens, i)
+            if name == 'comment' and len(args) == 2:
+                self.title_block['Comment'+args[0]] = args[1]
+            elif name in TITLE_BLOCK and len(args) == 1:
+                self.title_block[TITLE_BLOCK[name]] = args[0]
+
+    def _get_symbol_instances(self, f):
+        """ (path "/SHEET/COMPONENT" (reference R) (unit N) (value V) (footprint F)) """
+        instances = self.instances
+        while f.next() == '(':
+            if f.next() != 'path':
+                f.skip()
+                continue
+            tokens, i, end = f.get_list()
+            ar = SchematicAltRef()
+            ar.path = path = _unquote(tokens[i+2])
+            i += 3
+            while i < end:
+                if tokens[i] != '(':
+                    i += 1
+                    continue
+                name = tokens[i+1]
+                if name == 'reference':
+                    ar.ref, i = _arg(tokens, i, f)
+                elif name == 'unit':
+                    ar.part, i = _arg(tokens, i, f)
+                else:
+                    i = _skip(tokens, i)
+            instances.setdefault(path[path.rfind('/')+1:], []).append(ar)
+
+    def _parse(self, fname, sheet_path, sheet_path_h, libs, fields, fields_lc):
+        with open(fname, 'rt') as fh, no_gc():
+            f = SExpReader(fh, fname)
+            # Other lists are consumed by the tokenizer, so we check the text
+            start = f.data.lstrip()
+            if not start.startswith('(kicad_sch'):
+                raise SchFileError('No kicad_sch signature', start.split('\n', 1)[0], f)
+            f.next()
+            f.next()
+            self.version = 0
+            self.uuid = None
+            self.page_type = None
+            self.title_block = OrderedDict()
+            self.lib_symbols = OrderedDict()
+            self.all = []
+            self.components = []
+            self.sheets = []
+            tok = f.next()
+            while tok != ')':
+                if tok != '(':
+                    raise SchFileError('Expected a list', tok, f)
+                name = f.next()
+                if name == 'symbol':
+                    obj = SchematicComponentV6.load(f, fields, fields_lc)
+                    self.components.append(obj)
+                    self.all.append(obj)
+                elif name == 'sheet':
+                    obj = SchematicSheetV6.load(f)
+                    obj.instances = self.instances
+                    self.sheets.append(obj)
+                    self.all.append(obj)
+                elif name == 'lib_symbols':
+                    while f.next() == '(':
+                        if f.next() == 'symbol':
+                            sym = LibSymbol.load(f)
+                            self.lib_symbols[sym.lib_id] = sym
+                        else:
+                            f.skip()
+                elif name == 'symbol_instances':
+                    self._get_symbol_instances(f)
+                elif name == 'title_block':
+                    self._get_title_block(f)
+                elif name == 'version':
+                    self.version = int(f.args()[0])
+                elif name == 'uuid':
+                    self.uuid = f.args()[0]
+                elif name == 'paper':
+                    self.page_type = f.args()[0]
+                else:
+                    # Lists too deep for the tokenizer
+                    f.skip()
+                tok = f.next()
+            # Now we know all the instances (`symbol_instances` is at the end of the main sheet)
+            for comp in self.components:
+                if not comp.ar:
+                    comp.ar = self.instances.get(comp.id, [])
+                comp._solve_fields(f)
+                if not comp._solve_instance(sheet_path, sheet_path_h):
+                    raise SchFileError('Malformed component reference', comp.ref, f)
+                sym = self.lib_symbols.get(comp.lib_name or comp.lib_id)
+                if sym is not None:
+                    comp.desc = sym.desc
+                comp._validate()
+
+    def _collect_symbols(self, comps_data):
+        for c in self.components:
+            k = '{}:{}'.format(c.lib, c.name)
+            if comps_data.get(k) is None:
+                comps_data[k] = self.lib_symbols.get(c.lib_name or c.lib_id)
+        for sch in self.sheets:
+            sch.sheet._collect_symbols(comps_data)
+
+    def load_libs(self, fname):
+        """ The symbols are embedded in the schematic, we just collect the used ones """
+        self.comps_data = {'{}:{}'.format(c.lib, c.name): None for c in self.get_components_index().all}
+        self._collect_symbols(self.comps_data)
+        for k, v in self.comps_data.items():
+            if v is None:
+                logger.warning(W_MISSCMP + 'Missing component `{}`'.format(k))
+        if GS.debug_level > 1:
+            logger.debug("Components: "+str(list(self.comps_data.keys())))
+        self.stamps = self._get_stamps()
+
+    def reload_changed(self):
+        """ A change in any sheet usually changes the main sheet (`symbol_instances`), so we load everything """
+        changed = [f for f, stamp in self.stamps.items() if _file_stamp(f) != stamp]
+        if not changed:
+            return False
+        logger.debug('Changed files: '+str(sorted(changed)))
+        self.load(self.fname)
+        self.load_libs(self.fname)
+        return True
+
+    def save_variant(self, dest_dir):
+        raise PlotError("Saving KiCad 6 schematics isn't supported")
@@ -11,13 +11,18 @@ Main KiBot code
 
 import os
 import re
+import sys
+import json
+import threading
+from contextlib import contextmanager
 from sys import exit
 from sys import path as sys_path
 from shutil import which
 from subprocess import run, PIPE, call
-from glob import glob
+import subprocess
+from collections import OrderedDict
 from distutils.version import StrictVersion
-from importlib.util import (spec_from_file_location, module_from_spec)
+from importlib.util import (spec_from_file_location, module_from_spec, find_spec)
 
 from .gs import GS
 from .misc import (PLOT_ERROR, NO_PCBNEW_MODULE, MISSING_TOOL, CMD_EESCHEMA_DO, URL_EESCHEMA_DO, CORRUPTED_PCB,
@@ -25,26 +30,104 @@ from .misc import (PLOT_ERROR, NO_PCBNEW_MODULE, MISSING_TOOL, CMD_EESCHEMA_DO,
                    MOD_SMD, MOD_THROUGH_HOLE, MOD_VIRTUAL, W_PCBNOSCH, W_NONEEDSKIP)
 from .error import PlotError, KiPlotConfigurationError, config_error, trace_dump
 from .pre_base import BasePreFlight
-from .kicad.v5_sch import Schematic, SchFileError
-from .kicad.config import KiConfError
+from .registrable import Registrable, RegOutput, RegVariant, RegFilter
+from .plugins import Manifest, get_cache_dir
+from .macro_cache import ExpandedLoader, install as install_macro_cache
+from .build_cache import BuildCache
+from .sch_cache import load_cached_sch, save_cached_sch, start_capture, stop_capture
+from .kicad.v5_sch import Schematic, SchError, SchFileError
+from .kicad.v6_sch import SchematicV6
+from .kicad.config import KiConf, KiConfError
 from . import log
+from . import profiler
 
 logger = log.get_logger(__name__)
 # Cache to avoid running external many times to check their versions
 script_versions = {}
+# Lock used to serialize the in-process work when running outputs in parallel (see generate_outputs)
+_state_lock = None
+# Tools checked by the output running in the current thread (see check_version)
+_tools_used = threading.local()
+# Loaded boards and schematics, only used when we process more than one project (see FileCache)
+board_cache = None
+sch_cache = None
+_actions_loaded = False
 # Check if we have to run the nightly KiCad build
 if os.environ.get('KIAUS_USE_NIGHTLY'):
     # Path to the Python module
     sys_path.insert(0, '/usr/lib/kicad-nightly/lib/python3/dist-packages')
-try:
-    import pcbnew
-except ImportError:
-    log.init()
-    logger.error("Failed to import pcbnew Python module."
-                 " Is KiCad installed?"
-                 " Do you need to add it to PYTHONPATH?")
-    exit(NO_PCBNEW_MODULE)
-m = re.search(r'(\d+)\.(\d+)\.(\d+)', pcbnew.GetBuildVersion())
+# Imported only when needed, see load_pcbnew()
+pcbnew = None
+
+
+def load_pcbnew():
+    """ Imports the pcbnew module, it takes time, so we do it only when we need it """
+    global pcbnew
+    if pcbnew is not None:
+        return pcbnew
+    with profiler.phase('import pcbnew', 'import'):
+        try:
+            import pcbnew
+        except ImportError:
+            if not log.get_logger().handlers:
+                # We are importing kiplot, the logger isn't yet initialized
+                log.init()
+            logger.error("Failed to import pcbnew Python module."
+                         " Is KiCad installed?"
+                         " Do you need to add it to PYTHONPATH?")
+            exit(NO_PCBNEW_MODULE)
+    return pcbnew
+
+
+def _query_kicad_version():
+    """ Asks a child process for the KiCad version, so we don't import pcbnew if we don't need a PCB """
+    code = 'import sys; sys.path = {!r}; import pcbnew; print(pcbnew.GetBuildVersion())'.format(sys.path)
+    try:
+        res = run([sys.executable, '-c', code], stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    except OSError:
+        res = None
+    if res is None or res.returncode or not res.stdout.strip():
+        # Let load_pcbnew report the error
+        return load_pcbnew().GetBuildVersion()
+    # The last line, pcbnew could print some messages when imported
+    return res.stdout.strip().splitlines()[-1]
+
+
+def _get_kicad_version():
+    """ The KiCad build version, we cache it to avoid importing pcbnew.
+        The cache is validated using the size and modification time of the pcbnew module (find_spec doesn't import it).
+        When the cache is outdated we ask a child process. """
+    spec = find_spec('pcbnew')
+    if spec is None or not spec.origin:
+        # Not installed, let load_pcbnew report the error
+        return load_pcbnew().GetBuildVersion()
+    st = os.stat(spec.origin)
+    stamp = [spec.origin, st.st_mtime_ns, st.st_size]
+    cache_dir = get_cache_dir()
+    cache = os.path.join(cache_dir, 'kicad_version.json') if cache_dir else None
+    if cache:
+        try:
+            with open(cache, 'rt') as f:
+                data = json.load(f)
+            if data.get('stamp') == stamp:
+                return data['version']
+        except (OSError, ValueError, KeyError):
+            pass
+    version = _query_kicad_version()
+    if cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache, 'wt') as f:
+                json.dump({'stamp': stamp, 'version': version}, f)
+        except OSError as e:
+            logger.debug('Unable to cache the KiCad version `{}` ({})'.format(cache, e))
+    return version
+
+
+_version_phase = profiler.mark('detect KiCad version')
+GS.kicad_version = _get_kicad_version()
+profiler.done(_version_phase)
+m = re.search(r'(\d+)\.(\d+)\.(\d+)', GS.kicad_version)
 GS.kicad_version_major = int(m.group(1))
 GS.kicad_version_minor = int(m.group(2))
 GS.kicad_version_patch = int(m.group(3))
@@ -53,68 +136,152 @@ logger.debug('Detected KiCad v{}.{}.{} ({})'.format(GS.kicad_version_major, GS.k
              GS.kicad_version_patch, GS.kicad_version_n))
 
 
+class FileCache(object):
+    """ A small LRU cache for objects created from files (boards and schematics).
+        An entry is valid while the files used to create it aren't modified. """
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def _stamp(files):
+        res = []
+        for f in files:
+            try:
+                st = os.stat(f)
+                res.append((f, st.st_mtime_ns, st.st_size))
+            except OSError:
+                res.append((f, None, None))
+        return res
+
+    def get(self, key, update=None):
+        """ The cached object, None if missing or outdated.
+            `update` is a function to update an outdated object, returns the new list of files (None on failure). """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        obj, stamp = entry
+        if self._stamp([f for f, _, _ in stamp]) != stamp:
+            files = update(obj) if update is not None else None
+            if files is None:
+                logger.debug('Discarding cached `{}`'.format(key))
+                del self.entries[key]
+                return None
+            logger.debug('Updated cached `{}`'.format(key))
+            self.put(key, obj, files)
+            return obj
+        self.entries.move_to_end(key)
+        logger.debug('Using cached `{}`'.format(key))
+        return obj
+
+    def put(self, key, obj, files):
+        self.entries[key] = (obj, self._stamp(files))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
 def _import(name, path):
+    full_name = "kibot."+name
+    if full_name in sys.modules:
+        # Already imported by another plug-in
+        return
     # Python 3.4+ import mechanism
-    spec = spec_from_file_location("kibot."+name, path)
+    # The code comes from the cache of macro-expanded modules
+    spec = spec_from_file_location(full_name, path, loader=ExpandedLoader(full_name, path))
     mod = module_from_spec(spec)
+    sys.modules[full_name] = mod
     try:
         spec.loader.exec_module(mod)
     except ImportError as e:
+        del sys.modules[full_name]
         trace_dump()
         logger.error('Unable to import plug-ins: '+str(e))
         exit(WRONG_INSTALL)
 
 
-def _load_actions(path, load_internals=False):
-    logger.debug("Importing from "+path)
-    lst = glob(os.path.join(path, 'out_*.py')) + glob(os.path.join(path, 'pre_*.py'))
-    lst += glob(os.path.join(path, 'var_*.py')) + glob(os.path.join(path, 'fil_*.py'))
-    if load_internals:
-        lst += [os.path.join(path, 'globals.py')]
-    for p in lst:
-        name = os.path.splitext(os.path.basename(p))[0]
-        logger.debug("- Importing "+name)
-        _import(name, p)
+def _load_plugin(module):
+    """ Imports the module for a lazy plug-in (see Registrable.register_lazy) """
+    name, path = module
+    logger.debug("- Importing "+name)
+    with profiler.phase('import '+name, 'import'):
+        _import(name, path)
 
 
-def load_actions():
-    """ Load all the available ouputs and preflights """
-    from kibot.mcpyrate import activate
-    # activate.activate()
-    _load_actions(os.path.abspath(os.path.dirname(__file__)), True)
-    home = os.environ.get('HOME')
-    if home:
-        dir = os.path.join(home, '.config', 'kiplot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
-        dir = os.path.join(home, '.config', 'kibot', 'plugins')
-        if os.path.isdir(dir):
-            _load_actions(dir)
-    if 'de_activate' in activate.__dict__:
-        logger.debug('Deactivating macros')
-        activate.de_activate()
+def _load_actions(path, manifest, internals=False):
+    """ Registers the plug-ins found in `path`. They are imported when used, except for the ones we can't identify. """
+    logger.debug("Looking for plug-ins in "+path)
+    regs = {'output_class': RegOutput, 'pre_class': BasePreFlight, 'variant_class': RegVariant,
+            'filter_class': RegFilter}
+    for p, types in manifest.get_plugins(path):
+        name = os.path.splitext(os.path.basename(p))[0]
+        if types:
+            for kind, reg_name in types:
+                regs[kind].register_lazy(reg_name, (name, p))
+        elif not internals:
+            # A plug-in that registers itself in some other way
+            _load_plugin((name, p))
+    if internals:
+        _load_plugin(('globals', os.path.join(path, 'globals.py')))
 
 
-def check_version(command, version):
-    global script_versions
-    if command in script_versions:
+def load_actions():
+    """ Register all the available ouputs, preflights, variants and filters.
+        Only the global options are imported here, the rest is imported when used. """
+    global _actions_loaded
+    if _actions_loaded:
         return
+    _actions_loaded = True
+    with profiler.phase('load_actions'):
+        Registrable.set_loader(_load_plugin)
+        install_macro_cache()
+        manifest = Manifest()
+        _load_actions(os.path.abspath(os.path.dirname(__file__)), manifest, True)
+        home = os.environ.get('HOME')
+        if home:
+            dir = os.path.join(home, '.config', 'kiplot', 'plugins')
+            if os.path.isdir(dir):
+                _load_actions(dir, manifest)
+            dir = os.path.join(home, '.config', 'kibot', 'plugins')
+            if os.path.isdir(dir):
+                _load_actions(dir, manifest)
+        manifest.save()
+
+
+def get_tool_version(command):
+    """ Returns the version reported by the tool (None if unknown) and the output of `--version` """
     cmd = [command, '--version']
     logger.debug('Running: '+str(cmd))
-    result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    try:
+        result = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+    except OSError as e:
+        return None, str(e)
     z = re.match(command + r' (\d+\.\d+\.\d+)', result.stdout, re.IGNORECASE)
     if not z:
         z = re.search(r'Version: (\d+\.\d+\.\d+)', result.stdout, re.IGNORECASE)
     if not z:
+        return None, result.stdout
+    return z.group(1), result.stdout
+
+
+def check_version(command, version):
+    global script_versions
+    used = getattr(_tools_used, 'tools', None)
+    if used is not None:
+        used.add(command)
+    if command in script_versions:
+        return
+    ver, output = get_tool_version(command)
+    if ver is None:
         logger.error('Unable to determine ' + command + ' version:\n' +
-                     result.stdout)
+                     output)
         exit(MISSING_TOOL)
-    res = z.groups()
-    if StrictVersion(res[0]) < StrictVersion(version):
-        logger.error('Wrong version for `'+command+'` ('+res[0]+'), must be ' +
+    if StrictVersion(ver) < StrictVersion(version):
+        logger.error('Wrong version for `'+command+'` ('+ver+'), must be ' +
                      version+' or newer.')
         exit(MISSING_TOOL)
-    script_versions[command] = res[0]
+    script_versions[command] = ver
 
 
 def check_script(cmd, url, version=None):
@@ -130,11 +297,62 @@ def check_eeschema_do():
     check_script(CMD_EESCHEMA_DO, URL_EESCHEMA_DO, '1.4.0')
 
 
+@contextmanager
+def _waiting_child():
+    """ Releases the state lock while we wait for an external tool.
+        So other outputs can run in the meanwhile. """
+    if _state_lock is None:
+        yield
+        return
+    _state_lock.release()
+    try:
+        yield
+    finally:
+        _state_lock.acquire()
+
+
+def _exit_code(status):
+    """ os.waitstatus_to_exitcode for Python < 3.9 """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_child(cmd, phase, capture=False, **kwargs):
+    """ Runs an external tool, like subprocess.call or subprocess.check_output (capture=True).
+        When profiling we wait using os.wait4, to get the resources used by this particular child. """
+    if phase is None or not hasattr(os, 'wait4'):
+        return subprocess.check_output(cmd, **kwargs) if capture else call(cmd, **kwargs)
+    proc = subprocess.Popen(cmd, stdout=PIPE if capture else None, **kwargs)
+    output = None
+    try:
+        if capture:
+            output = proc.stdout.read()
+    finally:
+        if capture:
+            proc.stdout.close()
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = _exit_code(status)
+        phase.child_usage(usage)
+    if not capture:
+        return proc.returncode
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=output)
+    return output
+
+
+def check_output(cmd, **kwargs):
+    """ subprocess.check_output wrapper, allows other outputs to run while we wait """
+    with _waiting_child(), profiler.phase('exec '+os.path.basename(cmd[0]), 'child', child=True) as phase:
+        return _run_child(cmd, phase, capture=True, **kwargs)
+
+
 def exec_with_retry(cmd):
     logger.debug('Executing: '+str(cmd))
     retry = 2
     while retry:
-        ret = call(cmd)
+        with _waiting_child(), profiler.phase('exec '+os.path.basename(cmd[0]), 'child', child=True) as phase:
+            ret = _run_child(cmd, phase)
         retry -= 1
         if ret > 0 and ret < 128 and retry:
             logger.debug('Failed with error {}, retrying ...'.format(ret))
@@ -146,10 +364,19 @@ def load_board(pcb_file=None):
     if not pcb_file:
         GS.check_pcb()
         pcb_file = GS.pcb_file
+    fill_zones = BasePreFlight.get_option('check_zone_fills')
+    key = (pcb_file, bool(fill_zones))
+    board = board_cache.get(key) if board_cache is not None else None
+    if board is not None:
+        GS.board = board
+        return board
+    pcbnew = load_pcbnew()
     try:
-        board = pcbnew.LoadBoard(pcb_file)
-        if BasePreFlight.get_option('check_zone_fills'):
-            pcbnew.ZONE_FILLER(board).Fill(board.Zones())
+        with profiler.phase('load_board'):
+            board = pcbnew.LoadBoard(pcb_file)
+        if fill_zones:
+            with profiler.phase('fill zones'):
+                pcbnew.ZONE_FILLER(board).Fill(board.Zones())
         GS.board = board
     except OSError as e:
         logger.error('Error loading PCB file. Corrupted?')
@@ -157,24 +384,63 @@ def load_board(pcb_file=None):
         exit(CORRUPTED_PCB)
     assert board is not None
     logger.debug("Board loaded")
+    if board_cache is not None:
+        board_cache.put(key, board, [pcb_file])
     return board
 
 
+def _sch_files(sch):
+    """ Files used to load the schematic """
+    return sch.get_files()+sch.get_lib_files()+KiConf.get_config_files()
+
+
+def _update_sch(sch):
+    """ Loads the changed sheets and libs of a cached schematic """
+    try:
+        sch.reload_changed()
+    except (SchError, KiConfError, OSError) as e:
+        # Load it from scratch, so we get the errors reported in the usual way
+        logger.debug('Failed to reload the schematic ({})'.format(e))
+        return None
+    return _sch_files(sch)
+
+
 def load_sch():
     if GS.sch:  # Already loaded
         return
-    GS.kicad_version = pcbnew.GetBuildVersion()
     logger.debug('KiCad: '+GS.kicad_version)
     GS.check_sch()
-    # We can't yet load the new format
-    if GS.sch_file[-9:] == 'kicad_sch':
-        return
-    GS.sch = Schematic()
+    if sch_cache is not None:
+        GS.sch = sch_cache.get(GS.sch_file, _update_sch)
+        if GS.sch:
+            # Keep the KiCad configuration in sync
+            KiConf.init(GS.sch_file)
+            return
+    if GS.cache_sch:
+        with profiler.phase('load_cached_sch'):
+            GS.sch = load_cached_sch(GS.sch_file)
+        if GS.sch:
+            if sch_cache is not None:
+                sch_cache.put(GS.sch_file, GS.sch, _sch_files(GS.sch))
+            return
+    GS.sch = SchematicV6() if GS.sch_file.endswith('.kicad_sch') else Schematic()
     try:
-        GS.sch.load(GS.sch_file)
-        GS.sch.load_libs(GS.sch_file)
+        if GS.cache_sch:
+            start_capture(GS.sch_file)
+        try:
+            with profiler.phase('load_sch'):
+                GS.sch.load(GS.sch_file)
+            with profiler.phase('load_libs'):
+                GS.sch.load_libs(GS.sch_file)
+        finally:
+            warnings = stop_capture() if GS.cache_sch else None
         if GS.debug_level > 1:
             logger.debug('Schematic dependencies: '+str(GS.sch.get_files()))
+        if sch_cache is not None:
+            sch_cache.put(GS.sch_file, GS.sch, _sch_files(GS.sch))
+        if GS.cache_sch:
+            with profiler.phase('save_cached_sch'):
+                save_cached_sch(GS.sch_file, GS.sch, warnings)
     except SchFileError as e:
         trace_dump()
         logger.error('At line {} of `{}`: {}'.format(e.line, e.file, e.msg))
@@ -192,7 +458,10 @@ def get_board_comps_data(comps):
         return
     if not GS.board:
         load_board()
-    comps_hash = {c.ref: c for c in comps}
+    comps_hash = GS.sch.get_refs_hash()
+    # Discard data from a previous board (only when using cached schematics)
+    for c in comps:
+        c.smd = c.tht = c.virtual = False
     for m in GS.board.GetModules():
         ref = m.GetReference()
         if ref not in comps_hash:
@@ -219,6 +488,36 @@ def get_board_comps_data(comps):
     GS.board_comps_joined = True
 
 
+def reset_loaded():
+    """ Discards the information loaded from the project files and the configuration.
+        Keeps the name of the files. """
+    GS.reset_loaded()
+    layer = sys.modules.get('kibot.layer')
+    if layer is not None:
+        layer.Layer._pcb_layers = None
+        layer.Layer._plot_layers = None
+    bom = sys.modules.get('kibot.bom.bom')
+    if bom is not None:
+        bom.groups_cache.clear()
+    v5_sch = sys.modules.get('kibot.kicad.v5_sch')
+    if v5_sch is not None:
+        v5_sch.SchematicComponent.part_fields.clear()
+    BasePreFlight._in_use = {}
+    BasePreFlight._options = {}
+    RegOutput.set_filters({})
+    RegOutput.set_variants({})
+    KiConf.reset()
+    log.set_filters(None)
+
+
+def reset_state():
+    """ Discards the information about the current project.
+        Used when we process more than one project using the same process. """
+    GS.reset()
+    reset_loaded()
+    log.MyLogger.reset_warn_counters()
+
+
 def preflight_checks(skip_pre):
     logger.debug("Preflight checks")
 
@@ -258,12 +557,96 @@ def get_output_dir(o_dir):
 
 def config_output(out):
     try:
-        out.config()
+        with profiler.phase('config '+out.name, 'output'):
+            out.config()
     except KiPlotConfigurationError as e:
         config_error("In section '"+out.name+"' ("+out.type+"): "+str(e))
 
 
-def generate_outputs(outputs, target, invert, skip_pre):
+def _run_output(out, board, cache):
+    logger.info('- '+str(out))
+    out_dir = get_output_dir(out.dir)
+    cache.start(out, out_dir)
+    _tools_used.tools = set()
+    try:
+        with profiler.phase('run '+out.name, 'output'):
+            out.run(out_dir, board)
+    except PlotError as e:
+        logger.error("In output `"+str(out)+"`: "+str(e))
+        exit(PLOT_ERROR)
+    except KiPlotConfigurationError as e:
+        config_error("In section '"+out.name+"' ("+out.type+"): "+str(e))
+    cache.done(out, out_dir, {t: script_versions[t] for t in _tools_used.tools if t in script_versions})
+    _tools_used.tools = None
+
+
+def _dir_key(out):
+    return os.path.abspath(os.path.join(GS.out_dir, out.dir))
+
+
+def _run_outputs_parallel(outputs, board, jobs, cache):
+    """ Runs the outputs using a pool of threads.
+        The PCB, the schematic and the components are shared by all the outputs, so the in-process work is serialized
+        using `_state_lock`. This lock is released while waiting for external tools (see `_waiting_child`).
+        So only the external tools run at the same time, there is no dependency graph: the in-process work can't be
+        done in parallel (the KiCad API isn't thread safe and the GIL serializes it anyway).
+        The messages of the outputs are mixed, so they are prefixed with the output name (see `log.set_job_name`).
+        The outputs that modify the PCB (variants) restore it before calling the external tools.
+        Outputs using the same directory aren't run at the same time. Some tools use fixed names for their intermediate
+        files, and the cache finds the files generated by each output looking at the changes in its directory. """
+    global _state_lock
+    pending = list(outputs)
+    running = set()
+    errors = []
+    cond = threading.Condition()
+
+    def worker():
+        while True:
+            with cond:
+                out = None
+                while not errors and pending:
+                    out = next((o for o in pending if _dir_key(o) not in running), None)
+                    if out is not None:
+                        break
+                    cond.wait()
+                if out is None:
+                    return
+                pending.remove(out)
+                key = _dir_key(out)
+                running.add(key)
+            log.set_job_name(out.name)
+            try:
+                with _state_lock:
+                    _run_output(out, board, cache)
+            except BaseException as e:
+                with cond:
+                    errors.append(e)
+            finally:
+                log.set_job_name(None)
+                with cond:
+                    running.discard(key)
+                    cond.notify_all()
+
+    _state_lock = threading.Lock()
+    try:
+        threads = [threading.Thread(target=worker, name='kibot_job_'+str(c)) for c in range(min(jobs, len(outputs)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        _state_lock = None
+    if errors:
+        # Report the first error, like the sequential mode does
+        e = errors[0]
+        if isinstance(e, SystemExit):
+            exit(e.code)
+        raise e
+
+
+def generate_outputs(outputs, target, invert, skip_pre, jobs=1, force=False):
+    """ Runs the preflights and generates the outputs.
+        Returns the list of selected outputs. """
     logger.debug("Starting outputs for board {}".format(GS.pcb_file))
     preflight_checks(skip_pre)
     # Check if all must be skipped
@@ -271,9 +654,12 @@ def generate_outputs(outputs, target, invert, skip_pre):
     if n == 0 and invert:
         # Skip all targets
         logger.debug('Skipping all outputs')
-        return
+        return []
     # Generate outputs
     board = None
+    selected = []
+    used = []
+    cache = BuildCache(GS.out_dir, force)
     for out in outputs:
         if (n == 0) or ((out.name in target) ^ invert):
             # Should we load the PCB?
@@ -282,13 +668,17 @@ def generate_outputs(outputs, target, invert, skip_pre):
             if out.is_sch():
                 load_sch()
             config_output(out)
-            logger.info('- '+str(out))
-            try:
-                out.run(get_output_dir(out.dir), board)
-            except PlotError as e:
-                logger.error("In output `"+str(out)+"`: "+str(e))
-                exit(PLOT_ERROR)
-            except KiPlotConfigurationError as e:
-                config_error("In section '"+out.name+"' ("+out.type+"): "+str(e))
+            used.append(out)
+            if cache.is_up_to_date(out, _dir_key(out)):
+                logger.info('- '+str(out)+' (up to date)')
+            elif jobs > 1:
+                # Collect them and run them later
+                selected.append(out)
+            else:
+                _run_output(out, board, cache)
         else:
             logger.debug('Skipping `%s` output', str(out))
+    if selected:
+        logger.debug('Generating {} outputs using {} jobs'.format(len(selected), jobs))
+        _run_outputs_parallel(selected, board, jobs, cache)
+    return used
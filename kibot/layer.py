@@ -3,12 +3,12 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-import pcbnew
 from .optionable import Optionable
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
 from re import match
 from .error import (PlotError, KiPlotConfigurationError)
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
@@ -17,28 +17,28 @@ logger = log.get_logger(__name__)
 
 class Layer(Optionable):
     """ A layer description """
-    # Default names
+    # Default names, the values are the names of the pcbnew constants (pcbnew is imported only when needed)
     DEFAULT_LAYER_NAMES = {
-        'F.Cu': pcbnew.F_Cu,
-        'B.Cu': pcbnew.B_Cu,
-        'F.Adhes': pcbnew.F_Adhes,
-        'B.Adhes': pcbnew.B_Adhes,
-        'F.Paste': pcbnew.F_Paste,
-        'B.Paste': pcbnew.B_Paste,
-        'F.SilkS': pcbnew.F_SilkS,
-        'B.SilkS': pcbnew.B_SilkS,
-        'F.Mask': pcbnew.F_Mask,
-        'B.Mask': pcbnew.B_Mask,
-        'Dwgs.User': pcbnew.Dwgs_User,
-        'Cmts.User': pcbnew.Cmts_User,
-        'Eco1.User': pcbnew.Eco1_User,
-        'Eco2.User': pcbnew.Eco2_User,
-        'Edge.Cuts': pcbnew.Edge_Cuts,
-        'Margin': pcbnew.Margin,
-        'F.CrtYd': pcbnew.F_CrtYd,
-        'B.CrtYd': pcbnew.B_CrtYd,
-        'F.Fab': pcbnew.F_Fab,
-        'B.Fab': pcbnew.B_Fab,
+        'F.Cu': 'F_Cu',
+        'B.Cu': 'B_Cu',
+        'F.Adhes': 'F_Adhes',
+        'B.Adhes': 'B_Adhes',
+        'F.Paste': 'F_Paste',
+        'B.Paste': 'B_Paste',
+        'F.SilkS': 'F_SilkS',
+        'B.SilkS': 'B_SilkS',
+        'F.Mask': 'F_Mask',
+        'B.Mask': 'B_Mask',
+        'Dwgs.User': 'Dwgs_User',
+        'Cmts.User': 'Cmts_User',
+        'Eco1.User': 'Eco1_User',
+        'Eco2.User': 'Eco2_User',
+        'Edge.Cuts': 'Edge_Cuts',
+        'Margin': 'Margin',
+        'F.CrtYd': 'F_CrtYd',
+        'B.CrtYd': 'B_CrtYd',
+        'F.Fab': 'F_Fab',
+        'B.Fab': 'B_Fab',
     }
     # Default names
     DEFAULT_LAYER_DESC = {
@@ -203,8 +203,9 @@ class Layer(Optionable):
         """ Get the pcbnew layer from the string provided in the config """
         # Priority
         # 1) Internal list
+        pcbnew = load_pcbnew()
         if self.layer in Layer.DEFAULT_LAYER_NAMES:
-            self._id = Layer.DEFAULT_LAYER_NAMES[self.layer]
+            self._id = getattr(pcbnew, Layer.DEFAULT_LAYER_NAMES[self.layer])
             self._is_inner = False
         else:
             id = Layer._pcb_layers.get(self.layer)
@@ -11,6 +11,7 @@ Handles logging initialization and formating.
 """
 import sys
 import logging
+import threading
 from io import StringIO
 no_colorama = False
 try:
@@ -25,6 +26,8 @@ else:
 # Default domain, base name for the tool
 domain = 'kilog'
 filters = None
+# Name of the output generated by the current thread, used to tell apart the messages of parallel jobs
+job = threading.local()
 
 
 def get_logger(name=None):
@@ -42,6 +45,11 @@ def set_domain(name):
     domain = name
 
 
+def set_job_name(name):
+    """Set the output name used as prefix for the messages of this thread (None to disable)"""
+    job.name = name
+
+
 def set_filters(f):
     """Set the list of warning filters"""
     global filters
@@ -51,6 +59,8 @@ def set_filters(f):
 class MyLogger(logging.Logger):
     warn_hash = {}
     warn_tcnt = warn_cnt = n_filtered = 0
+    # List to collect the warnings (before filtering them), see sch_cache.py
+    captured = None
 
     def warning(self, msg, *args, **kwargs):
         MyLogger.warn_tcnt += 1
@@ -61,6 +71,8 @@ class MyLogger(logging.Logger):
             buf = buf.getvalue()
         else:
             buf = str(msg)
+        if MyLogger.captured is not None:
+            MyLogger.captured.append(buf)
         # Avoid repeated warnings
         if buf in MyLogger.warn_hash:
             MyLogger.warn_hash[buf] += 1
@@ -81,6 +93,11 @@ class MyLogger(logging.Logger):
         else:
             super().warning(buf, **kwargs)
 
+    @staticmethod
+    def reset_warn_counters():
+        MyLogger.warn_hash = {}
+        MyLogger.warn_tcnt = MyLogger.warn_cnt = MyLogger.n_filtered = 0
+
     def log_totals(self):
         if MyLogger.warn_cnt:
             filt_msg = ''
@@ -141,6 +158,10 @@ class CustomFormatter(logging.Formatter):
     }
 
     def format(self, record):
+        name = getattr(job, 'name', None)
+        if name:
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = '['+name+'] '+str(record.msg)
         log_fmt = self.FORMATS.get(record.levelno)
         formatter = logging.Formatter(log_fmt)
         return formatter.format(record)
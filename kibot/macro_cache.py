@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Cache for the modules that use macros (the plug-ins).
+
+The modules are expanded by mcpyrate and the resulting code is stored in XDG_CACHE_HOME/kibot/expanded/.
+The entries are validated using the size and modification time of the module and of the modules defining the macros.
+So mcpyrate is only imported when something changed, and we don't need to write .pyc files in the installation dir.
+"""
+import os
+import re
+import sys
+import marshal
+from hashlib import sha1
+from importlib.abc import MetaPathFinder
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_file_location, resolve_name, find_spec
+from .plugins import get_cache_dir
+from . import log
+
+logger = log.get_logger(__name__)
+CACHE_VERSION = 1
+# from .macros import macros, document
+MACRO_IMPORT = re.compile(rb'^from\s+(\.*[\w.]*)\s+import\s+macros\b', re.M)
+KIBOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _stamp(fname):
+    st = os.stat(fname)
+    return [fname, st.st_mtime_ns, st.st_size]
+
+
+def _cache_file(fullname, path):
+    cache = get_cache_dir()
+    if cache is None:
+        return None
+    name = fullname+'-'+sha1(path.encode()).hexdigest()[:16]+'.bin'
+    return os.path.join(cache, 'expanded', sys.implementation.cache_tag, name)
+
+
+def _load_cached(cache, path):
+    """ The cached code, None if missing or outdated """
+    try:
+        with open(cache, 'rb') as f:
+            version, stamps, code = marshal.load(f)
+        if version != CACHE_VERSION or stamps[0][0] != path:
+            return None
+        for stamp in stamps:
+            if _stamp(stamp[0]) != stamp:
+                return None
+        return code
+    except (OSError, ValueError, EOFError, TypeError, IndexError):
+        return None
+
+
+def _save_cached(cache, stamps, code):
+    tmp = cache+'.'+str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump((CACHE_VERSION, stamps, code), f)
+        os.replace(tmp, cache)
+    except OSError as e:
+        logger.debug('Unable to cache the expanded code `{}` ({})'.format(cache, e))
+
+
+def _macro_modules(fullname, data):
+    """ Files defining the macros used by this module """
+    package = fullname.rpartition('.')[0]
+    res = []
+    for name in MACRO_IMPORT.findall(data):
+        spec = find_spec(resolve_name(name.decode(), package))
+        if spec is not None and spec.origin:
+            res.append(spec.origin)
+    return res
+
+
+def get_code(fullname, path):
+    """ Code object for the module, macro-expanded if needed """
+    cache = _cache_file(fullname, path)
+    if cache is not None:
+        code = _load_cached(cache, path)
+        if code is not None:
+            return code
+    with open(path, 'rb') as f:
+        data = f.read()
+    macros = _macro_modules(fullname, data)
+    if macros:
+        logger.debug('Expanding macros for `{}`'.format(path))
+        # Only here we need mcpyrate
+        from .mcpyrate.importer import source_to_xcode
+        from .mcpyrate import expander
+        code = source_to_xcode(None, data, path)
+        macros.append(expander.__file__)
+    else:
+        code = compile(data, path, 'exec', dont_inherit=True)
+    if cache is not None:
+        _save_cached(cache, [_stamp(path)]+[_stamp(m) for m in macros], code)
+    return code
+
+
+class ExpandedLoader(SourceFileLoader):
+    """ Loads the code from our cache, expanding the macros when needed """
+    def get_code(self, fullname):
+        return get_code(fullname, self.path)
+
+
+class ExpandedFinder(MetaPathFinder):
+    """ Finds the KiBot modules that use macros """
+    def find_spec(self, fullname, path, target=None):
+        package, _, name = fullname.rpartition('.')
+        if package != 'kibot':
+            return None
+        fname = os.path.join(KIBOT_DIR, name+'.py')
+        try:
+            with open(fname, 'rb') as f:
+                if not MACRO_IMPORT.search(f.read()):
+                    return None
+        except OSError:
+            return None
+        return spec_from_file_location(fullname, fname, loader=ExpandedLoader(fullname, fname))
+
+
+def install():
+    """ Makes the KiBot modules that use macros load from the cache """
+    if not any(isinstance(f, ExpandedFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, ExpandedFinder())
@@ -9,7 +9,6 @@ Macros to make the output plug-ins cleaner.
 from .gs import GS  # noqa: F401
 from ast import (Assign, Name, Attribute, Expr, Num, Str, NameConstant, Load, Store, UnaryOp, USub,
                  ClassDef, Call, ImportFrom, copy_location, alias)
-from .mcpyrate import unparse
 
 
 def document(sentences, **kw):
@@ -62,6 +61,8 @@ def document(sentences, **kw):
                 type_hint = '[boolean={}]'.format(str(value.value).lower())
             elif isinstance(value, Attribute):
                 # Used for the default options. I.e. GS.def_global_option
+                # Imported here, the expanded modules import this file and we don't want to load mcpyrate
+                from .mcpyrate import unparse
                 val = eval(unparse(value))
                 if isinstance(val, bool):
                     # Not used yet
@@ -29,6 +29,7 @@ PCBDRAW_ERR = 20
 SVG_SCH_PRINT = 21
 CORRUPTED_SCH = 22
 WRONG_INSTALL = 23
+SERVER_ERROR = 24
 error_level_to_name = ['NONE',
                        'INTERNAL_ERROR',
                        'WRONG_ARGUMENTS',
@@ -53,6 +54,7 @@ error_level_to_name = ['NONE',
                        'SVG_SCH_PRINT',
                        'CORRUPTED_SCH',
                        'WRONG_INSTALL',
+                       'SERVER_ERROR',
                        ]
 CMD_EESCHEMA_DO = 'eeschema_do'
 URL_EESCHEMA_DO = 'https://github.com/INTI-CMNB/kicad-automation-scripts'
@@ -156,6 +158,7 @@ W_MISSDCM = '(W042) '
 W_MISSCMP = '(W043) '
 W_VARSCH = '(W044) '
 W_WRONGPASTE = '(W045) '
+W_BADREQUEST = '(W046) '
 
 
 class Rect(object):
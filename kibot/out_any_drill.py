@@ -4,11 +4,10 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 import os
-from pcbnew import (PLOT_FORMAT_HPGL, PLOT_FORMAT_POST, PLOT_FORMAT_GERBER, PLOT_FORMAT_DXF, PLOT_FORMAT_SVG,
-                    PLOT_FORMAT_PDF, wxPoint)
 from .optionable import (Optionable, BaseOptions)
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
+from .kiplot import load_pcbnew
 from .macros import macros, document  # noqa: F401
 from . import log
 
@@ -57,14 +56,14 @@ class AnyDrill(BaseOptions):
             self.report = DrillReport
             """ [dict|string] name of the drill report. Not generated unless a name is specified """
         super().__init__()
-        # Mappings to KiCad values
+        # Mappings to KiCad values (pcbnew constants, solved when generating the files)
         self._map_map = {
-                         'hpgl': PLOT_FORMAT_HPGL,
-                         'ps': PLOT_FORMAT_POST,
-                         'gerber': PLOT_FORMAT_GERBER,
-                         'dxf': PLOT_FORMAT_DXF,
-                         'svg': PLOT_FORMAT_SVG,
-                         'pdf': PLOT_FORMAT_PDF
+                         'hpgl': 'PLOT_FORMAT_HPGL',
+                         'ps': 'PLOT_FORMAT_POST',
+                         'gerber': 'PLOT_FORMAT_GERBER',
+                         'dxf': 'PLOT_FORMAT_DXF',
+                         'svg': 'PLOT_FORMAT_SVG',
+                         'pdf': 'PLOT_FORMAT_PDF'
                         }
         self._map_ext = {'hpgl': 'plt', 'ps': 'ps', 'gerber': 'gbr', 'dxf': 'dxf', 'svg': 'svg', 'pdf': 'pdf'}
         self._unified_output = False
@@ -89,17 +88,18 @@ class AnyDrill(BaseOptions):
             self.report = None
 
     def run(self, output_dir, board):
+        pcbnew = load_pcbnew()
         # dialog_gendrill.cpp:357
         if self.use_aux_axis_as_origin:
             offset = get_aux_origin(board)
         else:
-            offset = wxPoint(0, 0)
+            offset = pcbnew.wxPoint(0, 0)
         drill_writer, ext = self._configure_writer(board, offset)
 
         logger.debug("Generating drill files in "+output_dir)
         gen_map = self.map is not None
         if gen_map:
-            drill_writer.SetMapFileFormat(self.map)
+            drill_writer.SetMapFileFormat(getattr(pcbnew, self.map))
             logger.debug("Generating drill map type {} in {}".format(self.map, output_dir))
         # We always generate the drill file
         drill_writer.CreateDrillandMapFilesSet(output_dir, True, gen_map)
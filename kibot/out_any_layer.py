@@ -6,13 +6,13 @@
 # Project: KiBot (formerly KiPlot)
 # Adapted from: https://github.com/johnbeard/kiplot
 import os
-from pcbnew import GERBER_JOBFILE_WRITER, PLOT_CONTROLLER, IsCopperLayer
 from .out_base import (BaseOutput)
 from .error import (PlotError, KiPlotConfigurationError)
 from .layer import Layer
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
 from .out_base import VariantOptions
+from .kiplot import load_pcbnew
 from .macros import macros, document  # noqa: F401
 from . import log
 
@@ -70,9 +70,10 @@ class AnyLayerOptions(VariantOptions):
         self.restore_paste_and_glue(board, self.comps_hash)
 
     def run(self, output_dir, board, layers):
+        pcbnew = load_pcbnew()
         super().run(output_dir, board)
         # fresh plot controller
-        plot_ctrl = PLOT_CONTROLLER(board)
+        plot_ctrl = pcbnew.PLOT_CONTROLLER(board)
         # set up plot options for the whole output
         po = plot_ctrl.GetPlotOptions()
         self._configure_plot_ctrl(po, output_dir)
@@ -80,7 +81,7 @@ class AnyLayerOptions(VariantOptions):
         # We need to assist KiCad
         create_job = po.GetCreateGerberJobFile()
         if create_job:
-            jobfile_writer = GERBER_JOBFILE_WRITER(board)
+            jobfile_writer = pcbnew.GERBER_JOBFILE_WRITER(board)
         plot_ctrl.SetColorMode(True)
         # Apply the variants and filters
         exclude = self.filter_components(board)
@@ -94,7 +95,7 @@ class AnyLayerOptions(VariantOptions):
             plot_ctrl.SetLayer(id)
             # Skipping NPTH is controlled by whether or not this is
             # a copper layer
-            is_cu = IsCopperLayer(id)
+            is_cu = pcbnew.IsCopperLayer(id)
             po.SetSkipPlotNPTH_Pads(is_cu)
             # Plot single layer to file
             logger.debug("Opening plot file for layer `{}` format `{}`".format(la, self._plot_format))
@@ -4,15 +4,11 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 from .gs import GS
-from .kiplot import load_sch
+from .kiplot import load_sch, load_pcbnew
 from .misc import Rect, KICAD_VERSION_5_99, W_WRONGPASTE
-if GS.kicad_version_n >= KICAD_VERSION_5_99:
-    # New name, no alias ...
-    from pcbnew import FP_SHAPE, wxPoint, LSET
-else:
-    from pcbnew import EDGE_MODULE, wxPoint, LSET
 from .registrable import RegOutput
 from .optionable import Optionable, BaseOptions
+from .kicad.config import KiConf
 from .fil_base import BaseFilter, apply_fitted_filter, reset_filters
 from .macros import macros, document  # noqa: F401
 from . import log
@@ -47,6 +43,29 @@ class BaseOutput(RegOutput):
         """ True for outputs that works on the PCB """
         return not self._sch_related
 
+    def uses_sch(self):
+        """ True for outputs that needs the schematic, including PCB outputs using variants """
+        if self.is_sch():
+            return True
+        options = getattr(self, 'options', None)
+        return bool(getattr(options, 'variant', None) or getattr(options, 'dnf_filter', None))
+
+    def get_dependencies(self):
+        """ List of files used to generate this output.
+            Must be called after config(). """
+        files = []
+        if self.is_pcb() and GS.pcb_file:
+            files.append(GS.pcb_file)
+        if self.uses_sch() and GS.sch_file:
+            load_sch()
+            if GS.sch:
+                files.extend(GS.sch.get_files())
+                files.extend(GS.sch.get_lib_files())
+                files.extend(KiConf.get_config_files())
+            else:
+                files.append(GS.sch_file)
+        return files
+
     def config(self):
         super().config()
         if getattr(self, 'options', None) and isinstance(self.options, type):
@@ -95,7 +114,8 @@ class VariantOptions(BaseOptions):
     def get_refs_hash(self):
         if not self._comps:
             return None
-        return {c.ref: c for c in self._comps}
+        # The components are the ones from the schematic, use its index
+        return GS.sch.get_refs_hash()
 
     def get_fitted_refs(self):
         """ List of fitted and included components """
@@ -111,26 +131,29 @@ class VariantOptions(BaseOptions):
 
     @staticmethod
     def create_module_element(m):
+        pcbnew = load_pcbnew()
         if GS.kicad_version_n >= KICAD_VERSION_5_99:
-            return FP_SHAPE(m)
-        return EDGE_MODULE(m)
+            # New name, no alias ...
+            return pcbnew.FP_SHAPE(m)
+        return pcbnew.EDGE_MODULE(m)
 
     @staticmethod
     def cross_module(m, rect, layer):
         """ Draw a cross over a module.
             The rect is a Rect object with the size.
             The layer is which layer id will be used. """
+        pcbnew = load_pcbnew()
         seg1 = VariantOptions.create_module_element(m)
         seg1.SetWidth(120000)
-        seg1.SetStart(wxPoint(rect.x1, rect.y1))
-        seg1.SetEnd(wxPoint(rect.x2, rect.y2))
+        seg1.SetStart(pcbnew.wxPoint(rect.x1, rect.y1))
+        seg1.SetEnd(pcbnew.wxPoint(rect.x2, rect.y2))
         seg1.SetLayer(layer)
         seg1.SetLocalCoord()  # Update the local coordinates
         m.Add(seg1)
         seg2 = VariantOptions.create_module_element(m)
         seg2.SetWidth(120000)
-        seg2.SetStart(wxPoint(rect.x1, rect.y2))
-        seg2.SetEnd(wxPoint(rect.x2, rect.y1))
+        seg2.SetStart(pcbnew.wxPoint(rect.x1, rect.y2))
+        seg2.SetEnd(pcbnew.wxPoint(rect.x2, rect.y1))
         seg2.SetLayer(layer)
         seg2.SetLocalCoord()  # Update the local coordinates
         m.Add(seg2)
@@ -189,7 +212,8 @@ class VariantOptions(BaseOptions):
 
     def remove_paste_and_glue(self, board, comps_hash):
         """ Remove from solder paste layers the filtered components. """
-        exclude = LSET()
+        pcbnew = load_pcbnew()
+        exclude = pcbnew.LSET()
         fpaste = board.GetLayerID('F.Paste')
         bpaste = board.GetLayerID('B.Paste')
         exclude.addLayer(fpaste)
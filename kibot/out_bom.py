@@ -25,6 +25,7 @@ from . import log
 
 logger = log.get_logger(__name__)
 VALID_STYLES = {'modern-blue', 'modern-green', 'modern-red', 'classic'}
+VALID_FORMATS = ['HTML', 'CSV', 'TXT', 'TSV', 'XML', 'XLSX']
 DEFAULT_ALIASES = [['r', 'r_small', 'res', 'resistor'],
                    ['l', 'l_small', 'inductor'],
                    ['c', 'c_small', 'cap', 'capacitor'],
@@ -187,8 +188,9 @@ class BoMOptions(BaseOptions):
                 are output to the BoM. """
             self.output = GS.def_global_output
             """ filename for the output (%i=bom)"""
-            self.format = ''
-            """ [HTML,CSV,TXT,TSV,XML,XLSX] format for the BoM.
+            self.format = Optionable
+            """ [list(string)|string=''] [HTML,CSV,TXT,TSV,XML,XLSX] format for the BoM.
+                Use a list to generate more than one format, the components are grouped only once.
                 If empty defaults to CSV or a guess according to the options. """
             # Equivalent to KiBoM INI:
             self.ignore_dnf = True
@@ -253,17 +255,25 @@ class BoMOptions(BaseOptions):
 
     def _guess_format(self):
         """ Figure out the format """
-        if not self.format:
+        if isinstance(self.format, type) or not self.format:
             # If we have HTML options generate an HTML
             if not isinstance(self.html, type):
-                return 'html'
+                return ['html']
             # Same for XLSX
             if not isinstance(self.xlsx, type):
-                return 'xlsx'
+                return ['xlsx']
             # Default to a simple and common format: CSV
-            return 'csv'
+            return ['csv']
         # Explicit selection
-        return self.format.lower()
+        formats = [self.format] if isinstance(self.format, str) else self.format
+        res = []
+        for format in formats:
+            if format not in VALID_FORMATS:
+                raise KiPlotConfigurationError("Option `format` must be any of {} not `{}`".format(VALID_FORMATS, format))
+            format = format.lower()
+            if format not in res:
+                res.append(format)
+        return res
 
     def _normalize_variant(self):
         """ Replaces the name of the variant by an object handling it. """
@@ -285,18 +295,20 @@ class BoMOptions(BaseOptions):
     def config(self):
         super().config()
         self.format = self._guess_format()
+        if len(self.format) > 1 and '%x' not in self.output:
+            raise KiPlotConfigurationError("Using more than one format needs `%x` in the `output` name")
         # HTML options
-        if self.format == 'html' and isinstance(self.html, type):
+        if 'html' in self.format and isinstance(self.html, type):
             # If no options get the defaults
             self.html = BoMHTML()
             self.html.config()
         # CSV options
-        if self.format in ['csv', 'tsv', 'txt'] and isinstance(self.csv, type):
+        if set(self.format) & {'csv', 'tsv', 'txt'} and isinstance(self.csv, type):
             # If no options get the defaults
             self.csv = BoMCSV()
             self.csv.config()
         # XLSX options
-        if self.format == 'xlsx' and isinstance(self.xlsx, type):
+        if 'xlsx' in self.format and isinstance(self.xlsx, type):
             # If no options get the defaults
             self.xlsx = BoMXLSX()
             self.xlsx.config()
@@ -361,8 +373,7 @@ class BoMOptions(BaseOptions):
             self.columns = columns
 
     def run(self, output_dir, board):
-        format = self.format.lower()
-        output = self.expand_filename_sch(output_dir, self.output, 'bom', format)
+        outputs = [(self.expand_filename_sch(output_dir, self.output, 'bom', format), format) for format in self.format]
         # Add some info needed for the output to the config object.
         # So all the configuration is contained in one object.
         self.source = GS.sch_basename
@@ -381,7 +392,9 @@ class BoMOptions(BaseOptions):
         # Apply the variant
         self.variant.filter(comps)
         try:
-            do_bom(output, format, comps, self)
+            # The groups are computed by the first call and shared by the rest
+            for output, format in outputs:
+                do_bom(output, format, comps, self)
         except BoMError as e:
             raise KiPlotConfigurationError(str(e))
 
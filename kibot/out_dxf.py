@@ -3,17 +3,12 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-from pcbnew import PLOT_FORMAT_DXF, SKETCH, FILLED
 from .out_any_layer import AnyLayer
 from .drill_marks import DrillMarks
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
-if GS.kicad_version_n >= KICAD_VERSION_5_99:
-    from pcbnew import DXF_UNITS_MILLIMETERS, DXF_UNITS_INCHES
-else:
-    DXF_UNITS_MILLIMETERS = 1
-    DXF_UNITS_INCHES = 0
 
 
 class DXFOptions(DrillMarks):
@@ -28,22 +23,30 @@ class DXFOptions(DrillMarks):
             """ use mm instead of inches """
             self.sketch_plot = False
             """ don't fill objects, just draw the outline """
-        self._plot_format = PLOT_FORMAT_DXF
 
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
+        if GS.kicad_version_n >= KICAD_VERSION_5_99:
+            DXF_UNITS_MILLIMETERS = pcbnew.DXF_UNITS_MILLIMETERS
+            DXF_UNITS_INCHES = pcbnew.DXF_UNITS_INCHES
+        else:
+            DXF_UNITS_MILLIMETERS = 1
+            DXF_UNITS_INCHES = 0
+        self._plot_format = pcbnew.PLOT_FORMAT_DXF
         super()._configure_plot_ctrl(po, output_dir)
         po.SetDXFPlotPolygonMode(self.polygon_mode)
         # DXF_PLOTTER::DXF_UNITS isn't available
         # According to https://docs.kicad-pcb.org/doxygen/classDXF__PLOTTER.html 1 is mm
         po.SetDXFPlotUnits(DXF_UNITS_MILLIMETERS if self.metric_units else DXF_UNITS_INCHES)
-        po.SetPlotMode(SKETCH if self.sketch_plot else FILLED)
+        po.SetPlotMode(pcbnew.SKETCH if self.sketch_plot else pcbnew.FILLED)
         po.SetUseAuxOrigin(self.use_aux_axis_as_origin)
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
         self.polygon_mode = po.GetDXFPlotPolygonMode()
         self.metric_units = po.GetDXFPlotUnits() == 1
-        self.sketch_plot = po.GetPlotMode() == SKETCH
+        self.sketch_plot = po.GetPlotMode() == pcbnew.SKETCH
         self.use_aux_axis_as_origin = po.GetUseAuxOrigin()
 
 
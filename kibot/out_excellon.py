@@ -3,8 +3,8 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-from pcbnew import EXCELLON_WRITER
 from .out_any_drill import AnyDrill
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 
 
@@ -22,9 +22,10 @@ class ExcellonOptions(AnyDrill):
             """ invert the Y axis """
 
     def _configure_writer(self, board, offset):
-        drill_writer = EXCELLON_WRITER(board)
+        pcbnew = load_pcbnew()
+        drill_writer = pcbnew.EXCELLON_WRITER(board)
         drill_writer.SetOptions(self.mirror_y_axis, self.minimal_header, offset, self.pth_and_npth_single_file)
-        drill_writer.SetFormat(self.metric_units, EXCELLON_WRITER.DECIMAL_FORMAT)
+        drill_writer.SetFormat(self.metric_units, pcbnew.EXCELLON_WRITER.DECIMAL_FORMAT)
         self._unified_output = self.pth_and_npth_single_file
         return drill_writer, 'drl'
 
@@ -3,8 +3,8 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-from pcbnew import GERBER_WRITER
 from .out_any_drill import AnyDrill
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 
 
@@ -13,7 +13,8 @@ class Gerb_DrillOptions(AnyDrill):
         super().__init__()
 
     def _configure_writer(self, board, offset):
-        drill_writer = GERBER_WRITER(board)
+        pcbnew = load_pcbnew()
+        drill_writer = pcbnew.GERBER_WRITER(board)
         # hard coded in UI?
         drill_writer.SetFormat(5)
         drill_writer.SetOptions(offset)
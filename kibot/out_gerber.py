@@ -5,11 +5,11 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 # Adapted from: https://github.com/johnbeard/kiplot
-from pcbnew import (PLOT_FORMAT_GERBER, FromMM, ToMM)
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
 from .out_any_layer import (AnyLayer, AnyLayerOptions)
 from .error import KiPlotConfigurationError
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 
 
@@ -38,7 +38,6 @@ class GerberOptions(AnyLayerOptions):
             self.disable_aperture_macros = False
             """ disable aperture macros (workaround for buggy CAM software) (KiCad 6) """
         super().__init__()
-        self._plot_format = PLOT_FORMAT_GERBER
 
     @property
     def gerber_precision(self):
@@ -51,6 +50,8 @@ class GerberOptions(AnyLayerOptions):
         self._gerber_precision = val
 
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
+        self._plot_format = pcbnew.PLOT_FORMAT_GERBER
         super()._configure_plot_ctrl(po, output_dir)
         po.SetSubtractMaskFromSilk(self.subtract_mask_from_silk)
         po.SetUseGerberProtelExtensions(self.use_protel_extensions)
@@ -60,12 +61,13 @@ class GerberOptions(AnyLayerOptions):
         po.SetIncludeGerberNetlistInfo(self.use_gerber_net_attributes)
         po.SetUseAuxOrigin(self.use_aux_axis_as_origin)
         if GS.kicad_version_n < KICAD_VERSION_5_99:
-            po.SetLineWidth(FromMM(self.line_width))
+            po.SetLineWidth(pcbnew.FromMM(self.line_width))
         else:
             po.SetDisableGerberMacros(self.disable_aperture_macros)
         setattr(po, 'gerber_job_file', self.gerber_job_file)
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
         # usegerberattributes
         self.use_gerber_x2_attributes = po.GetUseGerberX2format()
@@ -83,7 +85,7 @@ class GerberOptions(AnyLayerOptions):
         self.use_aux_axis_as_origin = po.GetUseAuxOrigin()
         if GS.kicad_version_n < KICAD_VERSION_5_99:
             # linewidth
-            self.line_width = ToMM(po.GetLineWidth())
+            self.line_width = pcbnew.ToMM(po.GetLineWidth())
         else:
             # disableapertmacros
             self.disable_aperture_macros = po.GetDisableGerberMacros()
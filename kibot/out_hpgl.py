@@ -3,10 +3,10 @@
 # Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
-from pcbnew import PLOT_FORMAT_HPGL, SKETCH, FILLED
 from .misc import AUTO_SCALE
 from .out_any_layer import AnyLayer
 from .drill_marks import DrillMarks
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 
 
@@ -26,14 +26,15 @@ class HPGLOptions(DrillMarks):
             """ [1,99] pen speed """
             self.pen_width = 15
             """ [0,100] pen diameter in MILS, useful to fill areas. However, it is in mm in HPGL files """
-        self._plot_format = PLOT_FORMAT_HPGL
 
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
+        self._plot_format = pcbnew.PLOT_FORMAT_HPGL
         super()._configure_plot_ctrl(po, output_dir)
         po.SetHPGLPenDiameter(self.pen_width)
         po.SetHPGLPenNum(self.pen_number)
         po.SetHPGLPenSpeed(self.pen_speed)
-        po.SetPlotMode(SKETCH if self.sketch_plot else FILLED)
+        po.SetPlotMode(pcbnew.SKETCH if self.sketch_plot else pcbnew.FILLED)
         po.SetMirror(self.mirror_plot)
         # Scaling/Autoscale
         if self.scaling == AUTO_SCALE:
@@ -44,11 +45,12 @@ class HPGLOptions(DrillMarks):
             po.SetScale(self.scaling)
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
         self.pen_width = po.GetHPGLPenDiameter()
         self.pen_number = po.GetHPGLPenNum()
         self.pen_speed = po.GetHPGLPenSpeed()
-        self.sketch_plot = po.GetPlotMode() == SKETCH
+        self.sketch_plot = po.GetPlotMode() == pcbnew.SKETCH
         self.mirror_plot = po.GetMirror()
         # scaleselection
         sel = po.GetScaleSelection()
@@ -1,8 +1,8 @@
 import os
-from subprocess import (check_output, STDOUT, CalledProcessError)
+from subprocess import (STDOUT, CalledProcessError)
 from .misc import (CMD_IBOM, URL_IBOM, BOM_ERROR)
 from .gs import (GS)
-from .kiplot import check_script
+from .kiplot import check_script, check_output
 from .out_base import VariantOptions
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
@@ -140,3 +140,16 @@ class IBoM(BaseOutput):  # noqa: F821
         with document:
             self.options = IBoMOptions
             """ [dict] Options for the `ibom` output """
+
+    def get_dependencies(self):
+        files = super().get_dependencies()
+        if self.options.netlist_file:
+            files.append(os.path.abspath(self.options.netlist_file))
+        elif GS.pcb_file:
+            # IBoM looks for the netlist or the XML using the name of the PCB
+            files.append(GS.pcb_no_ext+'.xml')
+            files.append(GS.pcb_no_ext+'.net')
+        if GS.pcb_file:
+            # Local IBoM configuration
+            files.append(os.path.join(GS.pcb_dir, 'ibom.config.ini'))
+        return files
@@ -6,9 +6,9 @@
 import os
 from re import search
 from tempfile import NamedTemporaryFile
-from subprocess import (check_output, STDOUT, CalledProcessError)
+from subprocess import (STDOUT, CalledProcessError)
 from .misc import (CMD_KIBOM, URL_KIBOM, BOM_ERROR)
-from .kiplot import (check_script)
+from .kiplot import (check_script, check_output)
 from .gs import (GS)
 from .optionable import Optionable, BaseOptions
 from .error import KiPlotConfigurationError
@@ -405,3 +405,9 @@ class KiBoM(BaseOutput):  # noqa: F821
             self.options = KiBoMOptions
             """ [dict] Options for the `kibom` output """
         self._sch_related = True
+
+    def get_dependencies(self):
+        files = super().get_dependencies()
+        files.append(GS.sch_no_ext+'.xml')
+        files.append(os.path.join(GS.sch_dir, self.options.conf))
+        return files
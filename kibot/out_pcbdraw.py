@@ -10,7 +10,7 @@ from tempfile import (NamedTemporaryFile)
 import subprocess
 import shutil
 from .misc import PCBDRAW, PCBDRAW_ERR, URL_PCBDRAW, W_AMBLIST, W_UNRETOOL, W_USESVG2, W_USEIMAGICK
-from .kiplot import check_script
+from .kiplot import check_script, check_output
 from .error import KiPlotConfigurationError
 from .gs import (GS)
 from .optionable import Optionable
@@ -91,7 +91,7 @@ def _get_tmp_name(ext):
 def _run_command(cmd, tmp_remap=False, tmp_style=False):
     logger.debug('Executing: '+str(cmd))
     try:
-        cmd_output = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+        cmd_output = check_output(cmd, stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
         logger.error('Failed to run %s, error %d', cmd[0], e.returncode)
         if e.output:
@@ -5,11 +5,11 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 # Adapted from: https://github.com/johnbeard/kiplot
-from pcbnew import (PLOT_FORMAT_PDF, FromMM, ToMM)
 from .out_any_layer import AnyLayer
 from .drill_marks import DrillMarks
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
@@ -26,20 +26,22 @@ class PDFOptions(DrillMarks):
             """ plot mirrored """
             self.negative_plot = False
             """ invert black and white """
-        self._plot_format = PLOT_FORMAT_PDF
 
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
+        self._plot_format = pcbnew.PLOT_FORMAT_PDF
         super()._configure_plot_ctrl(po, output_dir)
         po.SetMirror(self.mirror_plot)
         if GS.kicad_version_n < KICAD_VERSION_5_99:
-            po.SetLineWidth(FromMM(self.line_width))
+            po.SetLineWidth(pcbnew.FromMM(self.line_width))
         po.SetNegative(self.negative_plot)
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
         self.mirror_plot = po.GetMirror()
         if GS.kicad_version_n < KICAD_VERSION_5_99:
-            self.line_width = ToMM(po.GetLineWidth())
+            self.line_width = pcbnew.ToMM(po.GetLineWidth())
         self.negative_plot = po.GetNegative()
 
 
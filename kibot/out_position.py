@@ -7,13 +7,13 @@
 # Adapted from: https://github.com/johnbeard/kiplot/pull/10
 import operator
 from datetime import datetime
-from pcbnew import IU_PER_MM, IU_PER_MILS
 from collections import OrderedDict
 from .gs import GS
 from .misc import UI_SMD, UI_VIRTUAL, KICAD_VERSION_5_99, MOD_THROUGH_HOLE, MOD_SMD, MOD_EXCLUDE_FROM_POS_FILES
 from .optionable import Optionable
 from .out_base import VariantOptions
 from .error import KiPlotConfigurationError
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
@@ -180,14 +180,15 @@ class PositionOptions(VariantOptions):
         return not (m.GetAttributes() & MOD_EXCLUDE_FROM_POS_FILES)
 
     def run(self, output_dir, board):
+        pcbnew = load_pcbnew()
         super().run(output_dir, board)
         columns = self.columns.values()
         # Note: the parser already checked the units are milimeters or inches
         conv = 1.0
         if self.units == 'millimeters':
-            conv = 1.0 / IU_PER_MM
+            conv = 1.0 / pcbnew.IU_PER_MM
         else:  # self.units == 'inches':
-            conv = 0.001 / IU_PER_MILS
+            conv = 0.001 / pcbnew.IU_PER_MILS
         # Format all strings
         comps_hash = self.get_refs_hash()
         modules = []
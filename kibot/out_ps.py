@@ -5,12 +5,12 @@
 # License: GPL-3.0
 # Project: KiBot (formerly KiPlot)
 # Adapted from: https://github.com/johnbeard/kiplot
-from pcbnew import PLOT_FORMAT_POST, FromMM, ToMM, SKETCH, FILLED
 from .misc import AUTO_SCALE
 from .out_any_layer import AnyLayer
 from .drill_marks import DrillMarks
 from .gs import GS
 from .misc import KICAD_VERSION_5_99
+from .kiplot import load_pcbnew
 from .macros import macros, document, output_class  # noqa: F401
 
 
@@ -37,17 +37,18 @@ class PSOptions(DrillMarks):
                 Only used to plot pads and tracks """
             self.a4_output = True
             """ force A4 paper size """
-        self._plot_format = PLOT_FORMAT_POST
 
     def _configure_plot_ctrl(self, po, output_dir):
+        pcbnew = load_pcbnew()
+        self._plot_format = pcbnew.PLOT_FORMAT_POST
         super()._configure_plot_ctrl(po, output_dir)
         po.SetWidthAdjust(self.width_adjust)
         po.SetFineScaleAdjustX(self.scale_adjust_x)
         po.SetFineScaleAdjustX(self.scale_adjust_y)
         po.SetA4Output(self.a4_output)
-        po.SetPlotMode(SKETCH if self.sketch_plot else FILLED)
+        po.SetPlotMode(pcbnew.SKETCH if self.sketch_plot else pcbnew.FILLED)
         if GS.kicad_version_n < KICAD_VERSION_5_99:
-            po.SetLineWidth(FromMM(self.line_width))
+            po.SetLineWidth(pcbnew.FromMM(self.line_width))
         po.SetNegative(self.negative_plot)
         po.SetMirror(self.mirror_plot)
         # Scaling/Autoscale
@@ -59,14 +60,15 @@ class PSOptions(DrillMarks):
             po.SetScale(self.scaling)
 
     def read_vals_from_po(self, po):
+        pcbnew = load_pcbnew()
         super().read_vals_from_po(po)
         self.width_adjust = po.GetWidthAdjust()
         self.scale_adjust_x = po.GetFineScaleAdjustX()
         self.scale_adjust_y = po.GetFineScaleAdjustX()
         self.a4_output = po.GetA4Output()
-        self.sketch_plot = po.GetPlotMode() == SKETCH
+        self.sketch_plot = po.GetPlotMode() == pcbnew.SKETCH
         if GS.kicad_version_n < KICAD_VERSION_5_99:
-            self.line_width = ToMM(po.GetLineWidth())
+            self.line_width = pcbnew.ToMM(po.GetLineWidth())
         self.negative_plot = po.GetNegative()
         self.mirror_plot = po.GetMirror()
         # scaleselection
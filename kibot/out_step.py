@@ -5,16 +5,19 @@
 # Project: KiBot (formerly KiPlot)
 import re
 import os
-from subprocess import (check_output, STDOUT, CalledProcessError)
+from subprocess import (STDOUT, CalledProcessError)
 from tempfile import NamedTemporaryFile
 from .error import KiPlotConfigurationError
 from .misc import (KICAD2STEP, KICAD2STEP_ERR)
 from .gs import (GS)
+from .kiplot import check_output
+from .kicad.config import KiConf
 from .out_base import VariantOptions
 from .macros import macros, document, output_class  # noqa: F401
 from . import log
 
 logger = log.get_logger(__name__)
+ENV_VAR = re.compile(r'\$\{([^}]+)\}')
 
 
 class STEPOptions(VariantOptions):
@@ -129,3 +132,17 @@ class STEP(BaseOutput):  # noqa: F821
         with document:
             self.options = STEPOptions
             """ [dict] Options for the `step` output """
+
+    def get_dependencies(self):
+        files = super().get_dependencies()
+        if GS.board:
+            # The 3D models, solved like KiCad does: the environment has precedence over kicad_common
+            KiConf.init(GS.pcb_file)
+            env = dict(KiConf.kicad_env)
+            env.update(os.environ)
+            for m in GS.board.GetModules():
+                for model in m.Models():
+                    name = ENV_VAR.sub(lambda v: env.get(v.group(1), v.group(0)), model.m_Filename)
+                    files.append(os.path.join(GS.pcb_dir, name))
+            files.extend(KiConf.get_config_files())
+        return files
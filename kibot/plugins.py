@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Manifest of the plug-ins.
+
+Tells which plug-in file defines each output, preflight, variant and filter type, so we can import only the ones
+used by the configuration. The decorated classes are found using a regular expression, the results are cached in
+XDG_CACHE_HOME (~/.cache/kibot/plugins.json) and validated using the size and modification time of the files.
+"""
+import os
+import re
+import json
+from glob import glob
+from . import log
+
+logger = log.get_logger(__name__)
+MANIFEST_VERSION = 1
+PLUGIN_PATTERNS = ['out_*.py', 'pre_*.py', 'var_*.py', 'fil_*.py']
+# @output_class
+# class Position(BaseOutput):  -> ('output_class', 'Position')
+DECORATED_CLASS = re.compile(r'^@(output_class|pre_class|variant_class|filter_class)\s*\n\s*class\s+(\w+)', re.M)
+
+
+def get_cache_dir():
+    """ The directory for our cached data (XDG_CACHE_HOME/kibot), None if we don't have one """
+    cache = os.environ.get('XDG_CACHE_HOME')
+    if not cache:
+        home = os.environ.get('HOME')
+        if not home:
+            return None
+        cache = os.path.join(home, '.cache')
+    return os.path.join(cache, 'kibot')
+
+
+def get_cache_file():
+    cache = get_cache_dir()
+    return os.path.join(cache, 'plugins.json') if cache else None
+
+
+def _scan(fname):
+    """ Returns a list of (decorator, registered name) """
+    with open(fname, 'rt') as f:
+        return [[kind, name.lower()] for kind, name in DECORATED_CLASS.findall(f.read())]
+
+
+class Manifest(object):
+    def __init__(self):
+        super().__init__()
+        self.file = get_cache_file()
+        self.files = {}
+        self.changed = False
+        if self.file and os.path.isfile(self.file):
+            try:
+                with open(self.file, 'rt') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.files = data.get('files', {})
+            except (OSError, ValueError) as e:
+                logger.debug('Ignoring corrupted plug-ins manifest `{}` ({})'.format(self.file, e))
+
+    def get_types(self, fname):
+        """ The types defined by `fname` (list of [decorator, name]) """
+        st = os.stat(fname)
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = self.files.get(fname)
+        if entry is None or entry[0] != stamp:
+            logger.debug('Scanning plug-in `{}`'.format(fname))
+            entry = self.files[fname] = [stamp, _scan(fname)]
+            self.changed = True
+        return entry[1]
+
+    def get_plugins(self, path):
+        """ A list of (file, types) for the plug-ins found in `path` """
+        lst = []
+        for pattern in PLUGIN_PATTERNS:
+            lst.extend(sorted(glob(os.path.join(path, pattern))))
+        return [(p, self.get_types(p)) for p in lst]
+
+    def save(self):
+        if not self.changed or not self.file:
+            return
+        # Forget about removed files
+        self.files = {k: v for k, v in self.files.items() if os.path.isfile(k)}
+        try:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+            with open(self.file, 'wt') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': self.files}, f, indent=1)
+            self.changed = False
+        except OSError as e:
+            logger.debug('Unable to save the plug-ins manifest `{}` ({})'.format(self.file, e))
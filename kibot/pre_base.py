@@ -6,12 +6,14 @@
 from .gs import GS
 from .registrable import Registrable
 from .log import get_logger
+from . import profiler
 
 logger = get_logger(__name__)
 
 
 class BasePreFlight(Registrable):
     _registered = {}
+    _lazy = {}
     _in_use = {}
     _options = {}
 
@@ -52,11 +54,13 @@ class BasePreFlight(Registrable):
                 if v.is_pcb():
                     GS.check_pcb()
                 logger.debug('Preflight apply '+k)
-                v.apply()
+                with profiler.phase('preflight apply '+k, 'preflight'):
+                    v.apply()
         for k, v in BasePreFlight._in_use.items():
             if v._enabled:
                 logger.debug('Preflight run '+k)
-                v.run()
+                with profiler.phase('preflight run '+k, 'preflight'):
+                    v.run()
 
     def disable(self):
         self._enabled = False
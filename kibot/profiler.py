@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Per-phase profiler (--profile FILE).
+
+Each phase records:
+- Wall time
+- CPU time of the thread (of the child for external tools)
+- Peak RSS of the process (of the child for external tools)
+The usage of each external tool is collected when waiting for it (os.wait4), so it isn't mixed with the usage of the
+tools running at the same time (--jobs).
+- Peak of the memory allocated by Python, only when tracemalloc is tracing (i.e. PYTHONTRACEMALLOC=1)
+
+The FILE is a Chrome trace-event JSON (chrome://tracing, https://ui.perfetto.dev/), the `kibotSummary` key contains
+the totals for each phase. The same totals are printed as a table.
+"""
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Not available on Windows
+    resource = None
+from . import log
+
+logger = log.get_logger(__name__)
+# Python 3.6 doesn't have thread_time
+_thread_time = getattr(time, 'thread_time', time.process_time)
+_T0 = time.perf_counter()
+# Recorded phases, None when we aren't profiling
+_records = None
+# Phases recorded before starting (i.e. during the imports)
+_early = []
+_stack = threading.local()
+
+
+def _rss(who):
+    """ Peak RSS in KiB """
+    if resource is None:
+        return 0
+    return resource.getrusage(who).ru_maxrss
+
+
+def _py_peak():
+    """ Peak of the memory traced by tracemalloc, then starts a new measure """
+    if not tracemalloc.is_tracing():
+        return 0
+    peak = tracemalloc.get_traced_memory()[1]
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    return peak
+
+
+class _Phase(object):
+    def __init__(self, name, cat, child):
+        super().__init__()
+        self.name = name
+        self.cat = cat
+        self.child = child
+        self.tid = threading.get_ident()
+        self.py_peak = 0
+        self.start = time.perf_counter()
+        # For external tools we get the values from `child_usage`
+        self.cpu = 0.0 if child else _thread_time()
+        self.rss = 0
+
+    def _update_py_peak(self):
+        """ Propagates the Python memory peak to the open phases """
+        peak = _py_peak()
+        for p in getattr(_stack, 'phases', []):
+            p.py_peak = max(p.py_peak, peak)
+        self.py_peak = max(self.py_peak, peak)
+
+    def child_usage(self, usage):
+        """ Resources used by the external tool, as returned by os.wait4 """
+        self.cpu += usage.ru_utime+usage.ru_stime
+        self.rss = max(self.rss, usage.ru_maxrss)
+
+    def end(self):
+        self.wall = time.perf_counter()-self.start
+        if not self.child:
+            self.cpu = _thread_time()-self.cpu
+            self.rss = _rss(resource.RUSAGE_SELF) if resource else 0
+        self._update_py_peak()
+        return self
+
+
+def mark(name, cat='import'):
+    """ Starts a phase that will be recorded even when the profiler isn't yet started.
+        Used for the things we do during the imports. Finish it using `done`. """
+    return _Phase(name, cat, False)
+
+
+def done(phase):
+    """ Finishes a phase started using `mark` """
+    phase.end()
+    if _records is None:
+        _early.append(phase)
+    else:
+        _records.append(phase)
+
+
+@contextmanager
+def phase(name, cat='kibot', child=False):
+    """ Records the time and memory used by the enclosed code.
+        Use `child=True` for the time spent waiting for an external tool, report its usage using `child_usage`.
+        Returns the phase, None when we aren't profiling. """
+    if _records is None:
+        yield None
+        return
+    stack = getattr(_stack, 'phases', None)
+    if stack is None:
+        stack = _stack.phases = []
+    p = _Phase(name, cat, child)
+    p._update_py_peak()
+    p.py_peak = 0
+    stack.append(p)
+    try:
+        yield p
+    finally:
+        stack.pop()
+        _records.append(p.end())
+
+
+def start():
+    global _records
+    if _records is None:
+        _records = list(_early)
+        logger.debug('Profiler started')
+
+
+def summary():
+    """ Totals for each phase name, in order of first use """
+    res = {}
+    for p in sorted(_records, key=lambda p: p.start):
+        s = res.get(p.name)
+        if s is None:
+            s = res[p.name] = {'name': p.name, 'cat': p.cat, 'count': 0, 'wall': 0.0, 'cpu': 0.0, 'rss': 0,
+                               'py_peak': 0}
+        s['count'] += 1
+        s['wall'] += p.wall
+        s['cpu'] += p.cpu
+        s['rss'] = max(s['rss'], p.rss)
+        s['py_peak'] = max(s['py_peak'], p.py_peak)
+    return list(res.values())
+
+
+def _trace_events():
+    pid = os.getpid()
+    events = []
+    for p in _records:
+        events.append({'name': p.name, 'cat': p.cat, 'ph': 'X', 'pid': pid, 'tid': p.tid,
+                       'ts': round((p.start-_T0)*1e6, 3), 'dur': round(p.wall*1e6, 3),
+                       'args': {'cpu_ms': round(p.cpu*1e3, 3), 'rss_kb': p.rss, 'py_peak_kb': p.py_peak >> 10}})
+    return events
+
+
+def print_summary(totals):
+    head = '{:<40} {:>5} {:>10} {:>10} {:>10} {:>10}'
+    row = '{:<40} {:>5} {:>10.1f} {:>10.1f} {:>10} {:>10}'
+    lines = [head.format('Phase', 'Count', 'Wall [ms]', 'CPU [ms]', 'RSS [KiB]', 'Py [KiB]')]
+    for s in totals:
+        name = s['name'] if len(s['name']) <= 40 else s['name'][:37]+'...'
+        lines.append(row.format(name, s['count'], s['wall']*1e3, s['cpu']*1e3, s['rss'], s['py_peak'] >> 10))
+    logger.info('Profile:\n'+'\n'.join(lines))
+
+
+def stop(fname):
+    """ Stops the profiler, prints the summary and saves the trace to `fname` """
+    global _records
+    if _records is None:
+        return
+    totals = summary()
+    print_summary(totals)
+    data = {'traceEvents': _trace_events(), 'displayTimeUnit': 'ms', 'kibotSummary': totals}
+    try:
+        with open(fname, 'wt') as f:
+            json.dump(data, f, indent=1)
+    except OSError as e:
+        logger.error('Unable to save the profile to `{}` ({})'.format(fname, e))
+    _records = None
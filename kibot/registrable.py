@@ -8,7 +8,11 @@ from .error import KiPlotConfigurationError
 
 
 class Registrable(object):
-    """ This class adds the mechanism to register plug-ins """
+    """ This class adds the mechanism to register plug-ins.
+        The plug-ins can be registered in advance using `register_lazy`, they are loaded when used. """
+    # Function used to load the module for a lazy plug-in
+    _loader = None
+
     def __init__(self):
         super().__init__()
 
@@ -16,16 +20,35 @@ class Registrable(object):
     def register(cl, name, aclass):
         cl._registered[name] = aclass
 
+    @classmethod
+    def register_lazy(cl, name, module):
+        """ Registers the `module` that defines the `name` plug-in, without loading it """
+        cl._lazy[name] = module
+
+    @staticmethod
+    def set_loader(loader):
+        Registrable._loader = loader
+
+    @classmethod
+    def _solve(cl, name):
+        """ Loads the module for a lazy plug-in """
+        module = cl._lazy.pop(name, None)
+        if module is not None:
+            Registrable._loader(module)
+
     @classmethod
     def is_registered(cl, name):
-        return name in cl._registered
+        return name in cl._registered or name in cl._lazy
 
     @classmethod
     def get_class_for(cl, name):
+        cl._solve(name)
         return cl._registered[name]
 
     @classmethod
     def get_registered(cl):
+        for name in list(cl._lazy.keys()):
+            cl._solve(name)
         return cl._registered
 
     def __str__(self):
@@ -37,6 +60,7 @@ class RegOutput(Optionable, Registrable):
         Used by BaseOutput.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
     # List of defined filters
     _def_filters = {}
     # List of defined variants
@@ -87,6 +111,7 @@ class RegVariant(Optionable, Registrable):
         Used by BaseVariant.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
 
     def __init__(self):
         super().__init__()
@@ -97,6 +122,7 @@ class RegFilter(Optionable, Registrable):
         Used by BaseFilter.
         Here because it doesn't need macros. """
     _registered = {}
+    _lazy = {}
 
     def __init__(self):
         super().__init__()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Persistent cache for the loaded schematics (`--cache-sch`).
+
+The loaded Schematic (sheets, libraries and doc-libs) is pickled to XDG_CACHE_HOME/kibot/sch/, so other runs using the
+same files don't need to parse them.
+The entries are validated using:
+- The hash of the files used (sheets, libraries, doc-libs and KiCad configuration)
+- The files used for the libraries (the libraries table and environment could change)
+- The KiBot and Python versions, and the schematic parser modules
+The warnings found during the load are stored and reported again when the entry is used.
+"""
+import os
+import sys
+import pickle
+from hashlib import sha1
+from .build_cache import hash_file
+from .plugins import get_cache_dir
+from .kicad.config import KiConf
+from .kicad import v5_sch, v6_sch
+from .gs import GS
+from . import log
+
+logger = log.get_logger(__name__)
+CACHE_VERSION = 1
+
+
+def _cache_file(fname):
+    cache = get_cache_dir()
+    if cache is None:
+        return None
+    return os.path.join(cache, 'sch', os.path.basename(fname)+'-'+sha1(fname.encode()).hexdigest()[:16]+'.pickle')
+
+
+def _key():
+    """ Things that affects the format of the cached data """
+    key = [CACHE_VERSION, GS.kibot_version, sys.implementation.cache_tag]
+    for module in (v5_sch, v6_sch):
+        st = os.stat(module.__file__)
+        key.extend((st.st_mtime_ns, st.st_size))
+    return key
+
+
+def _resolved_libs(libs):
+    """ The files used for each library (like Schematic.load_libs) """
+    res = {}
+    for k in libs.keys():
+        alias = KiConf.lib_aliases.get(k)
+        res[k] = alias.uri if k and alias else None
+    return res
+
+
+def _dependencies(sch):
+    """ Files used to load the schematic, even the missing ones """
+    files = sch.get_files()
+    for v in sch.libs.values():
+        if v:
+            files.append(v)
+            files.append(os.path.splitext(v)[0]+'.dcm')
+    return files+KiConf.get_config_files()
+
+
+def load_cached_sch(fname):
+    """ The Schematic loaded from the cache, None if missing or outdated """
+    cache = _cache_file(os.path.abspath(fname))
+    if cache is None or not os.path.isfile(cache):
+        return None
+    try:
+        with open(cache, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('key') != _key():
+                logger.debug('Discarding `{}` (created by another version)'.format(cache))
+                return None
+            KiConf.init(fname)
+            if header['libs'] != _resolved_libs(header['libs']):
+                logger.debug('Discarding `{}` (libraries changed)'.format(cache))
+                return None
+            for name, h in header['files'].items():
+                if hash_file(name) != h:
+                    logger.debug('Discarding `{}` (`{}` changed)'.format(cache, name))
+                    return None
+            with v5_sch.no_gc():
+                sch = pickle.load(f)
+    except (OSError, EOFError, AttributeError, ImportError, IndexError, KeyError, TypeError, pickle.UnpicklingError) as e:
+        logger.debug('Ignoring corrupted cache `{}` ({})'.format(cache, e))
+        return None
+    logger.debug('Using the cached schematic `{}`'.format(cache))
+    # Report the warnings found during the load
+    for w in header['warnings']:
+        logger.warning(w)
+    return sch
+
+
+def start_capture(fname):
+    """ Starts collecting the warnings for the load of this schematic """
+    # The warnings from the KiCad configuration are reported when using the cache, don't collect them
+    KiConf.init(fname)
+    log.MyLogger.captured = []
+
+
+def stop_capture():
+    """ Returns the collected warnings """
+    warnings = log.MyLogger.captured
+    log.MyLogger.captured = None
+    return warnings
+
+
+def save_cached_sch(fname, sch, warnings):
+    cache = _cache_file(os.path.abspath(fname))
+    if cache is None:
+        return
+    header = {'key': _key(),
+              'libs': _resolved_libs(sch.libs),
+              'files': {f: hash_file(f) for f in _dependencies(sch)},
+              'warnings': warnings}
+    tmp = cache+'.'+str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            with v5_sch.no_gc():
+                pickle.dump(sch, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except (OSError, pickle.PicklingError, RecursionError) as e:
+        logger.debug('Unable to cache the schematic `{}` ({})'.format(cache, e))
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
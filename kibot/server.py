@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Server mode.
+
+Listens at a Unix socket and runs the jobs submitted by `kibot-client`.
+The plug-ins are loaded only once, the boards and schematics are kept in memory (LRU).
+The jobs are processed one at a time, using the same process.
+
+Protocol: one JSON object per line.
+- The client sends: {"args": [command line arguments], "cwd": "working directory"}
+- The server answers with any number of {"out": text} and {"err": text}, ending with {"exit": code}
+"""
+import os
+import sys
+import json
+import stat
+import signal
+import socket
+import threading
+import traceback
+from contextlib import redirect_stdout
+from .misc import INTERNAL_ERROR, SERVER_ERROR, W_BADREQUEST
+from . import kiplot
+from . import log
+
+logger = log.get_logger(__name__)
+# Number of boards and schematics to keep in memory
+CACHE_SIZE = 8
+
+
+class _ClientStream(object):
+    """ File-like object used to send stdout/stderr to the client """
+    def __init__(self, conn, kind, lock):
+        super().__init__()
+        self.conn = conn
+        self.kind = kind
+        self.lock = lock
+        self.closed = False
+
+    def write(self, text):
+        if not text:
+            return 0
+        data = (json.dumps({self.kind: text})+'\n').encode()
+        with self.lock:
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                # The client went away, keep working, so we leave the state in a known situation
+                pass
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def _exit_code(e):
+    """ Mimics the exit code Python uses for SystemExit """
+    if e.code is None:
+        return 0, None
+    if isinstance(e.code, int):
+        return e.code, None
+    return INTERNAL_ERROR, str(e.code)
+
+
+def _run_job(conn, request, run_job):
+    lock = threading.Lock()
+    out = _ClientStream(conn, 'out', lock)
+    err = _ClientStream(conn, 'err', lock)
+    root = log.get_logger()
+    handlers = [h for h in root.handlers if hasattr(h, 'stream')]
+    old_streams = [h.stream for h in handlers]
+    old_level = root.level
+    old_cwd = os.getcwd()
+    code = 0
+    try:
+        for h in handlers:
+            h.stream = err
+        os.chdir(request.get('cwd', old_cwd))
+        kiplot.reset_state()
+        with redirect_stdout(out):
+            run_job(request.get('args', []))
+    except SystemExit as e:
+        code, msg = _exit_code(e)
+        if msg:
+            err.write(msg+'\n')
+    except KeyboardInterrupt:
+        raise
+    except BaseException:
+        err.write(traceback.format_exc())
+        code = INTERNAL_ERROR
+    finally:
+        for h, s in zip(handlers, old_streams):
+            h.stream = s
+        root.setLevel(old_level)
+        os.chdir(old_cwd)
+    return code
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(name, run_job):
+    """ Runs the server at the `name` Unix socket.
+        `run_job` is called with the command line arguments for each job. """
+    kiplot.board_cache = kiplot.FileCache(CACHE_SIZE)
+    kiplot.sch_cache = kiplot.FileCache(CACHE_SIZE)
+    if os.path.exists(name):
+        if not stat.S_ISSOCK(os.stat(name).st_mode):
+            logger.error('`{}` exists and is not a socket'.format(name))
+            sys.exit(SERVER_ERROR)
+        # Most probably a dead server
+        os.remove(name)
+    try:
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(name)
+        server.listen(5)
+    except OSError as e:
+        logger.error('Unable to listen at `{}`: {}'.format(name, e))
+        sys.exit(SERVER_ERROR)
+    logger.info('Listening at `{}`'.format(name))
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    with conn.makefile('rb') as f:
+                        request = json.loads(f.readline().decode())
+                except (OSError, ValueError) as e:
+                    logger.warning(W_BADREQUEST + 'Malformed request ({})'.format(e))
+                    continue
+                logger.debug('Job: '+str(request))
+                code = _run_job(conn, request, run_job)
+                logger.debug('Job finished with exit code {}'.format(code))
+                try:
+                    conn.sendall((json.dumps({'exit': code})+'\n').encode())
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        logger.info('Stopping the server')
+    finally:
+        server.close()
+        os.remove(name)
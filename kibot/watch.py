@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Watch mode.
+
+Polls the files used by the outputs (PCB, sheets, libraries, etc.) and the configuration.
+When something changes we generate the outputs that depends on the changed files.
+The PCB and schematic are kept in memory between iterations (see kiplot.FileCache).
+"""
+import os
+import time
+from .gs import GS
+from . import log
+
+logger = log.get_logger(__name__)
+# Time between checks (seconds)
+POLL_TIME = 0.5
+
+
+def _stamp(files):
+    res = {}
+    for f in files:
+        try:
+            st = os.stat(f)
+            res[f] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            res[f] = None
+    return res
+
+
+def _wait_changes(old):
+    """ Waits until some of the files changes, returns the changed files """
+    while True:
+        time.sleep(POLL_TIME)
+        new = _stamp(old.keys())
+        if new != old:
+            break
+    # Wait until the files are stable, editors could need more than one write
+    while True:
+        time.sleep(POLL_TIME)
+        newer = _stamp(old.keys())
+        if newer == new:
+            break
+        new = newer
+    return {f for f, v in new.items() if old[f] != v}
+
+
+def watch(config_file, outputs, run):
+    """ Generates the outputs again when their inputs change.
+        `outputs` is the list of outputs generated by the first run.
+        `run(names, sch_changed, pcb_changed)` generates the named outputs (None for all) and returns them. """
+    deps = {}
+    try:
+        while True:
+            for out in outputs:
+                deps[out.name] = set(out.get_dependencies())
+            files = set([config_file]).union(*deps.values())
+            logger.info('Watching {} files for changes (Ctrl+C to stop)'.format(len(files)))
+            changed = _wait_changes(_stamp(files))
+            logger.info('Changed: '+', '.join(sorted(os.path.basename(f) for f in changed)))
+            if config_file in changed:
+                outputs = run(None, True, True)
+                # The outputs could be different, forget the old ones
+                deps = {}
+                continue
+            names = [name for name, files in deps.items() if files & changed]
+            if names:
+                pcb_changed = GS.pcb_file in changed
+                sch_changed = len(changed) > 1 or not pcb_changed
+                outputs = run(names, sch_changed, pcb_changed)
+            else:
+                outputs = []
+    except KeyboardInterrupt:
+        logger.info('Stopping')
@@ -19,7 +19,7 @@ setup(name='kibot',
       url=__url__,
       # Packages are marked using __init__.py
       packages=find_packages(),
-      scripts=['src/kibot', 'src/kiplot'],
+      scripts=['src/kibot', 'src/kiplot', 'src/kibot-client'],
       install_requires=['kiauto', 'pyyaml', 'xlsxwriter', 'colorama'],
       classifiers=['Development Status :: 5 - Production/Stable',
                    'Environment :: Console',
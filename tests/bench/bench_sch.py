@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Schematic and BoM benchmark.
+
+Generates a synthetic project (see gen_sch.py) and measures:
+- sch_load: Schematic.load
+- load_libs: Schematic.load_libs
+- get_components: Schematic.get_components
+- bom_config: configuration of the BoM outputs (one for each format)
+- filters_variants: the BoM filters and the KiBoM variant
+- group_components: BoM grouping
+- render_table: the cells of the BoM (BoMTable), shared by all the writers
+- write_FORMAT: each BoM writer
+- run_boms: the BoM outputs, as KiBot runs them (filters, variant, grouping and writers)
+- memory: memory used by the loaded schematic (current and peak, measured using tracemalloc)
+
+Each stage is repeated `--repeat` times, the results are stored as JSON (`--output`).
+Use `--compare OLD.json` to compare against a previous run (i.e. from another commit).
+The exit code is 1 if any stage is slower than `--threshold` percent.
+
+Examples:
+  tests/bench/bench_sch.py -o before.json
+  git checkout my_branch
+  tests/bench/bench_sch.py --compare before.json -o after.json
+
+To measure the parser using one big (10 MB) sheet:
+  tests/bench/bench_sch.py --sheets 1 --unique 1 --components 30000 --no-bom
+
+To compare the KiCad 6 parser against the KiCad 5 one (same design):
+  tests/bench/bench_sch.py --no-bom -o v5.json
+  tests/bench/bench_sch.py --no-bom --kicad6 --compare v5.json
+
+To check how the BoM grouping scales (the group_components time should be proportional to the components):
+  for n in 5000 10000 20000; do tests/bench/bench_sch.py --components $n --no-memory --formats csv; done
+"""
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+prev_dir = os.path.dirname(os.path.dirname(bench_dir))
+if prev_dir not in sys.path:
+    sys.path.insert(0, prev_dir)
+sys.path.insert(0, bench_dir)
+from gen_sch import add_arguments, create_generator
+from kibot.gs import GS
+from kibot.kicad.config import KiConf
+from kibot.kicad.v5_sch import Schematic
+from kibot.kicad.v6_sch import SchematicV6
+from kibot import log
+
+RESULTS_VERSION = 1
+FORMATS = ['csv', 'html', 'xml', 'xlsx']
+CONFIG = """
+kibot:
+  version: 1
+
+variants:
+  - name: 'bench'
+    comment: 'Benchmark variant'
+    type: kibom
+    variant: production
+
+outputs:
+"""
+BOM_OUTPUT = """
+  - name: 'bom_{0}'
+    type: bom
+    options:
+      format: {1}
+      variant: bench
+      group_fields: ['Part', 'Part Lib', 'Value', 'Footprint', 'Footprint Lib', 'manf#']
+"""
+
+
+class Bench(object):
+    def __init__(self, repeat):
+        super().__init__()
+        self.repeat = max(repeat, 1)
+        self.results = {}
+
+    def measure(self, name, func, *args):
+        """ Runs `func` `repeat` times, returns the result of the last call """
+        runs = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            res = func(*args)
+            runs.append(time.perf_counter()-start)
+        self.results[name] = {'min': min(runs), 'mean': sum(runs)/len(runs), 'runs': runs}
+        print('{:<20} {:>10.1f} ms'.format(name, min(runs)*1e3))
+        return res
+
+
+def load_sch(fname):
+    sch = SchematicV6() if fname.endswith('.kicad_sch') else Schematic()
+    # Don't use the default containers, they are shared by all the calls
+    sch.load(fname, libs={}, fields=[], fields_lc=set())
+    return sch
+
+
+def load_libs(sch, fname):
+    KiConf.reset()
+    sch.dcms = {}
+    sch.lib_comps = {}
+    sch.load_libs(fname)
+
+
+def measure_memory(fname):
+    """ Memory allocated by the loaded schematic and the peak during the load, in KiB """
+    gc.collect()
+    tracemalloc.start()
+    sch = load_sch(fname)
+    load_libs(sch, fname)
+    sch.get_components()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sch
+    res = {'sch_kb': current//1024, 'sch_peak_kb': peak//1024}
+    print('{:<20} {:>10} KiB (peak {} KiB)'.format('memory', res['sch_kb'], res['sch_peak_kb']))
+    return res
+
+
+def bench_sch(b, fname):
+    sch = b.measure('sch_load', load_sch, fname)
+    b.measure('load_libs', load_libs, sch, fname)
+    comps = b.measure('get_components', sch.get_components)
+    return sch, comps
+
+
+def config_boms(fname, sch, formats, out_dir):
+    from kibot.kiplot import load_actions, reset_state
+    from kibot.config_reader import CfgYamlReader
+    reset_state()
+    load_actions()
+    GS.set_sch(fname)
+    GS.sch = sch
+    GS.out_dir = out_dir
+    GS.load_sch_title_block()
+    cfg = CONFIG+''.join([BOM_OUTPUT.format(f, f.upper()) for f in formats])
+    outputs = CfgYamlReader().read(cfg)
+    for o in outputs:
+        o.config()
+    return [o.options for o in outputs]
+
+
+def filter_comps(sch, options):
+    from kibot.fil_base import apply_exclude_filter, apply_fitted_filter, apply_fixed_filter, reset_filters
+    comps = sch.get_components()
+    reset_filters(comps)
+    apply_exclude_filter(comps, options.exclude_filter)
+    apply_fitted_filter(comps, options.dnf_filter)
+    apply_fixed_filter(comps, options.dnc_filter)
+    options.variant.filter(comps)
+    return comps
+
+
+def run_boms(options, out_dir):
+    """ Runs the BoM outputs, the groups from a previous call are discarded """
+    from kibot.bom import bom
+    bom.groups_cache.clear()
+    for o in options:
+        o.run(out_dir, None)
+
+
+def bench_bom(b, fname, sch, formats, out_dir):
+    from kibot.bom.bom import group_components
+    from kibot.bom.bom_writer import write_bom
+    from kibot.bom.table import BoMTable
+    options = b.measure('bom_config', config_boms, fname, sch, formats, out_dir)
+    comps = b.measure('filters_variants', filter_comps, sch, options[0])
+    groups = b.measure('group_components', group_components, options[0], comps)
+    headings = tuple(h.lower() for h in options[0].columns)
+    table = b.measure('render_table', BoMTable, groups, headings, options[0])
+    for fmt, o in zip(formats, options):
+        # Same information run() adds
+        o.source = GS.sch_basename
+        o.date = GS.sch_date
+        o.revision = GS.sch_rev
+        o.debug_level = GS.debug_level
+        o.kicad_version = GS.kicad_version
+        # The stats are computed during the grouping
+        o.n_groups = options[0].n_groups
+        o.n_total = options[0].n_total
+        o.n_fitted = options[0].n_fitted
+        o.n_build = options[0].n_build
+        out = os.path.join(out_dir, 'bench-bom.'+fmt)
+        b.measure('write_'+fmt, write_bom, out, fmt, table, o.columns, o)
+    b.measure('run_boms', run_boms, options, out_dir)
+    return len(comps), len(groups)
+
+
+def git_commit():
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=prev_dir, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, universal_newlines=True)
+        return res.stdout.strip() if res.returncode == 0 else None
+    except OSError:
+        return None
+
+
+def compare(old_file, results, memory, threshold):
+    """ Prints a comparison table, returns True if we found a regression """
+    with open(old_file, 'rt') as f:
+        old = json.load(f)
+    old_res = old['results']
+    print('\nComparison against {} (commit {}):'.format(old_file, old.get('commit')))
+    print('{:<20} {:>12} {:>12} {:>8}'.format('Stage', 'Old [ms]', 'New [ms]', 'Ratio'))
+    regression = False
+    for name, r in results.items():
+        o = old_res.get(name)
+        if o is None:
+            print('{:<20} {:>12} {:>12.1f}'.format(name, '-', r['min']*1e3))
+            continue
+        ratio = r['min']/o['min'] if o['min'] else float('inf')
+        mark = ''
+        if ratio > 1+threshold/100:
+            mark = ' <--'
+            regression = True
+        print('{:<20} {:>12.1f} {:>12.1f} {:>8.2f}{}'.format(name, o['min']*1e3, r['min']*1e3, ratio, mark))
+    old_mem = old.get('memory')
+    if memory and old_mem:
+        print('{:<20} {:>12} {:>12} {:>8}'.format('Memory', 'Old [KiB]', 'New [KiB]', 'Ratio'))
+        for name, v in memory.items():
+            o = old_mem.get(name)
+            if o:
+                print('{:<20} {:>12} {:>12} {:>8.2f}'.format(name, o, v, v/o))
+    return regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description='KiBot schematic and BoM benchmark')
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs for each stage, the best is used [%(default)s]')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='BoM formats to measure [%(default)s]')
+    parser.add_argument('--no-bom', action='store_true', help='Measure only the schematic stages')
+    parser.add_argument('--no-memory', action='store_true', help="Don't measure the memory used by the schematic")
+    parser.add_argument('--dir', help='Directory for the generated project (kept), default is a temporal one')
+    parser.add_argument('-o', '--output', help='JSON file for the results')
+    parser.add_argument('--compare', metavar='OLD', help='JSON file from a previous run')
+    parser.add_argument('--threshold', type=float, default=10, help='Regression threshold in percent [%(default)s]')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show the KiBot messages')
+    args = parser.parse_args()
+
+    logger = log.init()
+    # The synthetic design generates some warnings (i.e. field conflicts)
+    logger.setLevel(logging.DEBUG if args.verbose else logging.ERROR)
+    dest = args.dir or tempfile.mkdtemp(prefix='kibot_bench_')
+    try:
+        gen = create_generator(args)
+        start = time.perf_counter()
+        fname = gen.generate(dest)
+        print('Generated `{}` in {:.1f} s'.format(fname, time.perf_counter()-start))
+        b = Bench(args.repeat)
+        sch, comps = bench_sch(b, fname)
+        memory = None if args.no_memory else measure_memory(fname)
+        design = gen.get_stats()
+        design['loaded_components'] = len(comps)
+        design['files_size'] = sum(os.path.getsize(f) for f in sch.get_files()+sch.get_lib_files())
+        if not args.no_bom:
+            formats = [f.strip().lower() for f in args.formats.split(',') if f.strip()]
+            design['bom_components'], design['bom_groups'] = bench_bom(b, fname, sch, formats, dest)
+    finally:
+        if not args.dir:
+            shutil.rmtree(dest, ignore_errors=True)
+    if resource is not None:
+        design['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    data = {'version': RESULTS_VERSION,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'repeat': b.repeat,
+            'design': design,
+            'results': b.results}
+    if memory is not None:
+        data['memory'] = memory
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump(data, f, indent=1)
+    if args.compare and compare(args.compare, b.results, memory, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Salvador E. Tropea
+# Copyright (c) 2020 Instituto Nacional de Tecnología Industrial
+# License: GPL-3.0
+# Project: KiBot (formerly KiPlot)
+"""
+Synthetic KiCad v5 (or v6) project generator.
+
+Creates a hierarchical schematic of the requested size, used to measure how the schematic and BoM code scales:
+- A top sheet with `sheets` sub-sheets.
+- The sub-sheets are instances of `unique` files, so most files are used more than once (AR references).
+- `components` component instances, a mix of R, C, L, D, J and U. Some of them have DNF/DNC or KiBoM variants in the
+  `Config` field. Power symbols are added too.
+- `libs` symbol libraries with `symbols` entries each (most of them unused), and their doc-libs (.dcm).
+- A project sym-lib-table for all the libraries.
+
+The output is deterministic for a given set of parameters (`seed`).
+Using `--kicad6` the same design is created using the KiCad 6 format, the used symbols are embedded in the schematics
+and the AR references are replaced by the `symbol_instances` of the top sheet.
+
+Usage: gen_sch.py [--sheets N] [--unique N] [--components N] [--libs N] [--symbols N] [--seed N] [--kicad6] DEST_DIR
+"""
+import io
+import os
+import zlib
+import random
+import argparse
+
+NAME = 'bench'
+# Kind of component: (prefix, weight)
+KINDS = [('R', 40), ('C', 30), ('L', 5), ('D', 5), ('J', 5), ('U', 15)]
+E12 = ['1', '1.2', '1.5', '1.8', '2.2', '2.7', '3.3', '3.9', '4.7', '5.6', '6.8', '8.2']
+VALUES = {'R': (['', 'k', 'K', 'M'], ['', 'R']),
+          'C': (['p', 'n', 'u'], ['F', '']),
+          'L': (['n', 'u', 'm'], ['H', ''])}
+FOOTPRINTS = {'R': ['Resistor_SMD:R_0402_1005Metric', 'Resistor_SMD:R_0603_1608Metric', 'Resistor_SMD:R_0805_2012Metric'],
+              'C': ['Capacitor_SMD:C_0402_1005Metric', 'Capacitor_SMD:C_0603_1608Metric', 'Capacitor_SMD:C_1206_3216Metric'],
+              'L': ['Inductor_SMD:L_0805_2012Metric', 'Inductor_SMD:L_1210_3225Metric'],
+              'D': ['Diode_SMD:D_SOD-123', 'Diode_SMD:D_SMA'],
+              'J': ['Connector_PinHeader_2.54mm:PinHeader_1x02_P2.54mm_Vertical',
+                    'Connector_PinHeader_2.54mm:PinHeader_2x05_P2.54mm_Vertical'],
+              'U': ['Package_SO:SOIC-8_3.9x4.9mm_P1.27mm', 'Package_QFP:LQFP-64_10x10mm_P0.5mm',
+                    'Package_DFN_QFN:QFN-32-1EP_5x5mm_P0.5mm']}
+CONFIGS = ['DNF', 'DNC', '-production', '+test', 'production,-test']
+GENERIC = {'R': 'R', 'C': 'C', 'L': 'L', 'D': 'D', 'J': 'Conn'}
+POWER = ['GND', 'VCC', '+3V3', '+5V']
+
+
+class Generator(object):
+    ext = '.sch'
+
+    def __init__(self, sheets=50, unique=10, components=20000, libs=4, symbols=2000, seed=1):
+        super().__init__()
+        self.sheets = max(sheets, 1)
+        self.unique = min(max(unique, 1), self.sheets)
+        self.per_sheet = max(-(-components // self.sheets), 1)
+        self.libs = max(libs, 1)
+        self.symbols = max(symbols, len(GENERIC)+1)
+        self.rnd = random.Random(seed)
+        self.next_id = 0x5F000000
+        self.refs = {}
+        self.weights = []
+        for prefix, w in KINDS:
+            self.weights.extend([prefix]*w)
+
+    def new_id(self):
+        self.next_id += 1
+        return '{:08X}'.format(self.next_id)
+
+    def new_ref(self, prefix):
+        n = self.refs.get(prefix, 0)+1
+        self.refs[prefix] = n
+        return prefix+str(n)
+
+    def lib_name(self, n):
+        return 'bench_lib{}'.format(n)
+
+    def symbol_names(self):
+        """ Names for the symbols in a library (name, ref prefix) """
+        names = [(name, prefix) for prefix, name in GENERIC.items()]
+        names.extend([('IC_{:05d}'.format(n), 'U') for n in range(self.symbols-len(names))])
+        return names
+
+    def value(self, prefix, name):
+        if prefix in VALUES:
+            mults, units = VALUES[prefix]
+            val = self.rnd.choice(E12)
+            mult = self.rnd.choice(mults)
+            if mult and '.' in val and self.rnd.random() < 0.5:
+                # 4k7 style
+                return val.replace('.', mult)
+            return val+mult+self.rnd.choice(units)
+        if prefix == 'D':
+            return self.rnd.choice(['1N4148', 'BAT54', 'LED', 'SMBJ5.0A'])
+        if prefix == 'J':
+            return self.rnd.choice(['Power', 'Debug', 'UART', 'Conn_01x02'])
+        return name
+
+    # -----------------------
+    # Libraries
+    # -----------------------
+
+    @staticmethod
+    def write_symbol(f, name, prefix, power=False):
+        f.write('#\n# {}\n#\n'.format(name))
+        ref = '#PWR' if power else prefix
+        f.write('DEF {} {} 0 40 Y Y 1 F {}\n'.format(name, ref, 'P' if power else 'N'))
+        f.write('F0 "{}" 0 150 50 H {} C CNN\n'.format(ref, 'I' if power else 'V'))
+        f.write('F1 "{}" 0 -150 50 H V C CNN\n'.format(name))
+        f.write('F2 "" 0 0 50 H I C CNN\n')
+        f.write('F3 "" 0 0 50 H I C CNN\n')
+        if power:
+            f.write('DRAW\n')
+            f.write('P 2 0 1 0 0 0 0 -50 N\n')
+            f.write('X {0} 1 0 0 0 U 50 50 1 1 W N\n'.format(name))
+            f.write('ENDDRAW\nENDDEF\n')
+            return
+        f.write('ALIAS {0}_alt {0}_small\n'.format(name))
+        f.write('$FPLIST\n {}_*\n$ENDFPLIST\n'.format(prefix))
+        f.write('DRAW\n')
+        f.write('S -200 -300 200 300 0 1 10 f\n')
+        f.write('T 0 0 0 50 0 0 0 {} Normal 0 C C\n'.format(name))
+        f.write('C 0 250 20 0 1 0 N\n')
+        f.write('P 3 0 1 10 -100 -100 0 0 100 -100 N\n')
+        pins = 8 if prefix == 'U' else 2
+        for n in range(pins):
+            side = n % 2
+            f.write('X P{0} {0} {1} {2} 100 {3} 50 50 1 1 P\n'.
+                    format(n+1, 300 if side else -300, 250-(n//2)*100, 'L' if side else 'R'))
+        f.write('ENDDRAW\nENDDEF\n')
+
+    def gen_libs(self, dest):
+        names = self.symbol_names()
+        for n in range(self.libs):
+            base = os.path.join(dest, self.lib_name(n))
+            with open(base+'.lib', 'wt') as f:
+                f.write('EESchema-LIBRARY Version 2.4\n#encoding utf-8\n')
+                for name, prefix in names:
+                    self.write_symbol(f, name, prefix)
+                f.write('#\n#End Library\n')
+            with open(base+'.dcm', 'wt') as f:
+                f.write('EESchema-DOCLIB  Version 2.0\n')
+                for name, prefix in names:
+                    f.write('#\n$CMP {}\n'.format(name))
+                    f.write('D Synthetic {} number {}\n'.format(prefix, name))
+                    f.write('K {} bench synthetic\n'.format(prefix.lower()))
+                    f.write('F https://example.com/{}.pdf\n'.format(name))
+                    f.write('$ENDCMP\n')
+                f.write('#\n#End Doc Library\n')
+        with open(os.path.join(dest, 'bench_power.lib'), 'wt') as f:
+            f.write('EESchema-LIBRARY Version 2.4\n#encoding utf-8\n')
+            for name in POWER:
+                self.write_symbol(f, name, '#PWR', power=True)
+            f.write('#\n#End Library\n')
+        with open(os.path.join(dest, 'sym-lib-table'), 'wt') as f:
+            f.write('(sym_lib_table\n')
+            for name in [self.lib_name(n) for n in range(self.libs)]+['bench_power']:
+                f.write('  (lib (name {0})(type Legacy)(uri ${{KIPRJMOD}}/{0}.lib)(options "")(descr ""))\n'.format(name))
+            f.write(')\n')
+
+    # -----------------------
+    # Schematics
+    # -----------------------
+
+    @staticmethod
+    def write_header(f, sheet, nsheets, title):
+        f.write('EESchema Schematic File Version 4\n')
+        f.write('EELAYER 30 0\nEELAYER END\n')
+        f.write('$Descr A2 23386 16535\nencoding utf-8\n')
+        f.write('Sheet {} {}\n'.format(sheet, nsheets))
+        f.write('Title "{}"\nDate "2020-12-01"\nRev "1"\nComp "KiBot"\n'.format(title))
+        for n in range(4):
+            f.write('Comment{} ""\n'.format(n+1))
+        f.write('$EndDescr\n')
+
+    def write_component(self, f, paths, lib, name, prefix, x, y):
+        """ One component instance for each path (sheet instance) """
+        cid = self.new_id()
+        refs = [self.new_ref(prefix) for _ in paths]
+        value = self.value(prefix, name)
+        f.write('$Comp\nL {}:{} {}\n'.format(lib, name, refs[0]))
+        f.write('U 1 1 {}\nP {} {}\n'.format(cid, x, y))
+        if len(paths) > 1:
+            for path, ref in zip(paths, refs):
+                f.write('AR Path="{}/{}" Ref="{}"  Part="1" \n'.format(path, cid, ref))
+        power = prefix == '#PWR'
+        footprint = '' if power else self.rnd.choice(FOOTPRINTS[prefix])
+        f.write('F 0 "{}" H {} {} 50  {} C CNN\n'.format(refs[0], x, y-100, '0001' if power else '0000'))
+        f.write('F 1 "{}" H {} {} 50  0000 C CNN\n'.format(value, x, y+100))
+        f.write('F 2 "{}" H {} {} 50  0001 C CNN\n'.format(footprint, x, y))
+        f.write('F 3 "~" H {} {} 50  0001 C CNN\n'.format(x, y))
+        if not power:
+            if self.rnd.random() < 0.3:
+                # Same part, same manufacturer part number
+                mpn = zlib.crc32((lib+name+value+footprint).encode()) % 1000000
+                f.write('F 4 "MPN-{:06d}" H {} {} 50  0001 C CNN "manf#"\n'.format(mpn, x, y))
+            if self.rnd.random() < 0.1:
+                f.write('F 5 "{}" H {} {} 50  0001 C CNN "Config"\n'.format(self.rnd.choice(CONFIGS), x, y))
+        f.write('\t1    {} {}\n'.format(x, y))
+        f.write('\t1    0    0    -1  \n')
+        f.write('$EndComp\n')
+
+    @staticmethod
+    def write_wire(f, n, c, x, y):
+        """ Some wires and labels """
+        f.write('Wire Wire Line\n\t{} {} {} {}\n'.format(x, y-150, x, y-250))
+        if c % 10 == 0:
+            f.write('Text Label {} {} 0    50   ~ 0\nN{}_{}\n'.format(x, y-250, n, c))
+            f.write('Connection ~ {} {}\n'.format(x, y-250))
+
+    def write_sub_sheet_body(self, f, n, paths):
+        names = self.symbol_names()
+        by_prefix = {}
+        for name, prefix in names:
+            by_prefix.setdefault(prefix, []).append(name)
+        for c in range(self.per_sheet):
+            x = 1000+(c % 100)*200
+            y = 1000+(c // 100)*300
+            if c % 20 == 19:
+                self.write_component(f, paths, 'bench_power', POWER[c % len(POWER)], '#PWR', x, y)
+                continue
+            prefix = self.rnd.choice(self.weights)
+            lib = self.lib_name(self.rnd.randrange(self.libs))
+            if prefix == 'U':
+                # Use just a part of the library, so we have unused symbols
+                name = self.rnd.choice(by_prefix['U'][:max(len(by_prefix['U'])//4, 1)])
+            else:
+                name = GENERIC[prefix]
+            self.write_component(f, paths, lib, name, prefix, x, y)
+            self.write_wire(f, n, c, x, y)
+
+    def gen_sub_sheet(self, fname, n, paths):
+        with open(fname, 'wt') as f:
+            self.write_header(f, n+2, self.sheets+1, 'Sub-sheet {}'.format(n+1))
+            self.write_sub_sheet_body(f, n, paths)
+            f.write('Text HLabel 500 500 0    50   Input ~ 0\nIN\n')
+            f.write('$EndSCHEMATC\n')
+
+    def generate(self, dest):
+        """ Creates the project in `dest`, returns the name of the top sheet """
+        os.makedirs(dest, exist_ok=True)
+        self.gen_libs(dest)
+        # Sub-sheet instances for each unique file
+        sheet_ids = [self.new_id() for _ in range(self.sheets)]
+        instances = [[] for _ in range(self.unique)]
+        for n, sid in enumerate(sheet_ids):
+            instances[n % self.unique].append(sid)
+        for n in range(self.unique):
+            self.gen_sub_sheet(os.path.join(dest, 'sub_{}{}'.format(n, self.ext)), n, ['/'+sid for sid in instances[n]])
+        return self.gen_top(dest, sheet_ids)
+
+    def gen_top(self, dest, sheet_ids):
+        top = os.path.join(dest, NAME+self.ext)
+        with open(top, 'wt') as f:
+            self.write_header(f, 1, self.sheets+1, 'KiBot benchmark')
+            for n, sid in enumerate(sheet_ids):
+                x = 1000+(n % 20)*1000
+                y = 1000+(n // 20)*800
+                f.write('$Sheet\nS {} {} 800 500 \nU {}\n'.format(x, y, sid))
+                f.write('F0 "Sheet {}" 50\n'.format(n+1))
+                f.write('F1 "sub_{}.sch" 50\n'.format(n % self.unique))
+                f.write('F2 "IN" I L {} {} 50 \n'.format(x, y+250))
+                f.write('$EndSheet\n')
+            f.write('$EndSCHEMATC\n')
+        return top
+
+    def get_stats(self):
+        return {'format': self.ext[1:], 'sheets': self.sheets, 'unique_sheets': self.unique,
+                'components': self.per_sheet*self.sheets, 'libs': self.libs, 'symbols': self.symbols}
+
+
+def mm(v):
+    """ Mils to mm """
+    return '{:g}'.format(round(v*0.0254, 4))
+
+
+def uuid(id):
+    """ UUID for a v5 time stamp, like KiCad does when converting a project """
+    return '00000000-0000-0000-0000-0000'+id.lower()
+
+
+class Generator6(Generator):
+    """ The same design (same random sequence), using the KiCad 6 format.
+        The symbols are embedded in the schematics, the libraries are created anyway. """
+    ext = '.kicad_sch'
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        # Data for the `symbol_instances` of the top sheet
+        self.instances = []
+        # Symbols used by the current sheet (lib:name -> prefix)
+        self.used = {}
+
+    @staticmethod
+    def write_header(f, sheet, nsheets, title, id):
+        f.write('(kicad_sch (version 20211123) (generator eeschema)\n\n')
+        f.write('  (uuid {})\n\n'.format(uuid(id)))
+        f.write('  (paper "A2")\n\n')
+        f.write('  (title_block\n    (title "{}")\n    (date "2020-12-01")\n    (rev "1")\n    (company "KiBot")\n  )\n\n'.
+                format(title))
+
+    @staticmethod
+    def write_property(f, name, value, id, x, y, hide=False, indent='    '):
+        f.write('{}(property "{}" "{}" (id {}) (at {} {} 0)\n'.format(indent, name, value, id, mm(x), mm(y)))
+        f.write('{}  (effects (font (size 1.27 1.27)){})\n{})\n'.format(indent, ' hide' if hide else '', indent))
+
+    def write_lib_symbols(self, f):
+        f.write('  (lib_symbols\n')
+        for lib_id, prefix in self.used.items():
+            name = lib_id.split(':')[1]
+            power = prefix == '#PWR'
+            f.write('    (symbol "{}"{} (pin_names (offset 0)) (in_bom yes) (on_board yes)\n'.
+                    format(lib_id, ' (power)' if power else ''))
+            self.write_property(f, 'Reference', prefix, 0, 0, 150, power, '      ')
+            self.write_property(f, 'Value', name, 1, 0, -150, False, '      ')
+            self.write_property(f, 'Footprint', '', 2, 0, 0, True, '      ')
+            self.write_property(f, 'Datasheet', '', 3, 0, 0, True, '      ')
+            if not power:
+                self.write_property(f, 'ki_keywords', prefix.lower()+' bench synthetic', 4, 0, 0, True, '      ')
+                self.write_property(f, 'ki_description', 'Synthetic {} number {}'.format(prefix, name), 5, 0, 0, True,
+                                    '      ')
+                self.write_property(f, 'ki_fp_filters', prefix+'_*', 6, 0, 0, True, '      ')
+            f.write('      (symbol "{}_0_1"\n'.format(name))
+            f.write('        (rectangle (start -5.08 -7.62) (end 5.08 7.62)\n')
+            f.write('          (stroke (width 0.254) (type default) (color 0 0 0 0))\n')
+            f.write('          (fill (type background))\n        )\n      )\n')
+            f.write('      (symbol "{}_1_1"\n'.format(name))
+            pins = 1 if power else (8 if prefix == 'U' else 2)
+            for n in range(pins):
+                side = n % 2
+                f.write('        (pin passive line (at {} {} {}) (length 2.54)\n'.
+                        format(mm(300 if side else -300), mm(250-(n//2)*100), 180 if side else 0))
+                f.write('          (name "P{0}" (effects (font (size 1.27 1.27))))\n'.format(n+1))
+                f.write('          (number "{0}" (effects (font (size 1.27 1.27))))\n        )\n'.format(n+1))
+            f.write('      )\n    )\n')
+        f.write('  )\n\n')
+
+    def write_component(self, f, paths, lib, name, prefix, x, y):
+        cid = self.new_id()
+        refs = [self.new_ref(prefix) for _ in paths]
+        value = self.value(prefix, name)
+        lib_id = lib+':'+name
+        self.used.setdefault(lib_id, prefix)
+        f.write('  (symbol (lib_id "{}") (at {} {} 0) (unit 1)\n'.format(lib_id, mm(x), mm(y)))
+        f.write('    (in_bom yes) (on_board yes)\n')
+        f.write('    (uuid {})\n'.format(uuid(cid)))
+        power = prefix == '#PWR'
+        footprint = '' if power else self.rnd.choice(FOOTPRINTS[prefix])
+        self.write_property(f, 'Reference', refs[0], 0, x, y-100, power)
+        self.write_property(f, 'Value', value, 1, x, y+100)
+        self.write_property(f, 'Footprint', footprint, 2, x, y, True)
+        self.write_property(f, 'Datasheet', '~', 3, x, y, True)
+        if not power:
+            if self.rnd.random() < 0.3:
+                mpn = zlib.crc32((lib+name+value+footprint).encode()) % 1000000
+                self.write_property(f, 'manf#', 'MPN-{:06d}'.format(mpn), 4, x, y, True)
+            if self.rnd.random() < 0.1:
+                self.write_property(f, 'Config', self.rnd.choice(CONFIGS), 5, x, y, True)
+        for n in range(1 if power else (8 if prefix == 'U' else 2)):
+            f.write('    (pin "{}" (uuid {:08x}-0000-0000-0000-{:012x}))\n'.format(n+1, n+1, int(cid, 16)))
+        f.write('  )\n\n')
+        for path, ref in zip(paths, refs):
+            self.instances.append((uuid(path[1:])+'/'+uuid(cid), ref, value, footprint))
+
+    @staticmethod
+    def write_wire(f, n, c, x, y):
+        f.write('  (wire (pts (xy {0} {1}) (xy {0} {2}))\n'.format(mm(x), mm(y-150), mm(y-250)))
+        f.write('    (stroke (width 0) (type default) (color 0 0 0 0))\n  )\n')
+        if c % 10 == 0:
+            f.write('  (label "N{}_{}" (at {} {} 0)\n'.format(n, c, mm(x), mm(y-250)))
+            f.write('    (effects (font (size 1.27 1.27)) (justify left bottom))\n  )\n')
+            f.write('  (junction (at {} {}) (diameter 0) (color 0 0 0 0))\n'.format(mm(x), mm(y-250)))
+
+    def gen_sub_sheet(self, fname, n, paths):
+        self.used = {}
+        body = io.StringIO()
+        self.write_sub_sheet_body(body, n, paths)
+        with open(fname, 'wt') as f:
+            self.write_header(f, n+2, self.sheets+1, 'Sub-sheet {}'.format(n+1), '{:08X}'.format(n+1))
+            self.write_lib_symbols(f)
+            f.write(body.getvalue())
+            f.write('  (hierarchical_label "IN" (shape input) (at 12.7 12.7 180)\n')
+            f.write('    (effects (font (size 1.27 1.27)) (justify right))\n  )\n)\n')
+
+    def gen_top(self, dest, sheet_ids):
+        top = os.path.join(dest, NAME+self.ext)
+        with open(top, 'wt') as f:
+            self.write_header(f, 1, self.sheets+1, 'KiBot benchmark', '{:08X}'.format(0))
+            f.write('  (lib_symbols\n  )\n\n')
+            for n, sid in enumerate(sheet_ids):
+                x = 1000+(n % 20)*1000
+                y = 1000+(n // 20)*800
+                f.write('  (sheet (at {} {}) (size 20.32 12.7)\n'.format(mm(x), mm(y)))
+                f.write('    (stroke (width 0) (type solid) (color 0 0 0 0))\n')
+                f.write('    (fill (color 0 0 0 0.0000))\n')
+                f.write('    (uuid {})\n'.format(uuid(sid)))
+                self.write_property(f, 'Sheet name', 'Sheet {}'.format(n+1), 0, x, y)
+                self.write_property(f, 'Sheet file', 'sub_{}{}'.format(n % self.unique, self.ext), 1, x, y+500)
+                f.write('    (pin "IN" input (at {} {} 180)\n'.format(mm(x), mm(y+250)))
+                f.write('      (effects (font (size 1.27 1.27)) (justify left))\n    )\n  )\n\n')
+            f.write('  (sheet_instances\n    (path "/" (page "1"))\n')
+            for n, sid in enumerate(sheet_ids):
+                f.write('    (path "/{}/" (page "{}"))\n'.format(uuid(sid), n+2))
+            f.write('  )\n\n  (symbol_instances\n')
+            for path, ref, value, footprint in sorted(self.instances, key=lambda i: i[1]):
+                f.write('    (path "/{}"\n'.format(path))
+                f.write('      (reference "{}") (unit 1) (value "{}") (footprint "{}")\n    )\n'.format(ref, value, footprint))
+            f.write('  )\n)\n')
+        return top
+
+
+def add_arguments(parser):
+    parser.add_argument('--sheets', type=int, default=50, help='Number of sub-sheets [%(default)s]')
+    parser.add_argument('--unique', type=int, default=10, help='Number of different sub-sheet files [%(default)s]')
+    parser.add_argument('--components', type=int, default=20000, help='Number of components [%(default)s]')
+    parser.add_argument('--libs', type=int, default=4, help='Number of symbol libraries [%(default)s]')
+    parser.add_argument('--symbols', type=int, default=2000, help='Symbols in each library [%(default)s]')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the random generator [%(default)s]')
+    parser.add_argument('--kicad6', action='store_true', help='Use the KiCad 6 format (.kicad_sch)')
+
+
+def create_generator(args):
+    cls = Generator6 if args.kicad6 else Generator
+    return cls(args.sheets, args.unique, args.components, args.libs, args.symbols, args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic KiCad project generator')
+    add_arguments(parser)
+    parser.add_argument('dest', help='Destination directory')
+    args = parser.parse_args()
+    gen = create_generator(args)
+    print(gen.generate(args.dest))
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the internal BoM code
+
+These tests don't run KiBot, they call the functions used to create the BoM.
+The monkeypatch tool is used to start with a clean cache.
+
+- RLC values parsing (key, sort and display) and its warnings
+- The groups are the same we get comparing against the first component of each group
+- XML escaped values and control characters
+
+For debug information use:
+pytest-3 --log-cli-level debug
+"""
+
+import os
+import sys
+import random
+import coverage
+from types import SimpleNamespace
+from xml.dom import minidom
+# Look for the 'kibot' module from where the script is running
+prev_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if prev_dir not in sys.path:
+    sys.path.insert(0, prev_dir)
+from kibot.bom import units
+from kibot.bom.bom import _group_components, ComponentGroup, RLC_PREFIX
+from kibot.bom.units import comp_match
+from kibot.bom.xml_writer import tag, write_xml, SORT_ATTRS
+from kibot.kicad.v5_sch import SchematicComponent, SchematicField
+
+cov = coverage.Coverage()
+
+
+def test_bom_units_values(monkeypatch):
+    """ key, sort and display for the parsed values """
+    monkeypatch.setattr(units, 'parsed', {})
+    cases = [('4k7', 'R', 4700*10**15, 4700000, '4.7 kΩ'),
+             ('0R1', 'R', 10**14, 100, '0.1 Ω'),
+             ('1M', 'R', 10**21, 10**9, '1 MΩ'),
+             ('3.3mOhm', 'R', 33*10**11, 3, '3.3 mΩ'),
+             ('100n', 'C', 10**8, 10**8, '100 nF'),
+             ('47pF', 'C', 47000, 47000, '47 pF'),
+             ('10uH', 'L', 10**10, 10**10, '10 µH')]
+    cov.load()
+    cov.start()
+    res = [comp_match(value, prefix) for value, prefix, _, _, _ in cases]
+    # 4k7 and 4.7k are the same value
+    alt = comp_match('4.7k', 'R')
+    # Locale using a comma as decimal point
+    monkeypatch.setattr(units, 'parsed', {})
+    monkeypatch.setattr(units, 'decimal_point', ',')
+    comma = comp_match('4,7k', 'R')
+    cov.stop()
+    cov.save()
+    for r, (value, prefix, key, sort, display) in zip(res, cases):
+        assert r.key == key, value
+        assert r.sort == '{0:15d}'.format(sort), value
+        assert r.display == display, value
+    assert alt.key == res[0].key
+    assert (comma.key, comma.display) == (4700*10**15, '4.7 kΩ')
+
+
+class WarnLogger(object):
+    """ Collects all the warnings, kibot's logger discards the repeated ones """
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+
+def test_bom_units_warnings(monkeypatch):
+    """ The malformed values are reported for each component, even when already parsed """
+    monkeypatch.setattr(units, 'parsed', {})
+    log = WarnLogger()
+    monkeypatch.setattr(units, 'logger', log)
+    cov.load()
+    cov.start()
+    # One call for each component
+    res = [comp_match(v, 'R') for v in ('foo', 'foo', '.', '4.7k7', '.', '4.7k7')]
+    cov.stop()
+    cov.save()
+    assert res == [None]*6
+    assert log.warnings == ['(W020) Malformed value: `foo` (no match)']*2 + \
+                           ['(W021) Malformed value: `.` (reduced to decimal point)',
+                            '(W022) Malformed value: `4.7k7` (unit split, but contains decimal point)']*2
+
+
+class GroupsCfg(object):
+    """ The options used to create the groups """
+    def __init__(self, group_fields, aliases=(), merge_blank_fields=False, group_connectors=True):
+        self.group_fields = group_fields
+        self.component_aliases = aliases
+        self.merge_blank_fields = merge_blank_fields
+        self.group_connectors = group_connectors
+
+
+def _bom_comp(ref, value, name=None, lib='Device', fields=None, fitted=True):
+    c = SchematicComponent()
+    c.ref = ref
+    c.ref_prefix, c.ref_suffix = SchematicComponent.ref_re.match(ref).groups()
+    c.value = value
+    c.name = name if name is not None else c.ref_prefix
+    c.lib = lib
+    c.fitted = fitted
+    c.fields = []
+    c.dfields = {}
+    for k, v in (fields or {}).items():
+        f = SchematicField()
+        f.name = k
+        f.value = v
+        c.add_field(f)
+    # Like group_components
+    c.value_sort = comp_match(value, c.ref_prefix) if c.ref_prefix in RLC_PREFIX else None
+    return c
+
+
+def _group_pairwise(cfg, comps):
+    """ Reference: compare each component against the first component of each group """
+    groups = []
+    for c in comps:
+        for g in groups:
+            if g.match_component(c):
+                g.add_component(c)
+                break
+        else:
+            g = ComponentGroup(cfg)
+            g.add_component(c)
+            groups.append(g)
+    return groups
+
+
+def _groups_refs(cfg, comps):
+    """ The references of each group, checked against the pairwise comparison """
+    cov.load()
+    cov.start()
+    groups = _group_components(cfg, comps)
+    cov.stop()
+    cov.save()
+    res = [[c.ref for c in g.components] for g in groups]
+    assert res == [[c.ref for c in g.components] for g in _group_pairwise(cfg, comps)]
+    return res
+
+
+def test_bom_groups_values():
+    """ Equal as strings vs numerically equal, only the value is used """
+    cfg = GroupsCfg(['value'])
+    comps = [_bom_comp('R1', '1k'), _bom_comp('R2', '1000'), _bom_comp('C1', '1k'), _bom_comp('C2', '1nF'),
+             _bom_comp('C3', '1000p'), _bom_comp('R3', '1K0'), _bom_comp('L1', '1000'), _bom_comp('R4', '~'),
+             _bom_comp('R5', ''), _bom_comp('R2', '1000'), _bom_comp('R6', '1k', fitted=False)]
+    # C1 is equal to R1 as string, L1 is equal to R2 as string, but L1 isn't equal to R1
+    assert _groups_refs(cfg, comps) == [['R1', 'R2', 'C1', 'R3'], ['C2', 'C3'], ['L1'], ['R4', 'R5'], ['R6']]
+    # The first component of the group decides
+    comps = [comps[2], comps[0], comps[1], comps[6]]
+    assert _groups_refs(cfg, comps) == [['C1', 'R1'], ['R2', 'L1']]
+
+
+def test_bom_groups_connectors():
+    """ group_connectors ignores the value for connectors """
+    comps = [_bom_comp('J1', 'USB', 'Conn', 'Connector'), _bom_comp('J2', 'Power', 'Conn', 'Connector_Generic'),
+             _bom_comp('J3', 'USB', 'Conn', 'Device'), _bom_comp('J4', 'Power', 'Conn', 'Device')]
+    assert _groups_refs(GroupsCfg(['part', 'value']), comps) == [['J1', 'J2', 'J3'], ['J4']]
+    assert _groups_refs(GroupsCfg(['part', 'value'], group_connectors=False), comps) == [['J1', 'J3'], ['J2', 'J4']]
+
+
+def test_bom_groups_aliases():
+    """ A name in two lists of aliases, the relation isn't transitive """
+    cfg = GroupsCfg(['part'], [['r', 'res'], ['res', 'resistor']])
+    r1 = _bom_comp('R1', '1k', 'R')
+    r2 = _bom_comp('R2', '1k', 'Resistor')
+    r3 = _bom_comp('R3', '1k', 'RES')
+    assert _groups_refs(cfg, [r1, r2, r3]) == [['R1', 'R3'], ['R2']]
+    assert _groups_refs(cfg, [r3, r1, r2]) == [['R3', 'R1', 'R2']]
+    # One list for each name, used as an exact key
+    cfg = GroupsCfg(['part'], [['r', 'res'], ['resistor']])
+    assert _groups_refs(cfg, [r1, r2, r3]) == [['R1', 'R3'], ['R2']]
+
+
+def test_bom_groups_merge_blank():
+    """ merge_blank_fields, with blanks in different fields """
+    cfg = GroupsCfg(['value', 'footprint', 'mpn'], merge_blank_fields=True)
+    comps = [_bom_comp('R1', '10k', fields={'footprint': 'A', 'mpn': ''}),
+             _bom_comp('R2', '10k', fields={'footprint': '', 'mpn': 'X'}),
+             _bom_comp('R3', '10k', fields={'footprint': 'A', 'mpn': 'Y'}),
+             _bom_comp('R4', '10k', fields={'footprint': 'B', 'mpn': 'X'}),
+             _bom_comp('R5', '10k', fields={'footprint': '', 'mpn': ''}),
+             _bom_comp('R6', '10k', fields={'footprint': 'b', 'mpn': ''}),
+             _bom_comp('R7', '10k', fields={'footprint': '', 'mpn': 'Z'})]
+    # Compared against the first component (R1), not against the merged values
+    assert _groups_refs(cfg, comps) == [['R1', 'R2', 'R3', 'R5', 'R7'], ['R4', 'R6']]
+    cfg.merge_blank_fields = False
+    assert _groups_refs(cfg, comps) == [['R1'], ['R2'], ['R3'], ['R4'], ['R5'], ['R6'], ['R7']]
+
+
+def test_bom_groups_random():
+    """ Random components and options, against the pairwise comparison """
+    rnd = random.Random(1234)
+    values = ['1k', '1000', '1K0', '1nF', '1000p', '1n', '10k', '~', '', 'USB', '4k7', '4.7k']
+    names = ['R', 'r_small', 'RES', 'Resistor', 'C', 'cap', 'Conn']
+    libs = ['Device', 'Connector', 'Connector_Generic']
+    alias_sets = [[], [['r', 'r_small', 'res', 'resistor'], ['c', 'cap']], [['r', 'res'], ['res', 'resistor'], ['c', 'cap']]]
+    for _ in range(200):
+        comps = []
+        for n in range(rnd.randint(1, 40)):
+            ref = rnd.choice(['R', 'C', 'L', 'J'])+str(rnd.randint(1, 15))
+            fields = {f: rnd.choice(['', 'a', 'A', 'b']) for f in ('footprint', 'mpn') if rnd.random() < 0.8}
+            comps.append(_bom_comp(ref, rnd.choice(values), rnd.choice(names), rnd.choice(libs), fields,
+                                   rnd.random() < 0.9))
+        group_fields = rnd.choice([[], ['value'], ['part', 'value'], ['part', 'value', 'footprint', 'mpn'],
+                                   ['value', 'mpn']])
+        cfg = GroupsCfg(group_fields, rnd.choice(alias_sets), rnd.random() < 0.5, rnd.random() < 0.5)
+        _groups_refs(cfg, comps)
+
+
+def test_bom_xml_invalid_chars():
+    """ Control characters aren't valid XML, not even escaped, they are removed """
+    res = tag('group', ['a', 'b'], ['1\x00<2>\x1b&"\t\n\r', '\x0b\x0cX\ufffe\x7f'], '/>')
+    assert res == '<group a="1&lt;2&gt;&amp;&quot;&#9;&#10;&#13;" b="X\x7f"/>'
+    # The result is valid XML
+    node = minidom.parseString(res).documentElement
+    assert node.getAttribute('a') == '1<2>&"\t\n\r'
+    assert node.getAttribute('b') == 'X\x7f'
+
+
+class XMLTable(object):
+    """ The part of the BoMTable used by write_xml """
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_rows(self):
+        return ((n, row, '') for n, row in enumerate(self.rows))
+
+
+def test_bom_xml_escaped(tmp_path):
+    """ The values are escaped, tabs and line breaks too (minidom wrote them raw) """
+    cfg = SimpleNamespace(source='a&b.sch', revision='', date='', variant=SimpleNamespace(name='default'),
+                          kicad_version='5.1', n_groups=2, n_total=3, n_fitted=3, number=1, n_build=3)
+    table = XMLTable([['R1 R2', '10k\tA', 'Q'], ['C1', '<1n>', 'Line 1\nLine 2\r\n']])
+    fname = str(tmp_path / 'bom.xml')
+    cov.load()
+    cov.start()
+    write_xml(fname, table, None, ['References', 'Value', 'Q,Q'], cfg)
+    cov.stop()
+    cov.save()
+    with open(fname, 'rt', encoding='utf-8', newline='') as f:
+        content = f.read()
+    # Python 3.7 sorted the attributes, like the old code
+    if not SORT_ATTRS:
+        assert content == ('<?xml version="1.0" encoding="utf-8"?>\n'
+                           '<KiCad_BOM Schematic_Source="a&amp;b.sch" Schematic_Revision="" Schematic_Date="" '
+                           'PCB_Variant="default" KiCad_Version="5.1" Component_Groups="2" Component_Count="3" '
+                           'Fitted_Components="3" Number_of_PCBs="1" Total_Components="3" encoding="utf-8">\n'
+                           '\t<group References="R1 R2" Value="10k&#9;A" Q_Q="Q"/>\n'
+                           '\t<group References="C1" Value="&lt;1n&gt;" Q_Q="Line 1&#10;Line 2&#13;&#10;"/>\n'
+                           '</KiCad_BOM>\n')
+    # The values are preserved
+    groups = minidom.parse(fname).getElementsByTagName('group')
+    assert [g.getAttribute('Value') for g in groups] == ['10k\tA', '<1n>']
+    assert groups[1].getAttribute('Q_Q') == 'Line 1\nLine 2\r\n'
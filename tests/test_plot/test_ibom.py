@@ -4,6 +4,7 @@ Tests of InteractiveHtmlBom BoM files
 The bom.sch has R1, R2 and C1
 We test:
 - HTML
+- The XML is a dependency (up to date check)
 
 For debug information use:
 pytest-3 --log-cli-level debug
@@ -14,6 +15,7 @@ import os
 import sys
 import re
 import json
+import shutil
 import logging
 # Look for the 'utils' module from where the script is running
 prev_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -71,6 +73,27 @@ def test_ibom_no_ops():
     ctx.clean_up()
 
 
+def test_ibom_up_to_date():
+    """ The XML used by IBoM is one of its inputs """
+    prj = 'bom'
+    ctx = context.TestContext('BoM_interactiveUpToDate', prj, 'ibom_no_ops', BOM_DIR)
+    src = ctx.get_out_path('src')
+    os.makedirs(src, exist_ok=True)
+    for ext in [context.KICAD_PCB_EXT, '.xml']:
+        shutil.copy2(os.path.join(ctx.get_board_dir(), prj+ext), src)
+    board = os.path.join(src, prj+context.KICAD_PCB_EXT)
+    ctx.run(filename=board)
+    ctx.expect_out_file(os.path.join(BOM_DIR, IBOM_OUT))
+    ctx.run(filename=board)
+    assert ctx.search_err(r'\(up to date\)')
+    # A new XML must generate the output again
+    with open(os.path.join(src, prj+'.xml'), 'at') as f:
+        f.write('\n')
+    ctx.run(filename=board)
+    ctx.search_err(r'\(up to date\)', invert=True)
+    ctx.clean_up()
+
+
 def test_ibom_fail():
     ctx = context.TestContext('BoM_interactiveFail', 'ibom_fail', 'ibom', BOM_DIR)
     ctx.run(BOM_ERROR)
@@ -29,6 +29,12 @@ Tests of Internal BoM files
 - Field collision
 - test_regex/exclude_any/include_only
 - No XLSX support
+- pcbnew isn't imported for schematic-only jobs
+- Libs index (only the used components are parsed)
+- --cache-sch
+- More than one format, the groups are shared
+- XML column names that aren't valid attribute names
+- KiCad 6 symbols excluded from the BoM (in_bom no)
 
 Missing:
 - number_boards
@@ -42,6 +48,7 @@ pytest-3 --log-cli-level debug
 import os
 import sys
 import logging
+import json
 from base64 import b64decode
 # Look for the 'utils' module from where the script is running
 prev_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -417,6 +424,39 @@ def test_int_bom_simple_xml():
     ctx.clean_up()
 
 
+def test_int_bom_xml_bad_names():
+    """ The `Q,Q` field isn't a valid XML attribute name """
+    prj = 'kibom-test-4'
+    ctx = context.TestContextSCH('test_int_bom_xml_bad_names', prj, 'int_bom_simple_xml', BOM_DIR)
+    ctx.run()
+    rows, header = ctx.load_xml(prj+'-bom.xml')
+    assert 'Q_Q' in header
+    assert 'K_K' in header
+    ref_column = header.index(REF_COLUMN_NAME)
+    # No `use_alt`, so no ranges
+    check_kibom_test_netlist(rows, ref_column, 4, None, ['R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'C1', 'C2'])
+    ctx.clean_up()
+
+
+def test_int_bom_multi_format():
+    """ One output generating CSV, HTML and XML, another output (TSV) using the same groups """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH('test_int_bom_multi_format', prj, 'int_bom_multi_format', BOM_DIR)
+    ctx.run(extra_debug=True)
+    assert ctx.search_err(r'Using the groups from a previous BoM')
+    out = prj + '-bom.'
+    rows, header, info = ctx.load_csv(out+'csv')
+    check_csv_info(info, KIBOM_PRJ_INFO, KIBOM_STATS)
+    kibom_verif(rows, header)
+    rows, header, info = ctx.load_csv(out+'tsv', delimiter='\t')
+    check_csv_info(info, KIBOM_PRJ_INFO, KIBOM_STATS)
+    kibom_verif(rows, header)
+    rows, header = ctx.load_xml(out+'xml')
+    kibom_verif(rows, header, skip_head=True, qty_name=adapt_xml(QTY_COLUMN_NAME))
+    rows, headers, sh_head = ctx.load_html(out+'html')
+    simple_html_test(ctx, rows, headers, sh_head, prj)
+
+
 def simple_xlsx_verify(ctx, prj, dnf=True):
     ext = 'xlsx'
     ctx.run()
@@ -931,11 +971,13 @@ def test_int_bom_include_only():
 def test_int_bom_sub_sheet_alt():
     """ Test for 2 sub sheets used twice.
         Also stress the v5 loader.
-        Also tests sheet path and no grouping with multi-part components """
+        Also tests sheet path and no grouping with multi-part components
+        Also checks the sub sheet is parsed only once """
     prj = 'test_v5'
     ext = 'csv'
     ctx = context.TestContextSCH('test_int_bom_sub_sheet_alt', prj, 'int_bom_sheet_path', BOM_DIR)
     ctx.run(extra_debug=True)
+    ctx.search_err(r'Using the already parsed .*sub-sheet.sch')
     out = prj + '-bom.' + ext
     rows, header, info = ctx.load_csv(out)
     assert header == KIBOM_TEST_HEAD[:-1] + ['Sheetpath']
@@ -1248,6 +1290,25 @@ def test_int_bom_variant_t2is():
     ctx.clean_up(keep_project=True)
 
 
+def test_int_bom_kicad6_in_bom():
+    """ FID1 is marked as `(in_bom no)`, the default filter that excludes it is disabled """
+    prj = 'kibom-variant_3'
+    ctx = context.TestContextSCH('test_int_bom_kicad6_in_bom', prj, 'int_bom_fil_dummy', BOM_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    with open(os.path.join(ctx.get_board_dir(), '..', 'kicad_6', prj+'.kicad_sch'), 'rt') as f:
+        content = f.read()
+    fid1 = '(in_bom yes) (on_board yes)\n    (uuid "00000000-0000-0000-0000-00005f57eddb")'
+    assert fid1 in content
+    sch = ctx.get_out_path(prj+'.kicad_sch')
+    with open(sch, 'wt') as f:
+        f.write(content.replace(fid1, fid1.replace('yes', 'no', 1)))
+    ctx.run(filename=sch)
+    rows, header, info = ctx.load_csv(prj+'-bom.csv')
+    ref_column = header.index(REF_COLUMN_NAME)
+    check_kibom_test_netlist(rows, ref_column, 2, ['FID1'], ['C1-C2', 'R1-R2'])
+    ctx.clean_up(keep_project=True)
+
+
 def test_int_bom_wrong_variant():
     ctx = context.TestContextSCH('test_int_bom_wrong_variant', 'links', 'int_bom_wrong_variant', '')
     ctx.run(EXIT_BAD_CONFIG)
@@ -1401,3 +1462,55 @@ def test_int_bom_variant_5():
     ref_column = header.index(REF_COLUMN_NAME)
     check_kibom_test_netlist(rows, ref_column, 1, ['C1', 'C2', 'R1'], ['R2'])
     ctx.clean_up()
+
+
+def test_int_bom_no_pcbnew():
+    """ A schematic-only job doesn't need the pcbnew module """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH('test_int_bom_no_pcbnew', prj, 'int_bom_simple_csv', BOM_DIR)
+    prof = ctx.get_out_path('profile.json')
+    ctx.run(extra=['--profile', prof])
+    ctx.expect_out_file(os.path.join(BOM_DIR, prj+'-bom.csv'))
+    with open(prof) as f:
+        data = json.load(f)
+    names = {e['name'] for e in data['traceEvents']}
+    assert 'run bom_internal' in names
+    assert 'import pcbnew' not in names
+    assert 'load_board' not in names
+    ctx.clean_up()
+
+
+def test_int_bom_lib_index():
+    """ The libs are indexed and only the used components are parsed. Also the cached index """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH('test_int_bom_lib_index', prj, 'int_bom_simple_csv', BOM_DIR)
+    with ctx.private_cache() as cache:
+        ctx.run(extra_debug=True)
+        ctx.search_err(r'Parsing the whole library', invert=True)
+        out = prj + '-bom.csv'
+        rows, header, info = ctx.load_csv(out)
+        kibom_verif(rows, header)
+        assert os.listdir(os.path.join(cache, 'kibot', 'libs'))
+        # Now using the cached index
+        ctx.run()
+        rows2, header2, info2 = ctx.load_csv(out)
+        assert rows2 == rows
+    ctx.clean_up()
+
+
+def test_int_bom_cache_sch():
+    """ --cache-sch: the second run uses the cached schematic """
+    prj = 'kibom-test'
+    ctx = context.TestContextSCH('test_int_bom_cache_sch', prj, 'int_bom_simple_csv', BOM_DIR)
+    with ctx.private_cache() as cache:
+        ctx.run(extra=['--cache-sch'], extra_debug=True)
+        ctx.search_err(r'Using the cached schematic', invert=True)
+        out = prj + '-bom.csv'
+        rows, header, info = ctx.load_csv(out)
+        kibom_verif(rows, header)
+        assert os.listdir(os.path.join(cache, 'kibot', 'sch'))
+        ctx.run(extra=['--cache-sch'], extra_debug=True)
+        assert ctx.search_err(r'Using the cached schematic')
+        rows2, header2, info2 = ctx.load_csv(out)
+        assert rows2 == rows
+    ctx.clean_up()
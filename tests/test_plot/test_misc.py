@@ -23,6 +23,18 @@ Tests miscellaneous stuff.
   - already exists
   - Copying
 - Load plugin
+- Only the used plug-ins are imported
+- Cache for the macro-expanded plug-ins
+- --jobs
+  - Parallel generation
+  - Wrong value
+- Skip outputs that are up to date
+  - --force
+- Server mode
+- Watch mode
+  - Outputs removed from the config aren't watched
+- Batch mode
+- --profile
 
 For debug information use:
 pytest-3 --log-cli-level debug
@@ -32,6 +44,9 @@ import os
 import sys
 import shutil
 import logging
+import subprocess
+import time
+import json
 # Look for the 'utils' module from where the script is running
 prev_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if prev_dir not in sys.path:
@@ -43,6 +58,7 @@ if prev_dir not in sys.path:
     sys.path.insert(0, prev_dir)
 from kibot.misc import (EXIT_BAD_ARGS, EXIT_BAD_CONFIG, NO_PCB_FILE, NO_SCH_FILE, EXAMPLE_CFG, WONT_OVERWRITE, CORRUPTED_PCB,
                         PCBDRAW_ERR, NO_PCBNEW_MODULE, NO_YAML_MODULE)
+from kibot import watch
 
 
 POS_DIR = 'positiondir'
@@ -534,3 +550,206 @@ def test_no_yaml():
     cmd = [os.path.abspath(os.path.dirname(os.path.abspath(__file__))+'/force_yaml_error.py')]
     ctx.do_run(cmd, NO_YAML_MODULE)
     ctx.search_err('No yaml module for Python, install python3-yaml')
+
+
+def test_jobs():
+    prj = 'simple_2layer'
+    ctx = context.TestContext('Jobs', prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', '-j', '2'])
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    ctx.expect_out_file(ctx.get_pos_both_csv_filename())
+    assert ctx.search_err('using 2 jobs')
+    # The messages say which output generated them
+    ctx.search_err([r'^\[position\] - ', r'^\[pos_ascii\] - '])
+    ctx.clean_up()
+
+
+def test_jobs_wrong():
+    ctx = context.TestContext('JobsWrong', '3Rs', 'pre_and_position', POS_DIR)
+    ctx.run(EXIT_BAD_ARGS, extra=['-j', '0'])
+    assert ctx.search_err('number of jobs must be a positive integer')
+    ctx.clean_up()
+
+
+def test_up_to_date():
+    prj = 'simple_2layer'
+    ctx = context.TestContext('UpToDate', prj, 'pre_and_position', POS_DIR)
+    ctx.run(extra=['-s', 'all', 'pos_ascii'])
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    ctx.search_err(r'\(up to date\)', invert=True)
+    # Nothing changed, must be skipped
+    ctx.run(extra=['-s', 'all', 'pos_ascii'])
+    assert ctx.search_err(r'pos_ascii(.*)\(up to date\)')
+    # Removing the output forces a new run
+    os.remove(ctx.get_out_path(ctx.get_pos_both_filename()))
+    ctx.run(extra=['-s', 'all', 'pos_ascii'])
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    ctx.search_err(r'\(up to date\)', invert=True)
+    # Forced
+    ctx.run(extra=['-s', 'all', '--force', 'pos_ascii'])
+    ctx.search_err(r'\(up to date\)', invert=True)
+    ctx.clean_up()
+
+
+def test_server():
+    ctx = context.TestContext('Server', '3Rs', 'pre_and_position', POS_DIR)
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+    socket_name = ctx.get_out_path('kibot.socket')
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    server = subprocess.Popen([os.path.join(src_dir, 'kibot'), '--serve', socket_name])
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_name):
+                break
+            time.sleep(0.1)
+        cmd = [os.path.join(src_dir, 'kibot-client'), socket_name, '-v', '-b', ctx.board_file, '-c', ctx.yaml_file,
+               '-d', ctx.output_dir, '-s']
+        ctx.do_run(cmd+['all', 'pos_ascii'])
+        ctx.expect_out_file(ctx.get_pos_both_filename())
+        # Errors are reported using the exit code
+        ctx.do_run(cmd+['bogus'], EXIT_BAD_ARGS)
+        # The second time the PCB is already loaded
+        os.remove(ctx.get_out_path(ctx.get_pos_both_filename()))
+        ctx.do_run(cmd+['all', 'pos_ascii'])
+        ctx.expect_out_file(ctx.get_pos_both_filename())
+        assert ctx.search_err('Using cached')
+    finally:
+        server.terminate()
+        server.wait()
+    ctx.clean_up()
+
+
+def _wait_for_file(name, timeout=30):
+    for _ in range(timeout*10):
+        if os.path.isfile(name):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_watch():
+    ctx = context.TestContext('Watch', '3Rs', 'pre_and_position', POS_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    # Use a copy of the PCB, we will touch it
+    pcb = os.path.join(ctx.output_dir, os.path.basename(ctx.board_file))
+    shutil.copy2(ctx.board_file, pcb)
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+    cmd = [os.path.join(src_dir, 'kibot'), '-b', pcb, '-c', ctx.yaml_file, '-d', ctx.output_dir, '-s', 'all', '--watch',
+           'pos_ascii']
+    process = subprocess.Popen(cmd)
+    try:
+        out = ctx.get_out_path(ctx.get_pos_both_filename())
+        assert _wait_for_file(out)
+        os.remove(out)
+        time.sleep(1)
+        # Changing the PCB must generate the output again
+        os.utime(pcb)
+        assert _wait_for_file(out)
+    finally:
+        process.terminate()
+        process.wait()
+    ctx.clean_up()
+
+
+class FakeOutput(object):
+    def __init__(self, name, deps):
+        self.name = name
+        self.deps = deps
+
+    def get_dependencies(self):
+        return self.deps
+
+
+def test_watch_config_reload(monkeypatch):
+    """ After reloading the config we must watch only the current outputs """
+    cfg = '/tmp/kibot_watch.yaml'
+    watched = []
+    changes = [{cfg}, {'b.sch'}]
+
+    def wait_changes(old):
+        watched.append(set(old.keys()))
+        if not changes:
+            raise KeyboardInterrupt
+        return changes.pop(0)
+
+    runs = []
+
+    def run(names, sch_changed, pcb_changed):
+        runs.append(names)
+        # The new config only has `b`
+        return [FakeOutput('b', ['b.sch'])]
+
+    monkeypatch.setattr(watch, '_wait_changes', wait_changes)
+    watch.watch(cfg, [FakeOutput('a', ['a.sch']), FakeOutput('b', ['b.sch'])], run)
+    assert watched == [{cfg, 'a.sch', 'b.sch'}, {cfg, 'b.sch'}, {cfg, 'b.sch'}]
+    assert runs == [None, ['b']]
+
+
+def test_batch():
+    ctx = context.TestContext('Batch', '3Rs', 'simple_position_unified', POS_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    manifest = ctx.get_out_path('batch.yaml')
+    bad_yaml = os.path.join(os.path.dirname(ctx.yaml_file), 'error_unk_section.kibot.yaml')
+    with open(manifest, 'wt') as f:
+        f.write("- name: good\n")
+        f.write("  board: '{}'\n".format(ctx.board_file))
+        f.write("  config: '{}'\n".format(ctx.yaml_file))
+        f.write("  out_dir: '{}'\n".format(ctx.output_dir))
+        f.write("  targets: ['position']\n")
+        f.write("- name: bad\n")
+        f.write("  board: '{}'\n".format(ctx.board_file))
+        f.write("  config: '{}'\n".format(bad_yaml))
+        f.write("  out_dir: '{}'\n".format(ctx.output_dir))
+    src_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+    ctx.do_run([os.path.join(src_dir, 'kibot'), '--batch', manifest], EXIT_BAD_CONFIG)
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    assert ctx.search_err(r'good\s+OK')
+    assert ctx.search_err(r'bad\s+EXIT_BAD_CONFIG')
+    assert ctx.search_err('2 projects, 1 failed')
+    ctx.clean_up()
+
+
+def test_profile():
+    ctx = context.TestContext('Profile', '3Rs', 'simple_position_unified', POS_DIR)
+    prof = ctx.get_out_path('profile.json')
+    ctx.run(extra=['--profile', prof])
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    assert ctx.search_err(r'Profile:')
+    assert ctx.search_err(r'run position')
+    with open(prof) as f:
+        data = json.load(f)
+    names = {e['name'] for e in data['traceEvents']}
+    assert 'import pcbnew' in names
+    assert 'load_actions' in names
+    assert 'read config' in names
+    assert 'load_board' in names
+    assert 'config position' in names
+    assert 'run position' in names
+    assert all(e['ph'] == 'X' for e in data['traceEvents'])
+    assert {s['name'] for s in data['kibotSummary']} == names
+    ctx.clean_up()
+
+
+def test_lazy_plugins():
+    ctx = context.TestContext('LazyPlugins', '3Rs', 'simple_position_unified', POS_DIR)
+    ctx.run()
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    assert ctx.search_err(r'Importing out_position')
+    assert ctx.search_err(r'Importing globals')
+    ctx.search_err(r'Importing out_bom', invert=True)
+    ctx.search_err(r'Importing out_pcbdraw', invert=True)
+    ctx.search_err(r'Importing pre_drc', invert=True)
+    ctx.clean_up()
+
+
+def test_macro_cache():
+    ctx = context.TestContext('MacroCache', '3Rs', 'simple_position_unified', POS_DIR)
+    with ctx.private_cache() as cache:
+        ctx.run()
+        assert ctx.search_err(r'Expanding macros for .*out_position.py')
+        ctx.run()
+        ctx.search_err(r'Expanding macros', invert=True)
+    ctx.expect_out_file(ctx.get_pos_both_filename())
+    assert os.path.isfile(os.path.join(cache, 'kibot', 'plugins.json'))
+    assert os.path.isdir(os.path.join(cache, 'kibot', 'expanded'))
+    ctx.clean_up()
@@ -3,6 +3,12 @@ Tests of Printing Schematic files
 
 We test:
 - PDF for bom.sch
+- Reloading only the changed sheets of a schematic
+- Components index for a hierarchical design
+- The shared 'part' fields are discarded with the loaded data
+- Bitmaps copied from the schematic file
+- Loading KiCad 6 schematics
+  - Sub-sheet used twice, KiCad 6 (symbol_instances) and KiCad 7 (instances)
 
 For debug information use:
 pytest-3 --log-cli-level debug
@@ -11,6 +17,7 @@ pytest-3 --log-cli-level debug
 
 import os
 import sys
+import shutil
 import logging
 import coverage
 # Look for the 'utils' module from where the script is running
@@ -18,7 +25,10 @@ prev_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if prev_dir not in sys.path:
     sys.path.insert(0, prev_dir)
 from kibot.misc import (PDF_SCH_PRINT, SVG_SCH_PRINT)
-from kibot.kicad.v5_sch import Schematic, SchFileError, DrawPoligon, Pin
+from kibot.kicad.v5_sch import Schematic, SchematicComponent, SchError, SchFileError, DrawPoligon, Pin
+from kibot.kicad.v6_sch import SchematicV6
+from kibot.kicad.config import KiConf
+from kibot.kiplot import reset_loaded
 # Utils import
 from utils import context
 
@@ -177,3 +187,234 @@ def test_sch_bizarre_cases():
     cov.save()
     assert ok_pol is False
     assert ok_pin is False
+
+
+def _load_sch_libs(fname):
+    KiConf.reset()
+    sch = Schematic()
+    sch.load(fname)
+    sch.load_libs(fname)
+    return sch
+
+
+def _sch_digest(sch):
+    comps = [(c.ref, c.sheet_path_h, c.lib, c.name, c.desc, [(f.name, f.value) for f in c.fields])
+             for c in sch.get_components(False)]
+    return comps, list(sch.fields), list(sch.libs.keys()), list(sch.comps_data.keys())
+
+
+def test_sch_components_index():
+    """ Hierarchy using the same sub-sheet twice, the sub-sheet has a multi-unit component """
+    fname = os.path.join(prev_dir, 'board_samples', 'kicad_5', 'test_v5.sch')
+    cov.load()
+    cov.start()
+    sch = _load_sch_libs(fname)
+    comps = [(c.ref, c.unit, c.sheet_path_h) for c in sch.get_components()]
+    with_power = [c.ref for c in sch.get_components(False)]
+    refs = {k: (c.unit, c.sheet_path_h) for k, c in sch.get_refs_hash().items()}
+    u1 = [(c.ref, c.unit) for c in sch.get_components_by_name('74xx:74LS04')]
+    root = [c.ref for c in sch.get_components_in_sheet('/')]
+    sub2 = [(c.ref, c.unit) for c in sch.get_components_in_sheet('/Sub Sheet 2')]
+    deeper = [c.ref for c in sch.get_components_in_sheet('/Sub Sheet/Deeper test')]
+    missing = sch.get_components_in_sheet('/Not a sheet')
+    cov.stop()
+    cov.save()
+    # Sorted by reference, the units keep the hierarchy order
+    units = [('U1', u, '/Sub Sheet') for u in range(1, 8)]+[('U2', u, '/Sub Sheet 2') for u in range(1, 8)]
+    assert comps == [('#SYM_CAUTION1', 1, '/'), ('C1', 1, '/'), ('L1', 1, '/'), ('R1', 1, '/'), ('R2', 1, '/'),
+                     ('R3', 1, '/Sub Sheet/Deeper test'), ('R4', 1, '/Sub Sheet 2/Deeper test')]+units
+    assert with_power[:4] == ['#PWR01', '#PWR02', '#PWR03', '#PWR04']
+    assert with_power[4:] == [c[0] for c in comps]
+    # The last unit is the one in the hash, power components are excluded
+    assert refs == {'#SYM_CAUTION1': (1, '/'), 'C1': (1, '/'), 'L1': (1, '/'), 'R1': (1, '/'), 'R2': (1, '/'),
+                    'R3': (1, '/Sub Sheet/Deeper test'), 'R4': (1, '/Sub Sheet 2/Deeper test'),
+                    'U1': (7, '/Sub Sheet'), 'U2': (7, '/Sub Sheet 2')}
+    # Hierarchy order
+    assert u1 == [('U1', u) for u in range(1, 8)]+[('U2', u) for u in range(1, 8)]
+    # By sheet instance, hierarchy order, the power components are included
+    assert root == ['R1', 'L1', 'C1', 'R2', '#SYM_CAUTION1']
+    assert sub2 == [('U2', u) for u in range(1, 8)]+[('#PWR03', 1), ('#PWR04', 1)]
+    assert deeper == ['R3']
+    assert missing == []
+    KiConf.reset()
+
+
+def test_sch_part_fields_reset():
+    """ The 'part' fields are shared by the components, they must be released with the rest of the data """
+    sch = Schematic()
+    sch.load(os.path.join(prev_dir, 'board_samples', 'kicad_5', 'test_v5.sch'))
+    u1 = sch.get_components_by_name('74xx:74LS04')
+    assert u1[0].get_field_value('part') == '74LS04'
+    assert '74LS04' in SchematicComponent.part_fields
+    cov.load()
+    cov.start()
+    reset_loaded()
+    cov.stop()
+    cov.save()
+    assert SchematicComponent.part_fields == {}
+
+
+def _load_bitmap(fname):
+    sch = Schematic()
+    sch.load(fname)
+    assert len(sch.bitmaps) == 1
+    return sch, sch.bitmaps[0]
+
+
+def test_sch_bitmaps():
+    """ The bitmaps are decoded only when needed """
+    ctx = context.TestContextSCH('test_sch_bitmaps', 'test_v5', 'sch_no_inductors_1', PDF_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    for f in ['test_v5.sch', 'sub-sheet.sch', 'deeper.sch']:
+        shutil.copy2(os.path.join(ctx.get_board_dir(), f), ctx.output_dir)
+    fname = ctx.get_out_path('test_v5.sch')
+    with open(fname, 'rt') as f:
+        content = f.read()
+    cov.load()
+    cov.start()
+    # Just the position in the file, decoded on demand
+    _, bmp = _load_bitmap(fname)
+    source = bmp._source
+    lazy = bmp._data is None
+    png = bmp.data
+    # Saving over the source file must keep the bitmap
+    sch, bmp = _load_bitmap(fname)
+    sch.save('test_v5.sch', ctx.output_dir)
+    _, bmp = _load_bitmap(fname)
+    saved = bmp.data
+    # The file changed after loading it
+    _, bmp = _load_bitmap(fname)
+    with open(fname, 'wt') as f:
+        f.write('\n'+content)
+    try:
+        bmp.data
+        changed = None
+    except SchError as e:
+        changed = str(e)
+    # Not the usual format, decoded while loading
+    fallback = []
+    first = ' '.join('{:02x}'.format(b) for b in png[:32])
+    for new in [content.replace('\n', '\r\n'), content.replace(first.upper(), first)]:
+        with open(fname, 'wt', newline='') as f:
+            f.write(new)
+        _, bmp = _load_bitmap(fname)
+        fallback.append((bmp._source, bmp._data == png))
+    cov.stop()
+    cov.save()
+    assert source[0] == fname
+    assert lazy
+    assert png.startswith(b'\x89PNG')
+    assert saved == png
+    assert changed is not None and 'changed since the schematic was loaded' in changed
+    assert fallback == [(None, True), (None, True)]
+    ctx.clean_up()
+
+
+def test_sch_reload_changed():
+    """ Reload only the changed sub-sheet, must be the same as loading the whole schematic """
+    ctx = context.TestContextSCH('test_sch_reload_changed', 'test_v5', 'sch_no_inductors_1', PDF_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    for f in ['test_v5.sch', 'sub-sheet.sch', 'deeper.sch', 'l1.lib', 'sym-lib-table']:
+        shutil.copy2(os.path.join(ctx.get_board_dir(), f), ctx.output_dir)
+    fname = ctx.get_out_path('test_v5.sch')
+    sub = ctx.get_out_path('sub-sheet.sch')
+    sch = _load_sch_libs(fname)
+    cov.load()
+    cov.start()
+    nothing = sch.reload_changed()
+    # New value and a new field for a component that now comes from l1
+    with open(sub, 'rt') as f:
+        content = f.read()
+    content = content.replace('L 74xx:74LS04 U1', 'L l1:Resistor U1', 1).replace('F 1 "74LS04"', 'F 1 "1k"', 1)
+    content = content.replace('F 3 "http', 'F 4 "Bar" H 3800 2500 50  0001 C CNN "Foo"\nF 3 "http', 1)
+    with open(sub, 'wt') as f:
+        f.write(content)
+    st = os.stat(sub)
+    os.utime(sub, ns=(st.st_atime_ns, st.st_mtime_ns+10**9))
+    reloaded = sch.reload_changed()
+    cov.stop()
+    cov.save()
+    assert nothing is False
+    assert reloaded is True
+    assert 'Foo' in sch.fields
+    assert _sch_digest(sch) == _sch_digest(_load_sch_libs(fname))
+    KiConf.reset()
+    ctx.clean_up()
+
+
+def test_sch_kicad6():
+    """ KiCad 6 schematic, the same data we get from the KiCad 5 version """
+    fname = os.path.join(prev_dir, 'board_samples', 'kicad_6', 'kibom-variant_3.kicad_sch')
+    cov.load()
+    cov.start()
+    sch = SchematicV6()
+    sch.load(fname)
+    sch.load_libs(fname)
+    cov.stop()
+    cov.save()
+    comps = {c.ref: c for c in sch.get_components()}
+    assert sorted(comps.keys()) == ['C1', 'C2', 'FID1', 'R1', 'R2']
+    assert comps['C2'].value == '1000 pF'
+    assert comps['C2'].desc == 'Unpolarized capacitor'
+    assert comps['R1'].footprint_lib == 'Resistor_SMD'
+    assert comps['R1'].footprint == 'R_0805_2012Metric'
+    assert comps['R1'].desc == 'Resistor'
+    assert comps['R2'].get_field_value('Config') == 'T1'
+    assert comps['R2'].get_user_fields() == [('Config', 'T1')]
+    assert 'Config' in sch.fields
+    assert sch.title_block['Title'] == 'KiBom Test Schematic'
+    assert sorted(sch.comps_data.keys()) == ['Device:C', 'Device:R', 'Mechanical:Fiducial']
+
+
+def test_sch_kicad6_hierarchy():
+    """ The same sub-sheet used twice, the references come from `symbol_instances` (KiCad 6) or from the `instances`
+        of each symbol (KiCad 7) """
+    left = '/b7c1d2e3-4f50-4a6b-8c7d-9e0f1a2b3c40'
+    right = '/c8d2e3f4-5061-4b7c-9d8e-0f1a2b3c4d50'
+    expected = [('C1', '100nF', '', '/'), ('C2', '10nF', left, '/Left'), ('C3', '10nF', right, '/Right'),
+                ('R1', '10k', left, '/Left'), ('R2', '10k', right, '/Right')]
+    for prj in ['hierarchy', 'hierarchy_v7']:
+        fname = os.path.join(prev_dir, 'board_samples', 'kicad_6', prj+'.kicad_sch')
+        cov.load()
+        cov.start()
+        sch = SchematicV6()
+        sch.load(fname)
+        sch.load_libs(fname)
+        cov.stop()
+        cov.save()
+        comps = [(c.ref, c.value, c.sheet_path, c.sheet_path_h) for c in sch.get_components()]
+        assert comps == expected, prj
+        assert sorted(c.ref for c in sch.get_components_in_sheet('/Right')) == ['C3', 'R2'], prj
+        # The sub-sheet is parsed once, both instances share the data from the file
+        left_sch, right_sch = sch.sub_sheets
+        assert left_sch.fname == right_sch.fname
+        assert left_sch.lib_symbols is right_sch.lib_symbols
+        assert [c.fields for c in left_sch.components] == [c.fields for c in right_sch.components]
+        assert sorted(sch.comps_data.keys()) == ['Device:C', 'Device:R']
+
+
+def test_sch_kicad6_errors():
+    """ Malformed KiCad 6 schematics """
+    ctx = context.TestContextSCH('test_sch_kicad6_errors', 'bom', 'sch_no_inductors_1', PDF_DIR)
+    os.makedirs(ctx.output_dir, exist_ok=True)
+    fname = ctx.get_out_path('bad.kicad_sch')
+    cases = [('(kicad_sch (version 20211123)\n  (symbol (lib_id "Device:R")\n    (uuid 1)\n  )\n)\n',
+              'Component without reference', 4),
+             ('(kicad_sch (version 20211123)\n  (paper "A4)\n)\n', 'Unterminated string', 2),
+             ('(kicad_sch (version 20211123)\n  (paper "A4"\n', 'Unexpected end of file', 2),
+             ('(kicad_pcb (version 20211123))\n', 'No kicad_sch signature', 1)]
+    cov.load()
+    cov.start()
+    errors = []
+    for content, msg, line in cases:
+        with open(fname, 'wt') as f:
+            f.write(content)
+        try:
+            SchematicV6().load(fname)
+            errors.append(None)
+        except SchFileError as e:
+            errors.append((e.msg, e.line))
+    cov.stop()
+    cov.save()
+    assert errors == [(msg, line) for _, msg, line in cases]
+    ctx.clean_up()
@@ -20,12 +20,15 @@ if prev_dir not in sys.path:
 from kibot.misc import CORRUPTED_SCH
 
 
-def setup_ctx(test, error):
+def setup_ctx(test, error, line=None):
     sch = 'v5_errors/error_'+test
     test = 'test_sch_errors_'+test
     ctx = context.TestContextSCH(test, sch, 'int_bom_simple_csv', None)
     ctx.run(CORRUPTED_SCH)
     ctx.search_err(error)
+    if line is not None:
+        # The line reported must be the same for the fast and the generic parsers
+        ctx.search_err(r'At line {} of'.format(line))
     ctx.clean_up()
 
 
@@ -46,7 +49,7 @@ def test_sch_errors_unknown_def():
 
 
 def test_sch_errors_eof():
-    setup_ctx('eof', 'Unexpected end of file')
+    setup_ctx('eof', 'Unexpected end of file', 16)
 
 
 def test_sch_errors_l1():
@@ -58,7 +61,7 @@ def test_sch_errors_l2():
 
 
 def test_sch_errors_l3():
-    setup_ctx('l3', 'Malformed component field')
+    setup_ctx('l3', 'Malformed component field', 7)
 
 
 def test_sch_errors_l4():
@@ -89,7 +92,7 @@ def test_sch_errors_l9():
 
 
 def test_sch_errors_field():
-    setup_ctx('field', 'Malformed component field')
+    setup_ctx('field', 'Malformed component field', 20)
 
 
 def test_sch_errors_field_name():
@@ -131,7 +134,7 @@ def test_sch_errors_miss_red_pos():
 
 
 def test_sch_errors_bad_red_pos():
-    setup_ctx('bad_red_pos', 'Malformed component redundant position')
+    setup_ctx('bad_red_pos', 'Malformed component redundant position', 25)
 
 
 def test_sch_errors_miss_matrix():
@@ -530,6 +530,13 @@ def test_error_int_bom_logo_format():
     ctx.clean_up()
 
 
+def test_error_int_bom_multi_no_ext():
+    ctx = context.TestContextSCH('test_error_int_bom_multi_no_ext', 'links', 'error_int_bom_multi_no_ext', '')
+    ctx.run(EXIT_BAD_CONFIG)
+    assert ctx.search_err("Using more than one format needs `%x`")
+    ctx.clean_up()
+
+
 def test_error_var_no_name():
     ctx = context.TestContextSCH('test_error_var_no_name', 'links', 'error_var_no_name', '')
     ctx.run(EXIT_BAD_CONFIG)
@@ -8,6 +8,7 @@ import re
 import pytest
 import csv
 from glob import glob
+from contextlib import contextmanager
 from pty import openpty
 import xml.etree.ElementTree as ET
 prev_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -155,6 +156,21 @@ class TestContext(object):
     def get_out_path(self, filename):
         return os.path.join(self.output_dir, filename)
 
+    @contextmanager
+    def private_cache(self):
+        """ Uses a cache dir (XDG_CACHE_HOME) inside the output dir, so we start with an empty cache.
+            Returns the path of the cache dir. """
+        cache = self.get_out_path('cache')
+        old_cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = cache
+        try:
+            yield cache
+        finally:
+            if old_cache is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = old_cache
+
     def get_gerber_job_filename(self):
         return os.path.join(self.sub_dir, self.board_name+'-job.gbrjob')
 